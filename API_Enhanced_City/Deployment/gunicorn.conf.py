@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Configuration of gunicorn. From the API_Enhanced_City directory:
+
+    gunicorn --config Deployment/gunicorn.conf.py wsgi:app
+
+The server is configured by the following variables of the `.env` file (or
+the matching `EXTENDED_DOC_` environment variables) :
+
+- `server_bind` : address to listen on ('0.0.0.0:5000' by default)
+- `server_worker_class` : 'sync' (default) for one request at a time per
+  worker process, or 'gthread' for threaded workers
+- `server_workers` : number of worker processes (2 * CPUs + 1 by default)
+- `server_threads` : number of threads of each 'gthread' worker (4 by
+  default)
+
+The workers write to the same log files, which `RotatingFileHandler` cannot
+rotate safely from several processes : unless `log_rotation` is configured,
+the workers use `log_rotation=external`, and the files should be rotated by
+logrotate (see `util.log.configure_logging`).
+
+Each worker records its own metrics (see `util.metrics`) : unless
+`metrics_folder` is configured, the workers write them in a temporary folder,
+and `GET /metrics` sums those of all the workers.
+"""
+
+import multiprocessing
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from util import metrics  # noqa: E402
+from util.VarConfig import VarConfig  # noqa: E402
+
+server_config = VarConfig.get()
+
+chdir = ROOT
+pythonpath = f'{ROOT},{os.path.join(ROOT, "api")}'
+bind = server_config.get('server_bind', '0.0.0.0:5000')
+worker_class = server_config.get('server_worker_class', 'sync')
+workers = int(server_config.get('server_workers',
+                                multiprocessing.cpu_count() * 2 + 1))
+threads = int(server_config.get('server_threads',
+                                4 if worker_class == 'gthread' else 1))
+
+# Inherited by the workers, which are forked from this process
+if 'log_rotation' not in server_config:
+    os.environ['EXTENDED_DOC_LOG_ROTATION'] = 'external'
+if metrics.is_enabled(server_config) \
+        and 'metrics_folder' not in server_config:
+    os.environ['EXTENDED_DOC_METRICS_FOLDER'] = tempfile.mkdtemp(
+        prefix='extended-doc-metrics-')
+VarConfig.reload()
+
+
+def on_starting(server):
+    """
+    Waits for the database and creates the tables once, in the master
+    process, before the workers are started. The metrics of the previous run
+    are removed.
+    """
+    import persistence_unit.PersistenceUnit as pUnit
+    from controller.Controller import Controller
+    if metrics.get_folder() is not None:
+        metrics.clear_folder(metrics.get_folder())
+    pUnit.init_engine()
+    Controller.create_tables()
+    # The connections opened by the master must not be shared with the
+    # forked workers
+    pUnit.get_engine().dispose()
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+ASGI application serving the read routes with the most fan-out
+asynchronously, with asyncpg : a worker keeps serving other requests while
+the queries of a request are running. With uvicorn, from the
+API_Enhanced_City directory:
+
+    uvicorn --app-dir api asgi:app
+
+The routes and their responses are the same as the ones of `web_api` :
+
+ - `GET /document`
+ - `GET /document/<doc_id>/comment`
+ - `GET /link/<target_type>`
+
+The other routes are only served by the WSGI application (see `wsgi`).
+"""
+
+import re
+from urllib.parse import parse_qsl
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+import jwt
+
+# Imports all the entities, so that their relationships can be configured
+from controller.Controller import Controller
+from controller.CommentController import CommentController
+from controller.DocController import DocController
+from controller.LinkController import LinkController
+from controller.UserController import UserController
+import persistence_unit.AsyncPersistenceUnit as aUnit
+from util.AuthCache import auth_cache
+from util.Exception import *
+from util.log import configure_logging, info_logger
+from util.response_encoding import choose_encoding, compress, dumps, \
+    get_compression_config
+from util.VarConfig import VarConfig
+
+
+class Request:
+    """
+    The parts of an HTTP request used by the routes : the first value of
+    each URL parameter, the headers (with lowercase names) and the
+    parameters of the path.
+    """
+    def __init__(self, scope, path_params):
+        self.args = {}
+        for key, value in parse_qsl(scope['query_string'].decode('latin-1'),
+                                    keep_blank_values=True):
+            self.args.setdefault(key, value)
+        self.headers = {key.decode('latin-1').lower(): value.decode('latin-1')
+                        for key, value in scope['headers']}
+        self.path_params = path_params
+
+
+async def authenticate(request, required=True):
+    """
+    Asynchronous version of `helpers.use_authentication`.
+    :param request: The request
+    :param required: If False, None is returned when there is no token
+    :return: The decoded JWT of the 'Authorization' header, with the current
+    role of the user
+    :raises Unauthorized: if the token is missing or invalid
+    :raises NotFound: if the user of the token does not exist
+    """
+    match = re.search('Bearer (.*)', request.headers.get('authorization', ''))
+    if match is None:
+        if required:
+            raise Unauthorized("Missing 'Authorization' header")
+        return None
+    encoded_jwt = match.group(1)
+    decoded_jwt = auth_cache.get(encoded_jwt)
+    if decoded_jwt is not None:
+        return decoded_jwt
+    try:
+        decoded_jwt = jwt.decode(encoded_jwt, VarConfig.get()['password'],
+                                 algorithms=['HS256'])
+    except jwt.PyJWTError as e:
+        raise Unauthorized(e)
+    role = await UserController.get_user_role_async(decoded_jwt['user_id'])
+    if role is not None:
+        decoded_jwt = dict(decoded_jwt, role=role)
+    auth_cache.put(encoded_jwt, decoded_jwt)
+    return decoded_jwt
+
+
+async def get_documents(request):
+    page = await DocController.get_documents_page_async(request.args)
+    headers = {}
+    if page['next_cursor'] is not None:
+        headers['X-Next-Cursor'] = page['next_cursor']
+    return 200, page['documents'], headers
+
+
+async def get_comments(request):
+    doc_id = int(request.path_params['doc_id'])
+    auth_info = await authenticate(request, required=False)
+    await DocController.check_document_access_async(doc_id, auth_info)
+    return 200, await CommentController.get_comments_async(doc_id), {}
+
+
+async def get_links(request):
+    links = await LinkController.get_links_async(
+        request.path_params['target_type_name'], request.args)
+    return 200, links, {}
+
+
+routes = [
+    (re.compile(r'/document'), get_documents),
+    (re.compile(r'/document/(?P<doc_id>\d+)/comment'), get_comments),
+    (re.compile(r'/link/(?P<target_type_name>[^/]+)'), get_links)
+]
+
+ALLOWED_METHODS = 'GET, HEAD, OPTIONS'
+
+
+def format_error(e):
+    """
+    Returns the status and the body of the response to an exception, like
+    `helpers.format_response` does.
+    """
+    if isinstance(e, BadRequest):
+        return 400, f'Bad request  \n{e}'
+    if isinstance(e, Unauthorized):
+        return 401, f'Unauthorized  \n{e}'
+    if isinstance(e, AuthError):
+        return 403, f'Forbidden  \n{e}'
+    if isinstance(e, NotFound):
+        return 404, f'Not found\n{e}'
+    if asyncpg is not None and isinstance(e, asyncpg.DataError):
+        return 422, f'Unprocessable entity  \n{e}'
+    info_logger.error(e)
+    return 500, f'Unexpected error  \n{e}'
+
+
+async def handle_request(scope):
+    """
+    Routes a request and returns the status, the body and the headers of the
+    response.
+    """
+    for pattern, route in routes:
+        match = pattern.fullmatch(scope['path'])
+        if match is not None:
+            break
+    else:
+        return 404, 'Not found\n', {}
+    if scope['method'] == 'OPTIONS':
+        return 200, '', {'Allow': ALLOWED_METHODS}
+    if scope['method'] not in ('GET', 'HEAD'):
+        return 405, 'Method not allowed\n', {'Allow': ALLOWED_METHODS}
+    try:
+        return await route(Request(scope, match.groupdict()))
+    except Exception as e:
+        status, body = format_error(e)
+        return status, body, {}
+
+
+def get_cors_headers(scope):
+    """
+    Returns the CORS headers of a response, as the ones added by Flask-CORS
+    to the responses of `web_api` : all origins are allowed, the origin of
+    the request being sent back when there is one, and preflight requests
+    are allowed to send any header.
+    :param scope: The ASGI scope of the request
+    :return: A dict of headers
+    """
+    request_headers = {key.decode('latin-1').lower(): value.decode('latin-1')
+                       for key, value in scope['headers']}
+    origin = request_headers.get('origin')
+    headers = {
+        'Access-Control-Allow-Origin': origin or '*',
+        'Access-Control-Expose-Headers': 'X-Next-Cursor'
+    }
+    if origin is not None:
+        headers['Vary'] = 'Origin'
+        if scope['method'] == 'OPTIONS' \
+                and 'access-control-request-method' in request_headers:
+            headers['Access-Control-Allow-Methods'] = ALLOWED_METHODS
+            if 'access-control-request-headers' in request_headers:
+                headers['Access-Control-Allow-Headers'] = \
+                    request_headers['access-control-request-headers']
+    return headers
+
+
+async def send_response(send, status, body, headers, scope):
+    """
+    Sends a response, encoding dicts and lists in JSON. Responses are
+    compressed as the ones of `web_api` (see `util.response_encoding`).
+    """
+    if isinstance(body, (dict, list)):
+        body = dumps(body)
+        content_type = 'application/json'
+    else:
+        body = body.encode('utf-8')
+        content_type = 'text/html; charset=utf-8'
+    headers = dict(headers)
+    config = get_compression_config()
+    if config['compression'] and status == 200:
+        headers['Vary'] = 'Accept-Encoding'
+        encoding = choose_encoding(dict(scope['headers']).get(
+            b'accept-encoding', b'').decode('latin-1'))
+        if encoding is not None \
+                and len(body) >= config['compression_min_size']:
+            body = compress(body, encoding)
+            headers['Content-Encoding'] = encoding
+    for key, value in get_cors_headers(scope).items():
+        if key in headers:
+            value = f'{headers[key]}, {value}'
+        headers[key] = value
+    headers.update({
+        'Content-Type': content_type,
+        'Content-Length': str(len(body))
+    })
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                    for key, value in headers.items()]
+    })
+    await send({'type': 'http.response.body',
+                'body': body if scope['method'] != 'HEAD' else b''})
+
+
+async def lifespan(receive, send):
+    """
+    Configures the logging and creates the connection pool when the server
+    starts, and closes the pool when the server stops.
+    """
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            configure_logging()
+            await aUnit.get_pool()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await aUnit.close_pool()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        status, body, headers = await handle_request(scope)
+        await send_response(send, status, body, headers, scope)
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Command line tools working directly on the database configured in the
+`.env` file. From the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 api/cli.py export [-o documents.ndjson]
+    PYTHONPATH=. python3 api/cli.py import documents.csv --user-id 1
+    PYTHONPATH=. python3 api/cli.py sweep
+
+ - `export` writes all the documents as NDJSON, one JSON document per line,
+   with their comments, versions and links (see `ExportController`), to a
+   file or to the standard output.
+ - `import` creates the documents of an NDJSON or CSV file, owned by a user
+   (see `ImportController`). The `file` attribute of each document is the
+   path of its file, relative to the `--files` folder. Documents which
+   cannot be imported are reported on the standard error.
+ - `sweep` deletes the files of the upload folder which are not used by any
+   document or archive anymore (see `util.upload.sweep_files`).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Imports all the entities, so that their relationships can be configured
+from controller.Controller import Controller
+from controller.ExportController import ExportController
+from controller.DocController import DocController
+from controller.ImportController import ImportController
+from controller.UserController import UserController
+from util.Exception import BadRequest
+from util.upload import get_extension, save_stream, sweep_files
+from util.response_encoding import dumps
+
+
+def export_documents(arguments):
+    output = open(arguments.output, 'wb') if arguments.output \
+        else sys.stdout.buffer
+    try:
+        count = 0
+        for document in ExportController.export_documents(
+                arguments.batch_size):
+            output.write(dumps(document) + b'\n')
+            count += 1
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f'{count} documents exported', file=sys.stderr)
+
+
+def import_documents(arguments):
+    user = UserController.get_user_by_id(arguments.user_id)
+    auth_info = {'user_id': user['id'], 'role': user['role']}
+    data_format = arguments.format or (
+        'csv' if get_extension(arguments.input) == 'csv' else 'ndjson')
+
+    def save_document_file(name):
+        location = os.path.join(arguments.files, name)
+        if not os.path.isfile(location):
+            raise BadRequest(f"Missing file '{location}'")
+        with open(location, 'rb') as stream:
+            filename, _ = save_stream(stream, get_extension(name))
+        return filename
+
+    with open(arguments.input, 'rb') as stream:
+        result = ImportController.import_documents(
+            ImportController.read_documents(stream, data_format), auth_info,
+            save_document_file, arguments.batch_size)
+    for error in result['errors']:
+        print(json.dumps(error), file=sys.stderr)
+    print(f"{len(result['created'])} documents imported, "
+          f"{len(result['errors'])} errors", file=sys.stderr)
+    return 1 if result['errors'] else 0
+
+
+def sweep_upload_folder(arguments):
+    count = sweep_files(DocController.is_file_referenced,
+                        arguments.grace_period)
+    print(f'{count} files deleted', file=sys.stderr)
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    export_parser = commands.add_parser(
+        'export', help='Export the documents as NDJSON')
+    export_parser.add_argument(
+        '-o', '--output', help='Output file (standard output by default)')
+    export_parser.add_argument(
+        '--batch-size', type=int, default=ExportController.batch_size,
+        help='Number of documents read at once '
+             f'(default: {ExportController.batch_size})')
+    export_parser.set_defaults(function=export_documents)
+
+    import_parser = commands.add_parser(
+        'import', help='Import documents from NDJSON or CSV')
+    import_parser.add_argument('input', help='NDJSON or CSV file')
+    import_parser.add_argument(
+        '--user-id', type=int, required=True,
+        help='Id of the owner of the documents')
+    import_parser.add_argument(
+        '--files', default='.',
+        help='Folder of the files of the documents (default: .)')
+    import_parser.add_argument(
+        '--format', choices=ImportController.formats,
+        help='Format of the input (default: guessed from its extension)')
+    import_parser.add_argument(
+        '--batch-size', type=int, default=ImportController.batch_size,
+        help='Number of documents created at once '
+             f'(default: {ImportController.batch_size})')
+    import_parser.set_defaults(function=import_documents)
+
+    sweep_parser = commands.add_parser(
+        'sweep', help='Delete the files which are not used anymore')
+    sweep_parser.add_argument(
+        '--grace-period', type=float,
+        help='Age in seconds under which files are kept (default: '
+             'upload_grace_period, or 3600)')
+    sweep_parser.set_defaults(function=sweep_upload_folder)
+    return parser
+
+
+if __name__ == '__main__':
+    arguments = get_parser().parse_args()
+    sys.exit(arguments.function(arguments))
@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 # coding: utf8
 from entities.User import User
+from entities.UserRole import UserRole
 from util.Exception import *
 from util.log import *
 from util.VarConfig import *
+from util.AuthCache import auth_cache
+from util.ResponseCache import response_cache
+from util.response_encoding import dumps
 
-from flask import jsonify, request
+from flask import current_app, make_response, request, send_file
+from werkzeug.exceptions import RequestEntityTooLarge, \
+    RequestedRangeNotSatisfiable
+from sqlalchemy import event, inspect
 import sqlalchemy.exc
 import sqlalchemy.orm
+import hashlib
+import json
 import jwt
+import os
 import re
 
 from persistence_unit import PersistenceUnit as pUnit
@@ -20,14 +30,17 @@ class Response:
     """
     Represents a response that can be handled y Flask. It contains a 'content',
     which should be a string, a dict or a list. If it is a dict or a list,
-    the content will be formatted into a JSON format thanks to the 'jsonify'
-    method from flask.
+    the content will be formatted into compact JSON thanks to the 'dumps'
+    function of `util.response_encoding`. Additional HTTP headers can be
+    passed as a dict.
     """
-    def __init__(self, content):
+    def __init__(self, content, headers=None):
         if isinstance(content, (dict, list)):
-            self.content = jsonify(content)
+            self.content = current_app.response_class(
+                dumps(content), mimetype='application/json')
         else:
             self.content = content
+        self.headers = headers
 
     def format(self):
         """
@@ -45,7 +58,7 @@ class ResponseOK(Response):
     information.
     """
     def format(self):
-        return self.content, 200
+        return self.content, 200, self.headers
 
 
 class ResponseCreated(Response):
@@ -54,7 +67,16 @@ class ResponseCreated(Response):
     more information.
     """
     def format(self):
-        return self.content, 201
+        return self.content, 201, self.headers
+
+
+class ResponseServiceUnavailable(Response):
+    """
+    Represents a HTTP 503 SERVICE UNAVAILABLE response. See the `Response`
+    superclass for more information.
+    """
+    def format(self):
+        return self.content, 503, self.headers
 
 
 class ResponseNoContent(Response):
@@ -105,6 +127,8 @@ def format_response(old_function, authorization_function=None,
             return f'Unsupported file format  \n{e}', 415
         except Conflict as e:
             return f'Conflict  \n{e}'
+        except (PayloadTooLarge, RequestEntityTooLarge) as e:
+            return f'Payload too large  \n{e}', 413
         except Exception as e:
             info_logger.error(e)
             return f"Unexpected error  \n{e}", 500
@@ -112,13 +136,183 @@ def format_response(old_function, authorization_function=None,
     return new_function
 
 
+# Max age of the files sent with their content hash, which never change
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+
+def send_stored_file(location, digest=None, immutable=False, private=False):
+    """
+    Sends a file of the upload folder. Conditional requests (`If-None-Match`,
+    `If-Modified-Since`) are answered with a 304 status and range requests
+    with a 206 status.
+    :param location: The path of the file
+    :param digest: The SHA-256 of the file, used as a strong ETag. If None, an
+    ETag is computed from the modification time and the size of the file.
+    :param immutable: Whether the response can be cached for a long time
+    because the URL identifies the content of the file
+    :param private: Whether the response can only be cached by the client
+    (e.g. for the files of documents in validation)
+    :return: A Flask response
+    """
+    response = send_file(os.path.abspath(location), add_etags=digest is None,
+                         conditional=False)
+    if digest is not None:
+        response.set_etag(digest)
+    response.expires = None
+    if immutable:
+        response.headers['Cache-Control'] = \
+            f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    elif private:
+        response.headers['Cache-Control'] = 'private, no-cache'
+    else:
+        response.headers['Cache-Control'] = 'public, no-cache'
+    response.headers['Accept-Ranges'] = 'bytes'
+    try:
+        response = response.make_conditional(
+            request, accept_ranges=True,
+            complete_length=os.path.getsize(location))
+    except RequestedRangeNotSatisfiable as e:
+        response.close()
+        return e.get_response()
+    if response.status_code == 304:
+        response.headers.pop('X-Sendfile', None)
+    return response
+
+
+def cache_response(*tables):
+    """
+    Decorator caching the successful responses of a read route in
+    `response_cache`, when it is enabled. To put after the `app.route`
+    decorator from Flask, before `format_response`. Responses are keyed by
+    the path and the query arguments of the request, and are invalidated
+    when a transaction writing to one of `tables` is committed, so the
+    route must not depend on the authenticated user. Responses are sent
+    with the hash of their body as ETag, and conditional requests are
+    answered with a 304 status, whether the cache is enabled or not.
+    :param tables: The names of the tables read by the route.
+    """
+    def decorator(old_function):
+        @wraps(old_function)
+        def new_function(*args, **kwargs):
+            key = None
+            entry = None
+            if response_cache.enabled:
+                key = response_cache.make_key(request.path, request.args,
+                                              tables)
+                entry = response_cache.get(key)
+            if entry is None:
+                response = make_response(old_function(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+                body = response.get_data()
+                entry = {
+                    'etag': hashlib.sha1(body).hexdigest(),
+                    'body': body.decode('utf-8'),
+                    'mimetype': response.mimetype,
+                    'headers': {name: value for name, value
+                                in response.headers.items()
+                                if name not in ('Content-Type',
+                                                'Content-Length')}
+                }
+                if key is not None:
+                    response_cache.put(key, entry)
+            response = make_response(entry['body'], 200, entry['headers'])
+            response.mimetype = entry['mimetype']
+            response.set_etag(entry['etag'])
+            response.headers['Cache-Control'] = 'public, no-cache'
+            return response.make_conditional(request)
+
+        return new_function
+    return decorator
+
+
+def get_json_items():
+    """
+    Returns the items sent in the body of the request, either as a JSON array
+    or as NDJSON (one JSON value per line, with the `application/x-ndjson`
+    content type).
+    :return: The list of items.
+    :raises BadRequest: if the body is not a JSON array or valid NDJSON.
+    """
+    if request.mimetype == 'application/x-ndjson':
+        items = []
+        lines = request.get_data(as_text=True).splitlines()
+        for number, line in enumerate(lines, 1):
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError as e:
+                    raise BadRequest(f'Invalid JSON on line {number} : {e}')
+        return items
+    items = request.get_json(force=True, silent=True)
+    if not isinstance(items, list):
+        raise BadRequest('The request body must be a JSON array')
+    return items
+
+
+# Tokens are signed with the configured password, which may have changed
+VarConfig.on_reload(lambda config: auth_cache.clear())
+
+
+@event.listens_for(User, 'after_delete')
+def invalidate_deleted_user(mapper, connection, user):
+    """
+    Removes the cached tokens of a user when this user is deleted.
+    """
+    auth_cache.invalidate_user(user.id)
+
+
+@event.listens_for(User, 'after_update')
+def invalidate_user_role(mapper, connection, user):
+    """
+    Removes the cached tokens of a user when their role changes, because the
+    role is part of the cached token payload.
+    """
+    if inspect(user).attrs.role_id.history.has_changes():
+        auth_cache.invalidate_user(user.id)
+
+
+def decode_token(encoded_jwt):
+    """
+    Decodes a JWT and checks that its user still exists. The role of the
+    token is replaced by the current role of the user, which may have changed
+    since the login. The result is stored in `auth_cache`, so a token is only
+    decoded and checked once until it expires or is invalidated (see the
+    listeners of `User` above).
+    :param encoded_jwt: The encoded JWT.
+    :return: The decoded JWT, with the current role of the user.
+    :raises Unauthorized: if the token cannot be decoded.
+    :raises NoResultFound: if the user of the token does not exist.
+    """
+    decoded_jwt = auth_cache.get(encoded_jwt)
+    if decoded_jwt is not None:
+        return decoded_jwt
+
+    decoded_jwt = jwt.decode(encoded_jwt, VarConfig.get()['password'],
+                             algorithms=['HS256'])
+    if decoded_jwt is None:
+        raise Unauthorized
+
+    session = pUnit.Session()
+    try:
+        _, role = session.query(User.id, UserRole).outerjoin(
+            UserRole, User.role_id == UserRole.id).filter(
+            User.id == decoded_jwt['user_id']).one()
+        if role is not None:
+            decoded_jwt = dict(decoded_jwt, role=role.serialize())
+    finally:
+        session.close()
+    auth_cache.put(encoded_jwt, decoded_jwt)
+    return decoded_jwt
+
+
 def use_authentication(required=True):
     """
     Decorator used to specify that a route needs authentication. To put after
     the `app.route` decorator from Flask. Will search in the request headers
     for an 'Authorization' field and decode it as JWT. If the field cannot be
     found, or the timeout is expired, or the field is not a valid JWT, returns
-    a LoginError.
+    a LoginError. Decoded tokens are cached (see `decode_token`).
     :param required: Specify if the auth is required or not. If set to True,
     the decorator will raise an Unauthorized exception if no auth is provided.
     If set to false, it will pass None as auth_info.
@@ -131,16 +325,7 @@ def use_authentication(required=True):
                 try:
                     bearer = request.headers["Authorization"]
                     encoded_jwt = re.search('Bearer (.*)', bearer).group(1)
-                    decoded_jwt = jwt.decode(encoded_jwt, VarConfig.get()['password'],
-                                             algorithms=['HS256'])
-                    if decoded_jwt is None:
-                        raise Unauthorized
-
-                    session = pUnit.Session()
-                    user = session.query(User).filter(User.id == decoded_jwt['user_id']).one()
-                    session.close()
-                    if user is None:
-                        raise UnprocessableEntity("User does not exist")
+                    decoded_jwt = decode_token(encoded_jwt)
                 except KeyError:
                     if required:
                         raise Unauthorized("Missing 'Authorization' header")
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 # coding: utf8
 
-from flask import Flask, send_from_directory
+import weakref
+
+from flask import Blueprint, Flask, current_app
 from flask_cors import CORS
 
 from sqlalchemy.orm.exc import NoResultFound
@@ -12,21 +14,84 @@ from controller.TourController import TourController
 from controller.UserController import UserController
 from controller.DocController import DocController
 from controller.ArchiveController import ArchiveController
+from controller.ExportController import ExportController
+from controller.ImportController import ImportController
 from controller.LinkController import LinkController
+from entities.Document import Document
+import persistence_unit.PersistenceUnit as pUnit
 from util.upload import *
+from util.thumbnail import thumbnail_cache, get_thumbnail_width
 from util.JsonCustomEncoder import JsonCustomEncoder
+from util.ResponseCache import response_cache
+import util.metrics as metrics
+import util.response_encoding as response_encoding
+from util.response_encoding import dumps
+from util.log import configure_logging
 
 # Imports the Response objects and the need_authentication / format_response
 # decorators
 from helpers import *
 
-app = Flask(__name__)
-app.json_encoder = JsonCustomEncoder
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-CORS(app)
+# Multipart bodies are rejected before being parsed when they exceed the
+# maximum size of a file, plus some room for the other form fields
+FORM_OVERHEAD = 1024 * 1024
+
+# Tables read by the cached routes (see `cache_response`)
+DOCUMENT_TABLES = ('document', 'comments', 'validation_status',
+                   'visualisation', 'document_user')
+TOUR_TABLES = ('guided_tour', 'document_guided_tour') + DOCUMENT_TABLES
+LINK_TABLES = tuple(target_type.__tablename__ for target_type
+                    in LinkController.target_types.values())
+
+api = Blueprint('api', __name__)
+
+# Applications created by `create_app`, updated when the configuration is
+# reloaded
+_apps = weakref.WeakSet()
+
+
+def update_apps(config):
+    """
+    Updates the settings of the applications which depend on the
+    configuration. Registered once, whatever the number of applications.
+    """
+    for app in _apps:
+        app.config['MAX_CONTENT_LENGTH'] = \
+            get_max_upload_size() + FORM_OVERHEAD
+
+
+VarConfig.on_reload(update_apps)
+VarConfig.on_reload(response_cache.configure)
 
 
-@app.route('/')
+def create_app(config=None):
+    """
+    Creates the Flask application serving the routes of the API, and
+    installs the log handlers (see `util.log.configure_logging`). The
+    configuration is reloaded when the `.env` file changes (see
+    `VarConfig.watch`). The tables of the database are not created here, see
+    `Controller.create_tables`.
+    :param dict config: Additional Flask configuration
+    :return: The Flask application
+    """
+    configure_logging()
+    app = Flask(__name__)
+    app.json_encoder = JsonCustomEncoder
+    app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
+    app.config['MAX_CONTENT_LENGTH'] = get_max_upload_size() + FORM_OVERHEAD
+    if config is not None:
+        app.config.update(config)
+    _apps.add(app)
+    response_cache.configure()
+    VarConfig.watch()
+    CORS(app, expose_headers=['X-Next-Cursor'])
+    metrics.init_app(app)
+    response_encoding.init_app(app)
+    app.register_blueprint(api)
+    return app
+
+
+@api.route('/')
 def index():
     return '''
     <!doctype html>
@@ -45,7 +110,21 @@ def index():
     '''
 
 
-@app.route('/login', methods=['POST'])
+@api.route('/health', methods=['GET'])
+@format_response
+def get_health():
+    """
+    Reports the state of the database connection pool (checked in and checked
+    out connections) and the latency of the database. Responds with a 503
+    status when the database cannot be reached.
+    """
+    health = pUnit.get_health()
+    if health['database']['status'] != 'ok':
+        return ResponseServiceUnavailable(health)
+    return ResponseOK(health)
+
+
+@api.route('/login', methods=['POST'])
 @format_response
 def login():
     token = UserController.login(
@@ -57,7 +136,7 @@ def login():
 # ---- USERS -------------------------------------------------------------------
 
 
-@app.route('/user', methods=['POST'])
+@api.route('/user', methods=['POST'])
 @format_response
 def create_user():
     created_user = UserController.create_user(
@@ -66,7 +145,7 @@ def create_user():
     return ResponseCreated(created_user)
 
 
-@app.route('/user/me', methods=['GET'])
+@api.route('/user/me', methods=['GET'])
 @format_response
 @use_authentication()
 def get_connected_user(auth_info):
@@ -74,14 +153,14 @@ def get_connected_user(auth_info):
     return ResponseOK(user)
 
 
-@app.route('/user/<int:user_id>', methods=['GET'])
+@api.route('/user/<int:user_id>', methods=['GET'])
 @format_response
 def get_user(user_id):
     user = UserController.get_user_by_id(user_id)
     return ResponseOK(user)
 
 
-@app.route('/user/grant', methods=['POST'])
+@api.route('/user/grant', methods=['POST'])
 @format_response
 @use_authentication()
 def add_privileged_user(auth_info):
@@ -94,7 +173,7 @@ def add_privileged_user(auth_info):
 # ---- DOCUMENTS ---------------------------------------------------------------
 
 
-@app.route('/document', methods=['POST'])
+@api.route('/document', methods=['POST'])
 @format_response
 @use_authentication()
 def create_document(auth_info):
@@ -105,11 +184,9 @@ def create_document(auth_info):
         filename = save_file(request.files['file'])
         if filename is not None:
             args['file'] = filename
-            try:
-                document = DocController.create_document(args, auth_info)
-            except Exception as e:
-                delete_file(f'{UPLOAD_FOLDER}/{filename}')
-                raise e
+            # If the document cannot be created, the file is left to
+            # `sweep_files` : another request may have saved the same content
+            document = DocController.create_document(args, auth_info)
             return ResponseCreated(document)
         else:
             raise FormatError("Invalid file format")
@@ -117,16 +194,70 @@ def create_document(auth_info):
         raise BadRequest("Missing 'file' parameter")
 
 
-@app.route('/document', methods=['GET'])
+@api.route('/document/batch', methods=['POST'])
+@format_response
+@use_authentication()
+def create_documents(auth_info):
+    """
+    Creates many documents owned by the authenticated user. The documents are
+    sent in the `documents` file of the form, as NDJSON (one JSON object per
+    line) or as CSV (with the `.csv` extension or the `text/csv` type, one
+    column per attribute), and their files in the `files` fields of the
+    form : the `file` attribute of a document is the name of one of these
+    files. Documents which cannot be created are reported in the `errors` of
+    the response, with their index in the `documents` file.
+    """
+    documents = request.files.get('documents')
+    if documents is None:
+        raise BadRequest("Missing 'documents' parameter")
+    if documents.mimetype == 'text/csv' \
+            or get_extension(documents.filename or '') == 'csv':
+        data_format = 'csv'
+    else:
+        data_format = 'ndjson'
+    files = {file.filename: file for file in request.files.getlist('files')}
+
+    def save_document_file(name):
+        if name not in files:
+            raise BadRequest(f"Missing file '{name}'")
+        # A file can be used by several documents
+        stream = files[name].stream
+        stream.seek(0)
+        filename, _ = save_stream(stream, get_extension(name))
+        return filename
+
+    result = ImportController.import_documents(
+        ImportController.read_documents(documents.stream, data_format),
+        auth_info, save_document_file)
+    if result['created']:
+        return ResponseCreated(result)
+    return ResponseOK(result)
+
+
+@api.route('/document', methods=['GET'])
+@cache_response(*DOCUMENT_TABLES)
 @format_response
 def get_documents():
-    documents = DocController.get_documents(
+    """
+    Searches validated documents. Results are paginated when the `limit` or
+    the `cursor` parameter is given, by pages of `limit` documents (100 by
+    default) : the cursor of the next page is sent in the `X-Next-Cursor`
+    header and can be passed back as the `cursor` parameter. Otherwise all
+    the documents are returned.
+    The results of a full-text research (`searchMode=fulltext`) are ordered
+    by relevance and paginated the same way. The `fields` parameter restricts the returned fields (e.g.
+    `fields=title,refDate`).
+    """
+    page = DocController.get_documents_page(
             {key: request.args.get(key)
              for key in request.args.keys()})
-    return ResponseOK(documents)
+    headers = {}
+    if page['next_cursor'] is not None:
+        headers['X-Next-Cursor'] = page['next_cursor']
+    return ResponseOK(page['documents'], headers)
 
 
-@app.route('/document/<int:doc_id>', methods=['GET'])
+@api.route('/document/<int:doc_id>', methods=['GET'])
 @format_response
 @use_authentication(required=False)
 def get_document(doc_id, auth_info):
@@ -134,7 +265,7 @@ def get_document(doc_id, auth_info):
     return ResponseOK(document)
 
 
-@app.route('/document/<int:doc_id>', methods=['PUT'])
+@api.route('/document/<int:doc_id>', methods=['PUT'])
 @format_response
 @use_authentication()
 def update_document(doc_id, auth_info):
@@ -144,7 +275,7 @@ def update_document(doc_id, auth_info):
     return ResponseOK(updated_document)
 
 
-@app.route('/document/<int:doc_id>', methods=['DELETE'])
+@api.route('/document/<int:doc_id>', methods=['DELETE'])
 @format_response
 @use_authentication()
 def delete_document(doc_id, auth_info):
@@ -155,7 +286,7 @@ def delete_document(doc_id, auth_info):
 # ---- DOCUMENT -- COMMENTS ----------------------------------------------------
 
 
-@app.route('/document/<int:doc_id>/comment', methods=['POST'])
+@api.route('/document/<int:doc_id>/comment', methods=['POST'])
 @format_response
 @use_authentication()
 def create_comment(doc_id, auth_info):
@@ -167,23 +298,23 @@ def create_comment(doc_id, auth_info):
     return ResponseCreated(comment)
 
 
-@app.route('/document/<int:doc_id>/comment', methods=['GET'])
+@api.route('/document/<int:doc_id>/comment', methods=['GET'])
 @format_response
 @use_authentication(required=False)
 def get_comment(doc_id, auth_info):
-    DocController.get_document_by_id(doc_id, auth_info)
+    DocController.check_document_access(doc_id, auth_info)
     comments = CommentController.get_comments(doc_id)
     return ResponseOK(comments)
 
 
-@app.route('/comment/<int:comment_id>', methods=['GET'])
+@api.route('/comment/<int:comment_id>', methods=['GET'])
 @format_response
 def get_comment_by_id(comment_id):
     comment = CommentController.get_comment(comment_id)
     return ResponseOK(comment)
 
 
-@app.route('/comment/<int:comment_id>', methods=['PUT'])
+@api.route('/comment/<int:comment_id>', methods=['PUT'])
 @format_response
 @use_authentication()
 def update_comment(comment_id, auth_info):
@@ -195,7 +326,7 @@ def update_comment(comment_id, auth_info):
     return ResponseOK(updated_comment)
 
 
-@app.route('/comment/<int:comment_id>', methods=['DELETE'])
+@api.route('/comment/<int:comment_id>', methods=['DELETE'])
 @format_response
 @use_authentication()
 def delete_comment(comment_id, auth_info):
@@ -206,12 +337,12 @@ def delete_comment(comment_id, auth_info):
 # ---- DOCUMENTS -- ARCHIVES ---------------------------------------------------
 
 
-@app.route('/document/<int:doc_id>/archive', methods=['GET'])
+@api.route('/document/<int:doc_id>/archive', methods=['GET'])
 @format_response
 @use_authentication(required=False)
 def get_archive(doc_id, auth_info):
     try:
-        DocController.get_document_by_id(doc_id, auth_info)
+        DocController.check_document_access(doc_id, auth_info)
     except NoResultFound:
         raise NotFound("Document does not exist")
     archive = ArchiveController.get_archive(doc_id)
@@ -221,7 +352,7 @@ def get_archive(doc_id, auth_info):
 # ---- DOCUMENTS -- VALIDATION -------------------------------------------------
 
 
-@app.route('/document/validate', methods=['POST'])
+@api.route('/document/validate', methods=['POST'])
 @format_response
 @use_authentication()
 def validate_document(auth_info):
@@ -230,7 +361,7 @@ def validate_document(auth_info):
     return ResponseOK(validated_document)
 
 
-@app.route('/document/in_validation', methods=['GET'])
+@api.route('/document/in_validation', methods=['GET'])
 @format_response
 @use_authentication()
 def get_documents_to_validate(auth_info):
@@ -238,49 +369,110 @@ def get_documents_to_validate(auth_info):
     return ResponseOK(documents)
 
 
+@api.route('/document/export', methods=['GET'])
+@format_response
+@use_authentication()
+def export_documents(auth_info):
+    """
+    Streams all the documents as NDJSON (one JSON document per line), with
+    their comments, versions and links (see `ExportController`). As it
+    includes the documents in validation, the export is restricted to
+    moderators and administrators.
+    """
+    if not Document.is_allowed(auth_info):
+        raise AuthError('Only moderators can export the documents')
+    lines = (dumps(document) + b'\n'
+             for document in ExportController.export_documents())
+    return current_app.response_class(lines,
+                                      mimetype='application/x-ndjson')
+
+
 # ---- DOCUMENTS -- FILES ------------------------------------------------------
 
 
 # This method does not follow the standard scheme because of the
-# `send_from_directory` flask method (hence neither `format_response` nor
-# a `Response` object are present).
-@app.route('/document/<int:doc_id>/file', methods=['GET'])
+# `send_file` flask method (hence no `Response` object is present).
+@api.route('/document/<int:doc_id>/file', methods=['GET'])
 @format_response
 @use_authentication(required=False)
 def get_document_file(doc_id, auth_info):
-    location = DocController.get_document_file_location(doc_id, auth_info)
-    return send_from_directory(os.getcwd(), location)
-
-
-@app.route('/document/<int:doc_id>/file', methods=['POST'])
+    """
+    Sends the file of a document, with its content hash as ETag. Conditional
+    and range requests are supported. When the `v` parameter is the hash of
+    the file of a validated document, the response is cached for a long time
+    (the file of the document can change, but not the content of the URL).
+    Files of documents in validation are only cached privately.
+
+    Images can be resized with the `w` parameter (width in pixels, rounded up
+    to one of the `THUMBNAIL_WIDTHS`). Thumbnails are generated in the
+    background : the original image is sent until the thumbnail is ready.
+    """
+    document = DocController.check_document_access(doc_id, auth_info)
+    location = get_file_location(document['file'])
+    digest = get_file_digest(document['file'])
+    immutable = document['validated'] and digest is not None \
+        and request.args.get('v') == digest
+    if request.args.get('w'):
+        try:
+            width = int(request.args['w'])
+        except ValueError:
+            raise BadRequest('w must be an integer')
+        if width <= 0:
+            raise BadRequest('w must be positive')
+        thumbnail_width = get_thumbnail_width(width)
+        if thumbnail_width is not None:
+            thumbnail = thumbnail_cache.get(document['file'], thumbnail_width)
+            if thumbnail is None:
+                # The original must not be cached as the thumbnail
+                immutable = False
+            else:
+                location, digest = thumbnail
+    return send_stored_file(location, digest, immutable=immutable,
+                            private=not document['validated'])
+
+
+@api.route('/document/<int:doc_id>/file', methods=['POST'])
 @format_response
 @use_authentication()
 def upload_file(doc_id, auth_info):
-    if request.files.get('file'):
-        file = request.files['file']
-        filename = save_file(file)
-        updated_document = DocController.update_document(auth_info, doc_id, {
-            'file': filename
-        })
-        return ResponseOK(updated_document)
+    """
+    Replaces the file of a document. The file is either sent as the 'file'
+    field of a multipart form, or as the raw body of the request with its
+    name in the `filename` URL parameter. A raw body is streamed to the
+    upload folder without being buffered by the server.
+    """
+    if request.mimetype == 'multipart/form-data':
+        if not request.files.get('file'):
+            raise BadRequest("Missing 'file' data")
+        filename = save_file(request.files['file'])
     else:
-        raise BadRequest("Missing 'file' data")
+        if request.args.get('filename') is None:
+            raise BadRequest("Missing 'filename' parameter")
+        extension = get_extension(request.args['filename'])
+        if not allowed_file(extension):
+            raise FormatError("Invalid file format")
+        filename, _ = save_stream(request.stream, extension)
+    # If the document cannot be updated, the file is left to `sweep_files`
+    updated_document = DocController.update_document_file(
+        auth_info, doc_id, filename)
+    return ResponseOK(updated_document)
 
 
-@app.route('/document/<doc_id>/file', methods=['DELETE'])
+@api.route('/document/<doc_id>/file', methods=['DELETE'])
 @format_response
 @use_authentication()
 def delete_member_image(doc_id, auth_info):
-    filename = DocController.get_document_file_location(doc_id, auth_info)
+    DocController.check_document_access(doc_id, auth_info)
+    # The file is kept on disk, as the archive of the previous version of the
+    # document references it
     document = DocController.delete_document_file(auth_info, doc_id)
-    delete_file(filename)
     return ResponseOK(document)
 
 
 # ---- GUIDED TOURS ------------------------------------------------------------
 
 
-@app.route('/guidedTour', methods=['POST'])
+@api.route('/guidedTour', methods=['POST'])
 @format_response
 def create_guided_tour():
     name = request.form.get('name')
@@ -292,28 +484,30 @@ def create_guided_tour():
     return ResponseCreated(guided_tour)
 
 
-@app.route('/guidedTour', methods=['GET'])
+@api.route('/guidedTour', methods=['GET'])
+@cache_response(*TOUR_TABLES)
 @format_response
 def get_all_guided_tours():
     guided_tours = TourController.get_tours()
     return ResponseOK(guided_tours)
 
 
-@app.route('/guidedTour/<int:tour_id>', methods=['GET'])
+@api.route('/guidedTour/<int:tour_id>', methods=['GET'])
+@cache_response(*TOUR_TABLES)
 @format_response
 def get_guided_tour(tour_id):
     guided_tour = TourController.get_tour_by_id(tour_id)
     return ResponseOK(guided_tour)
 
 
-@app.route('/guidedTour/<int:tour_id>', methods=['PUT'])
+@api.route('/guidedTour/<int:tour_id>', methods=['PUT'])
 @format_response
 def update_guided_tour(tour_id):
     updated_tour = TourController.update(tour_id, request.form)
     return ResponseOK(updated_tour)
 
 
-@app.route('/guidedTour/<int:doc_id>', methods=['DELETE'])
+@api.route('/guidedTour/<int:doc_id>', methods=['DELETE'])
 @format_response
 def delete_tour(doc_id):
     deleted_tour = TourController.delete_tour(doc_id)
@@ -323,7 +517,7 @@ def delete_tour(doc_id):
 # ---- GUIDED TOURS -- DOCUMENTS -----------------------------------------------
 
 
-@app.route('/guidedTour/<int:tour_id>/document', methods=['POST'])
+@api.route('/guidedTour/<int:tour_id>/document', methods=['POST'])
 @format_response
 def add_document_to_guided_tour(tour_id):
     doc_id = request.form.get('doc_id')
@@ -334,7 +528,7 @@ def add_document_to_guided_tour(tour_id):
     return ResponseCreated(guided_tour)
 
 
-@app.route('/guidedTour/<int:tour_id>/document/<int:doc_position>',
+@api.route('/guidedTour/<int:tour_id>/document/<int:doc_position>',
            methods=['POST'])
 @format_response
 def update_guided_tour_document(tour_id, doc_position):
@@ -342,7 +536,7 @@ def update_guided_tour_document(tour_id, doc_position):
     return ResponseOK(updated_tour)
 
 
-@app.route('/guidedTour/<int:tour_id>/document/<int:doc_position>',
+@api.route('/guidedTour/<int:tour_id>/document/<int:doc_position>',
            methods=['DELETE'])
 @format_response
 def delete_guided_tour_document(tour_id, doc_position):
@@ -352,7 +546,7 @@ def delete_guided_tour_document(tour_id, doc_position):
 # ---- LINKS -------------------------------------------------------------------
 
 
-@app.route('/link', methods=['GET'])
+@api.route('/link', methods=['GET'])
 @format_response
 def get_link_target_types():
     """
@@ -363,7 +557,8 @@ def get_link_target_types():
     return ResponseOK(types)
 
 
-@app.route('/link/<target_type_name>', methods=['GET'])
+@api.route('/link/<target_type_name>', methods=['GET'])
+@cache_response(*LINK_TABLES)
 @format_response
 def get_links(target_type_name):
     """
@@ -380,7 +575,7 @@ def get_links(target_type_name):
     return ResponseOK(links)
 
 
-@app.route('/link/<target_type_name>', methods=['POST'])
+@api.route('/link/<target_type_name>', methods=['POST'])
 @format_response
 def create_link(target_type_name):
     """
@@ -399,7 +594,42 @@ def create_link(target_type_name):
     return ResponseCreated(link)
 
 
-@app.route('/link/<target_type_name>/<int:link_id>', methods=['DELETE'])
+@api.route('/link/<target_type_name>/batch', methods=['POST'])
+@format_response
+def create_links(target_type_name):
+    """
+    Creates many links of the specified target type. The body is a JSON array
+    of link objects, or NDJSON (`application/x-ndjson`) with one link object
+    per line. Links which cannot be created are reported in the `errors` of
+    the response, with their index in the batch.
+
+    :param target_type_name: Name of the target type. Accepted names are :
+        'city_object'.
+    :return: The created links and the errors
+    """
+    result = LinkController.create_links(target_type_name, get_json_items())
+    if result['created']:
+        return ResponseCreated(result)
+    return ResponseOK(result)
+
+
+@api.route('/link/<target_type_name>/batch', methods=['DELETE'])
+@format_response
+def delete_links(target_type_name):
+    """
+    Deletes many links of the specified target type. The body is a JSON array
+    of link IDs, or NDJSON (`application/x-ndjson`) with one ID per line. IDs
+    which cannot be deleted are reported in the `errors` of the response,
+    with their index in the batch.
+
+    :param target_type_name: The target type of the links.
+    :return: The deleted links and the errors
+    """
+    result = LinkController.delete_links(target_type_name, get_json_items())
+    return ResponseOK(result)
+
+
+@api.route('/link/<target_type_name>/<int:link_id>', methods=['DELETE'])
 @format_response
 def delete_link(target_type_name, link_id):
     """
@@ -413,6 +643,16 @@ def delete_link(target_type_name, link_id):
     return ResponseOK(link)
 
 
+# Application used by `python3 api/web_api.py`, by the uWSGI configuration of
+# the `Deployment` folder and by `wsgi.py`
+app = create_app()
+
+
 if __name__ == '__main__':
+    # Development server. The debugger is only enabled with `debug=true` in
+    # the configuration.
+    VarConfig.install_sighup_handler()
+    pUnit.init_engine()
     Controller.create_tables()
-    app.run(debug=True, host='0.0.0.0')
+    app.run(debug=VarConfig.get().get('debug', 'false').lower() == 'true',
+            host='0.0.0.0', threaded=True)
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+WSGI entry point for production servers. With gunicorn, from the
+API_Enhanced_City directory:
+
+    gunicorn --config Deployment/gunicorn.conf.py wsgi:app
+
+The tables of the database are not created by the workers : the gunicorn
+configuration creates them once, before the workers are started.
+"""
+
+# The application created by `web_api`, so that each worker only creates one
+from web_api import app  # noqa: F401
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Compares the JSON encodings of the responses : `jsonify` with the
+`JsonCustomEncoder` of the Flask application, which was used before
+`util.response_encoding`, the standard library with compact separators,
+and orjson when it is installed. Also reports the size of the body and the
+time to compress it. Run from the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 benchmark/bench_encoding.py [number of documents]
+"""
+
+import datetime
+import gzip
+import sys
+import timeit
+
+from flask import Flask, jsonify
+
+from benchmark.bench_serialize import make_documents
+from util.JsonCustomEncoder import JsonCustomEncoder
+from util.serialize import serialize
+import util.response_encoding as response_encoding
+
+
+def measure(name, function, number):
+    duration = min(timeit.repeat(function, number=1, repeat=5))
+    print(f'{name:<24} {duration * 1000:8.2f} ms '
+          f'({duration / number * 1e6:.1f} us/document)')
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    content = serialize(make_documents(number))
+    for document in content:
+        document['refDate'] = datetime.datetime.now(datetime.timezone.utc)
+
+    app = Flask(__name__)
+    app.json_encoder = JsonCustomEncoder
+    orjson = response_encoding.orjson
+    with app.app_context():
+        measure('jsonify', lambda: jsonify(content).get_data(), number)
+        response_encoding.orjson = None
+        body = response_encoding.dumps(content)
+        measure('compact json', lambda: response_encoding.dumps(content),
+                number)
+        if orjson is not None:
+            response_encoding.orjson = orjson
+            assert response_encoding.dumps(content) == body
+            measure('orjson', lambda: response_encoding.dumps(content),
+                    number)
+        app.debug = True
+        print(f'\nBody of {number} documents : '
+              f'{len(jsonify(content).get_data())} bytes with jsonify in '
+              f'debug mode, {len(body)} bytes compact')
+
+    for name, compress in [
+            ('gzip', lambda: gzip.compress(
+                body, compresslevel=response_encoding.GZIP_LEVEL)),
+            ('br', lambda: response_encoding.brotli.compress(
+                body, quality=response_encoding.BROTLI_QUALITY))]:
+        if name == 'br' and response_encoding.brotli is None:
+            continue
+        duration = min(timeit.repeat(compress, number=1, repeat=5))
+        print(f'{name:<6} {len(compress()):>9} bytes in '
+              f'{duration * 1000:.2f} ms')
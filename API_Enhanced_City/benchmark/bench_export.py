@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Measures the duration and the peak memory of `ExportController`, for an
+increasing number of documents : the peak memory depends on the batch size,
+not on the number of documents. Run from the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 benchmark/bench_export.py [number of documents]
+
+Warning: like the tests, this script recreates the tables of the database
+configured in the .env file.
+"""
+
+import datetime
+import sys
+import time
+import tracemalloc
+
+import persistence_unit.PersistenceUnit as pUnit
+from controller.Controller import Controller
+from controller.ExportController import ExportController
+from entities.Comment import Comment
+from entities.Document import Document
+from entities.DocumentUser import DocumentUser
+from util.response_encoding import dumps
+
+
+def populate(number):
+    session = pUnit.Session()
+    try:
+        documents = []
+        for i in range(number):
+            document = Document({'role': {'label': 'admin'}})
+            document.update_initial({
+                'title': f'title {i}',
+                'source': 'source',
+                'description': 'a description ' * 20
+            })
+            documents.append(document)
+        session.add_all(documents)
+        session.flush()
+        for document in documents:
+            session.add(DocumentUser(document.id, 1))
+            comment = Comment()
+            comment.update({'doc_id': document.id, 'user_id': 1,
+                            'description': 'a comment',
+                            'date': datetime.datetime.now(
+                                datetime.timezone.utc)})
+            session.add(comment)
+        session.commit()
+    finally:
+        session.close()
+
+
+def measure():
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = 0
+    for document in ExportController.export_documents():
+        size += len(dumps(document)) + 1
+    duration = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return duration, peak, size
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    Controller.recreate_tables()
+    total = 0
+    for step in (number // 10, number - number // 10):
+        populate(step)
+        total += step
+        duration, peak, size = measure()
+        print(f'{total:>8} documents : {duration:6.2f} s, '
+              f'{size / 1e6:7.1f} MB exported, '
+              f'peak memory {peak / 1e6:5.1f} MB')
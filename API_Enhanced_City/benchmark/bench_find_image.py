@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Compares the indexed `util.upload.find_image` with the previous
+implementation, which listed the whole upload folder on each call. The files
+are created in a temporary folder. Run from the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 benchmark/bench_find_image.py [number of files]
+"""
+
+import os
+import random
+import re
+import sys
+import tempfile
+import timeit
+
+import util.upload as upload
+
+LOOKUPS = 100
+
+
+def legacy_find_image(member_id):
+    """
+    Lookup used before the index.
+    """
+    pattern = fr'^{member_id}\.[a-z]+$'
+    rex = re.compile(pattern)
+    files = os.listdir(os.path.join(os.getcwd(), upload.UPLOAD_FOLDER))
+    for file in files:
+        if rex.search(file):
+            return file
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    with tempfile.TemporaryDirectory() as folder:
+        upload.UPLOAD_FOLDER = folder
+        for i in range(number):
+            open(os.path.join(folder, f'{i}.png'), 'w').close()
+        member_ids = [random.randrange(number) for _ in range(LOOKUPS)]
+
+        for member_id in member_ids:
+            assert legacy_find_image(member_id) == \
+                upload.find_image(member_id) == f'{member_id}.png'
+
+        upload.file_index = upload.FileIndex()
+        build = timeit.timeit(lambda: upload.find_image(0), number=1)
+        print(f'{number} files, {LOOKUPS} lookups')
+        print(f'index build          {build * 1000:8.2f} ms (once)')
+        for name, function in [('directory scan', legacy_find_image),
+                               ('index', upload.find_image)]:
+            duration = min(timeit.repeat(
+                lambda: [function(member_id) for member_id in member_ids],
+                number=1, repeat=3))
+            print(f'{name:<20} {duration / LOOKUPS * 1000:8.3f} ms/lookup')
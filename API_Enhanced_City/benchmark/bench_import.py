@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Compares creating documents one by one with `DocController.create_document`
+with creating them in batches with `DocController.create_documents`, which
+the bulk import uses. Files are not saved. Run from the API_Enhanced_City
+directory:
+
+    PYTHONPATH=. python3 benchmark/bench_import.py [number of documents]
+
+Warning: like the tests, this script recreates the tables of the database
+configured in the .env file.
+"""
+
+import sys
+import time
+
+from controller.Controller import Controller
+from controller.DocController import DocController
+from controller.ImportController import ImportController
+
+AUTH_INFO = {'user_id': 1, 'role': {'label': 'admin'}}
+
+
+def make_documents(number):
+    return [{
+        'title': f'title {i}',
+        'source': 'source',
+        'description': 'a description ' * 20,
+        'file': f'{i}.gif',
+        'refDate': '2018-01-01',
+        'positionX': 1.0
+    } for i in range(number)]
+
+
+def create_one_by_one(documents):
+    for attributes in documents:
+        DocController.create_document(dict(attributes, **AUTH_INFO),
+                                      AUTH_INFO)
+
+
+def create_in_batches(documents):
+    batch_size = ImportController.batch_size
+    for start in range(0, len(documents), batch_size):
+        DocController.create_documents(documents[start:start + batch_size],
+                                       AUTH_INFO)
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    Controller.recreate_tables()
+    documents = make_documents(number)
+    for name, function in [('one by one', create_one_by_one),
+                           ('in batches', create_in_batches)]:
+        start = time.perf_counter()
+        function(documents)
+        duration = time.perf_counter() - start
+        print(f'{name:<12} {number} documents: {duration:6.2f} s '
+              f'({number / duration:.0f} documents/s)')
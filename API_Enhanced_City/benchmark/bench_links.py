@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Compares fetching all the links to city objects and filtering them on the
+client side with the bounding box and nearest neighbours queries of
+`LinkController`. Run from the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 benchmark/bench_links.py [number of links]
+
+Warning: like the tests, this script recreates the tables of the database
+configured in the .env file.
+"""
+
+import random
+import sys
+import timeit
+
+import persistence_unit.PersistenceUnit as pUnit
+from controller.Controller import Controller
+from controller.DocController import DocController
+from controller.LinkController import LinkController
+from entities.LinkCityObject import LinkCityObject
+
+BBOX = (4500, 4500, 5500, 5500)
+
+
+def populate(number):
+    Controller.recreate_tables()
+    DocController.create_document({
+        'title': 'title',
+        'source': 'source',
+        'description': 'a description',
+        'file': '1.gif',
+        'role': {'label': 'admin'}
+    }, {
+        'user_id': 1
+    })
+    session = pUnit.Session()
+    session.bulk_insert_mappings(LinkCityObject, [{
+        'source_id': 1,
+        'target_id': f'building_{i}',
+        'centroid_x': random.uniform(0, 10000),
+        'centroid_y': random.uniform(0, 10000),
+        'centroid_z': random.uniform(0, 100)
+    } for i in range(number)])
+    session.commit()
+    session.execute('ANALYZE link_city_object')
+    session.close()
+
+
+def fetch_all_and_filter():
+    min_x, min_y, max_x, max_y = BBOX
+    return [link for link in LinkController.get_links('city_object', {})
+            if min_x <= link['centroid_x'] <= max_x
+            and min_y <= link['centroid_y'] <= max_y]
+
+
+def bbox_query():
+    return LinkController.get_links('city_object', {
+        'bbox': ','.join(str(coordinate) for coordinate in BBOX)
+    })
+
+
+def nearest_query():
+    return LinkController.get_links('city_object', {
+        'near': '5000,5000',
+        'k': '10'
+    })
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    populate(number)
+    assert len(fetch_all_and_filter()) == len(bbox_query())
+    print(f'{number} links, PostGIS : {bool(LinkController.postgis)}')
+    for name, function in [('full fetch + filter', fetch_all_and_filter),
+                           ('bbox query', bbox_query),
+                           ('10 nearest query', nearest_query)]:
+        duration = min(timeit.repeat(function, number=1, repeat=5))
+        print(f'{name:<20} {duration * 1000:8.2f} ms')
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Measures the time spent by the request threads in the logging calls, with
+the plain `FileHandler` used before `util.log.configure_logging`, and with
+the queued handlers. The files are written in a temporary folder. Run from
+the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 benchmark/bench_logging.py [number of records]
+
+The records are written by the request threads with a `FileHandler`, and by
+a background thread with the queued handlers : the difference is visible
+when the writes block, which is simulated by the second measure.
+"""
+
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import util.log as log
+from util.VarConfig import VarConfig
+
+
+def measure(a_logger, number):
+    """
+    Returns the mean duration of a logging call in the calling thread, in
+    microseconds.
+    """
+    try:
+        raise ValueError('invalid value')
+    except ValueError as e:
+        error = e
+    start = time.perf_counter()
+    for i in range(number):
+        if i % 10:
+            a_logger.info(f'Request {i} handled')
+        else:
+            # Errors of `make_a_transaction`
+            a_logger.error(error, exc_info=True)
+    return (time.perf_counter() - start) / number * 1e6
+
+
+def slow_disk(latency):
+    """
+    Simulates a disk whose writes block for `latency` seconds (e.g. a
+    saturated or network disk), by delaying the flush of the handlers.
+    """
+    flush = logging.StreamHandler.flush
+
+    def slow_flush(handler):
+        flush(handler)
+        time.sleep(latency)
+
+    logging.StreamHandler.flush = slow_flush
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    print(f'{number} records (10% with a traceback)')
+    with tempfile.TemporaryDirectory() as folder:
+        os.environ['EXTENDED_DOC_LOG_FOLDER'] = folder
+        VarConfig.reload()
+        for latency in (0, 0.0002):
+            if latency:
+                slow_disk(latency)
+            file_handler = logging.FileHandler(
+                os.path.join(folder, 'plain.log'), mode='w')
+            file_handler.setFormatter(logging.Formatter(
+                log.default_formatter))
+            plain_logger = logging.getLogger('bench_plain')
+            plain_logger.propagate = False
+            plain_logger.setLevel(logging.DEBUG)
+            plain_logger.addHandler(file_handler)
+            plain = measure(plain_logger, number)
+            plain_logger.removeHandler(file_handler)
+            file_handler.close()
+
+            log.configure_logging()
+            queued = measure(log.info_logger, number)
+            log.stop_logging()
+
+            print(f'Disk latency of {latency * 1e6:.0f} us')
+            print(f'  FileHandler        {plain:8.2f} us/record')
+            print(f'  QueueHandler       {queued:8.2f} us/record')
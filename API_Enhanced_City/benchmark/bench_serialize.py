@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Compares the compiled serializers of `util.serialize` with the previous
+serialization path, which listed the attributes of each object with `dir()`.
+Run from the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 benchmark/bench_serialize.py [number of documents]
+"""
+
+import sys
+import timeit
+
+from entities.Comment import Comment
+from entities.Document import Document
+from entities.DocumentUser import DocumentUser
+from entities.User import User
+from entities.VersionDoc import VersionDoc
+from util.serialize import serialize
+
+EXCLUDED = {
+    'Document': {'documentUser'},
+    'DocumentUser': {'document', 'user'},
+    'User': {'password', 'comments', 'version', 'extended_document'}
+}
+
+
+def legacy_serialize(objects_to_serialize):
+    """
+    Serialization path used before the compiled serializers.
+    """
+    if hasattr(objects_to_serialize, '__table__'):
+        obj = objects_to_serialize
+        excluded = EXCLUDED.get(type(obj).__name__, set())
+        attributes = {i for i in dir(obj)
+                      if not (i.startswith('_')
+                              or callable(getattr(obj, i))
+                              or i in ("metadata", "serialize_exclude"))}
+        serialized_object = {}
+        for attr in attributes:
+            if attr not in excluded:
+                serialized_object[attr] = legacy_serialize(getattr(obj, attr))
+        if isinstance(obj, Document):
+            serialized_object['user_id'] = obj.owner_id()
+        return serialized_object
+    if isinstance(objects_to_serialize, list):
+        return [legacy_serialize(obj) for obj in objects_to_serialize]
+    return objects_to_serialize
+
+
+def make_documents(number):
+    documents = []
+    for i in range(number):
+        document = Document({'role': {'label': 'admin'}})
+        document.update_initial({
+            'id': i,
+            'title': f'title {i}',
+            'source': 'source',
+            'description': 'a description ' * 20,
+            'file': f'{i}.gif',
+            'positionX': 1.0
+        })
+        document.documentUser.append(DocumentUser(i, 1))
+        for j in range(3):
+            comment = Comment()
+            comment.update({'id': j, 'doc_id': i, 'user_id': 1,
+                            'description': 'a comment'})
+            document.comments.append(comment)
+        documents.append(document)
+    return documents
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    documents = make_documents(number)
+    assert serialize(documents) == legacy_serialize(documents)
+
+    for name, function in [('dir() based', legacy_serialize),
+                           ('compiled', serialize)]:
+        duration = min(timeit.repeat(lambda: function(documents),
+                                     number=1, repeat=5))
+        print(f'{name:<12} {number} documents: {duration * 1000:8.2f} ms '
+              f'({duration / number * 1e6:.1f} us/document)')
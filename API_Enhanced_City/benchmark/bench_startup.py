@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Measures the time to import the application in a new interpreter, as CLI
+tools, tests and server workers do. The database is configured on a port
+where nothing listens, to check that importing the application does not
+connect to it. Run from the API_Enhanced_City directory:
+
+    PYTHONPATH=. python3 benchmark/bench_startup.py [number of runs]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+MODULES = ['persistence_unit.PersistenceUnit', 'controller.Controller',
+           'web_api']
+
+SCRIPT = '''
+import sys
+import time
+start = time.perf_counter()
+import {module}
+duration = time.perf_counter() - start
+import persistence_unit.PersistenceUnit as pUnit
+print(duration, pUnit.engine is None)
+'''
+
+
+def measure(module, runs):
+    environment = dict(os.environ)
+    environment['EXTENDED_DOC_PORT'] = '1'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    environment['PYTHONPATH'] = os.pathsep.join(
+        [root, os.path.join(root, 'api')])
+    durations = []
+    lazy = False
+    for _ in range(runs):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, '-c', SCRIPT.format(module=module)],
+            env=environment, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            universal_newlines=True)
+        if process.returncode != 0:
+            # The module exited while importing, e.g. when it cannot connect
+            return time.perf_counter() - start, None
+        output = process.stdout.split()
+        durations.append(float(output[-2]))
+        lazy = output[-1] == 'True'
+    return min(durations), lazy
+
+
+if __name__ == '__main__':
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f'Best of {runs} imports, database unreachable')
+    for module in MODULES:
+        duration, lazy = measure(module, runs)
+        if lazy is None:
+            state = 'import failed'
+        else:
+            state = 'no engine' if lazy else 'engine created'
+        print(f'{module:<36} {duration * 1000:8.1f} ms ({state})')
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+"""
+Sends requests to a running server from concurrent clients and reports the
+number of requests per second and the latency percentiles. For instance, to
+compare worker models:
+
+    gunicorn --config Deployment/gunicorn.conf.py wsgi:app
+    python3 benchmark/load_test.py http://localhost:5000/document?limit=20
+
+Options :
+    -c, --concurrency   number of concurrent clients (10)
+    -d, --duration      duration of the test, in seconds (10)
+"""
+
+import argparse
+import threading
+import time
+import urllib.error
+import urllib.request
+
+
+def run_client(url, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url) as response:
+                response.read()
+        except (urllib.error.URLError, OSError):
+            errors.append(1)
+            continue
+        latencies.append(time.perf_counter() - start)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of a route')
+    parser.add_argument('url')
+    parser.add_argument('-c', '--concurrency', type=int, default=10)
+    parser.add_argument('-d', '--duration', type=float, default=10)
+    arguments = parser.parse_args()
+
+    latencies = []
+    errors = []
+    deadline = time.perf_counter() + arguments.duration
+    clients = [threading.Thread(target=run_client,
+                                args=(arguments.url, deadline, latencies,
+                                      errors))
+               for _ in range(arguments.concurrency)]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    duration = time.perf_counter() - start
+
+    latencies.sort()
+    print(f'{len(latencies)} requests in {duration:.1f}s, '
+          f'{arguments.concurrency} clients, {len(errors)} errors')
+    print(f'requests/s : {len(latencies) / duration:.1f}')
+    if latencies:
+        for name, fraction in [('p50', 0.5), ('p90', 0.9), ('p99', 0.99)]:
+            print(f'{name}        : '
+                  f'{percentile(latencies, fraction) * 1000:.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -12,6 +12,7 @@ from entities.User import User
 from entities.Document import Document
 
 import persistence_unit.PersistenceUnit as pUnit
+import persistence_unit.AsyncPersistenceUnit as aUnit
 
 import datetime
 
@@ -57,11 +58,31 @@ class CommentController:
         This method is used to make a research the comments of a document
         """
         doc_id = args[0]
+        return CommentController.query_comments(session, doc_id).all()
 
-        query = session.query(Comment).filter(
-            and_(Comment.doc_id == doc_id)).order_by(Comment.date.desc())
+    @staticmethod
+    @aUnit.make_an_async_query
+    async def get_comments_async(connection, doc_id):
+        """
+        Asynchronous version of `get_comments`.
+        :param connection: An asyncpg connection
+        :param doc_id: The ID of the document
+        :return: The serialized comments of the document
+        """
+        query = CommentController.query_comments(aUnit.query_session, doc_id)
+        return [aUnit.to_dict(Comment, record)
+                for record in await aUnit.fetch(connection, query)]
 
-        return query.all()
+    @staticmethod
+    def query_comments(session, doc_id):
+        """
+        Creates the query on the comments of a document, latest first.
+        :param session: The SQLAlchemy session
+        :param doc_id: The ID of the document
+        :return: The query
+        """
+        return session.query(Comment).filter(
+            and_(Comment.doc_id == doc_id)).order_by(Comment.date.desc())
 
     @staticmethod
     @pUnit.make_a_transaction
@@ -1,6 +1,8 @@
 #!/usr/bin/env python3
 # coding: utf8
 
+from sqlalchemy import inspect
+
 from util.db_config import *
 import persistence_unit.PersistenceUnit as pUnit
 from controller.UserController import UserController
@@ -9,14 +11,14 @@ from controller.UserRoleController import UserRoleController
 from entities.User import User
 from entities.UserRole import UserRole
 from entities.GuidedTour import GuidedTour
-from entities.Document import Document
+from entities.Document import Document, fulltext_index
 from entities.DocumentGuidedTour import DocumentGuidedTour
 from entities.Comment import Comment
 from entities.VersionDoc import VersionDoc
 from entities.DocumentUser import DocumentUser
 from entities.ValidationStatus import ValidationStatus
 from entities.Visualisation import Visualisation
-from entities.LinkCityObject import LinkCityObject
+from entities.LinkCityObject import LinkCityObject, centroid_gist_index
 
 
 class Controller:
@@ -31,11 +33,31 @@ class Controller:
 
     @staticmethod
     def recreate_tables():
-        Base.metadata.drop_all(pUnit.engine)
+        Base.metadata.drop_all(pUnit.get_engine())
         Controller.create_tables()
 
     @staticmethod
     def create_tables():
-        Base.metadata.create_all(pUnit.engine)
+        engine = pUnit.get_engine()
+        Base.metadata.create_all(engine)
+        Controller.create_missing_indexes()
+        fulltext_index.execute(bind=engine)
+        centroid_gist_index.execute(bind=engine)
         UserRoleController.create_all_roles()
         UserController.create_admin()
+
+    @staticmethod
+    def create_missing_indexes():
+        """
+        Creates the indexes declared on entities which do not exist in the
+        database yet. `create_all` only creates the indexes of new tables, so
+        this adds indexes declared after a table was created.
+        """
+        engine = pUnit.get_engine()
+        inspector = inspect(engine)
+        for table in Base.metadata.sorted_tables:
+            existing_indexes = {index['name'] for index in
+                                inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing_indexes:
+                    index.create(engine)
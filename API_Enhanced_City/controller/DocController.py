@@ -1,18 +1,28 @@
 #!/usr/bin/env python3
 # coding: utf8
 
-from sqlalchemy import or_, and_
+import base64
+import json
+
+from sqlalchemy import or_, and_, case, cast, func, exists, Float
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import contains_eager, joinedload, selectinload, load_only
+from sqlalchemy.orm import undefer
 
 from util.log import *
 from util.upload import *
 from util.Exception import *
+from util.serialize import get_serializer
 
 from entities.Document import Document
 from entities.ValidationStatus import ValidationStatus, Status
 from entities.DocumentUser import DocumentUser
+from entities.VersionDoc import VersionDoc
+from entities.Visualisation import Visualisation
 from controller.ArchiveController import ArchiveController
 
 import persistence_unit.PersistenceUnit as pUnit
+import persistence_unit.AsyncPersistenceUnit as aUnit
 
 
 class DocController:
@@ -25,6 +35,213 @@ class DocController:
     and make_a_transaction
     """
     keyword_attr = ["title", "description"]
+    search_modes = ["substring", "fulltext"]
+
+    # Attributes which can be used to order and paginate documents
+    order_attr = ["id", "refDate"]
+    max_page_size = 1000
+    # Number of documents of a page when a cursor is given without limit
+    default_page_size = 100
+
+    # Attributes which must be given to create a document
+    required_attr = ["title", "source", "description", "file"]
+    # Maximum number of documents of `create_documents`
+    max_batch_size = 1000
+    # Attributes which `update_document` cannot change : the file of a
+    # document is replaced with `update_document_file`
+    read_only_attr = ["id", "file"]
+
+    # Eager loading strategies of the relationships `Document.serialize`
+    # needs, so that serializing N documents costs a constant number of
+    # queries. The 'list' and 'moderation' profiles expect the query to be
+    # joined with ValidationStatus.
+    loading_profiles = {
+        'list': {'validationStatus': contains_eager,
+                 'visualization': joinedload,
+                 'comments': selectinload,
+                 'documentUser': selectinload},
+        'detail': {'validationStatus': joinedload,
+                   'visualization': joinedload,
+                   'comments': joinedload,
+                   'documentUser': joinedload},
+        'moderation': {'validationStatus': contains_eager,
+                       'visualization': joinedload,
+                       'documentUser': joinedload,
+                       'comments': selectinload}
+    }
+
+    @staticmethod
+    def query_documents(session, profile, fields=None):
+        """
+        Creates a query on documents using one of the `loading_profiles`.
+        :param session: The SQLAlchemy session
+        :param profile: The name of the loading profile ('list', 'detail' or
+        'moderation')
+        :param fields: The serialized fields (see `parse_fields`), or None if
+        all of them are. Relationships which are not serialized are not
+        loaded, and columns which are not serialized are deferred.
+        :return: The query
+        """
+        query = session.query(Document)
+        if profile != 'detail':
+            query = query.join(ValidationStatus)
+        relationships = DocController.get_relationships(profile, fields)
+        if fields is not None:
+            query = query.options(load_only(
+                *[column for column in get_serializer(Document).columns
+                  if column in fields]))
+        return query.options(*[loader(getattr(Document, key))
+                               for key, loader in relationships.items()])
+
+    @staticmethod
+    def get_relationships(profile, fields=None):
+        """
+        Returns the relationships of the documents which are serialized.
+        :param profile: The name of the loading profile
+        :param fields: The serialized fields, or None if all of them are
+        :return: A dict of the loading strategies of the relationships, keyed
+        by name
+        """
+        relationships = DocController.loading_profiles[profile]
+        if fields is None:
+            return relationships
+        # The owner of a document is serialized as 'user_id'
+        return {key: loader for key, loader in relationships.items()
+                if key in fields or (key == 'documentUser'
+                                     and 'user_id' in fields)}
+
+    @staticmethod
+    def parse_fields(fields):
+        """
+        Parses the `fields` parameter of a research, which is a comma separated
+        list of the document fields to return. The 'id' field is always
+        returned.
+        :param fields: The value of the parameter, or None
+        :return: The set of fields, or None if all fields are returned
+        :raises BadRequest: if a field does not exist
+        """
+        if fields is None:
+            return None
+        serializer = get_serializer(Document)
+        existing_fields = set(serializer.columns) | {'user_id'} | {
+            key for key, _ in serializer.relationships}
+        fields = {field.strip() for field in fields.split(',')
+                  if field.strip()} | {'id'}
+        unknown_fields = fields - existing_fields
+        if unknown_fields:
+            raise BadRequest(f'Unknown fields : {", ".join(unknown_fields)}')
+        return fields
+
+    @staticmethod
+    def paginate(query, attributes, rank=None):
+        """
+        Orders the query and applies keyset pagination. The following
+        parameters are popped from `attributes` :
+         - `orderBy` : 'id' (default) or 'refDate'
+         - `limit` : maximum number of documents to return. All the
+           documents are returned when neither `limit` nor `cursor` is
+           given, and `default_page_size` when only `cursor` is.
+         - `cursor` : the cursor returned with the previous page
+        When `rank` is given, documents are ordered by decreasing rank (then
+        by id) instead of `orderBy`, and the query also returns the rank of
+        each document, as the 'rank' column.
+        :param query: The query on documents
+        :param attributes: The research parameters
+        :param rank: The relevance of the documents (see `fulltext_rank`)
+        :return: The paginated query, the limit (None if the query is not
+        limited) and the ordering attribute ('rank' when ordered by rank)
+        :raises BadRequest: if a parameter is invalid
+        """
+        order_by = attributes.pop('orderBy', None)
+        if rank is not None:
+            if order_by:
+                raise BadRequest('Full-text research results are ordered by '
+                                 'relevance and cannot be ordered by '
+                                 f'{order_by}')
+            order_by = 'rank'
+        else:
+            order_by = order_by or 'id'
+            if order_by not in DocController.order_attr:
+                raise BadRequest(f'Cannot order documents by {order_by}')
+        limit = attributes.pop('limit', None)
+        cursor = attributes.pop('cursor', None)
+        if limit is None and cursor:
+            limit = DocController.default_page_size
+        if limit is not None:
+            try:
+                limit = int(limit)
+            except ValueError:
+                raise BadRequest('limit must be an integer')
+            if not 0 < limit <= DocController.max_page_size:
+                raise BadRequest(f'limit must be between 1 and '
+                                 f'{DocController.max_page_size}')
+
+        if order_by == 'rank':
+            rank_column = rank.label('rank')
+            query = query.add_columns(rank_column).order_by(
+                rank_column.desc(), Document.id)
+        elif order_by == 'refDate':
+            query = query.order_by(Document.refDate.asc().nullslast(),
+                                   Document.id)
+        else:
+            query = query.order_by(Document.id)
+
+        if cursor:
+            cursor_order_by, value, last_id = DocController.decode_cursor(
+                cursor)
+            if cursor_order_by != order_by:
+                raise BadRequest('The cursor does not match orderBy')
+            if order_by == 'id':
+                query = query.filter(Document.id > last_id)
+            elif order_by == 'rank':
+                if not isinstance(value, (int, float)):
+                    raise BadRequest('Invalid cursor')
+                query = query.filter(or_(
+                    rank < value,
+                    and_(rank == value, Document.id > last_id)))
+            elif value is None:
+                # Documents without refDate come last
+                query = query.filter(and_(Document.refDate.is_(None),
+                                          Document.id > last_id))
+            else:
+                query = query.filter(or_(
+                    Document.refDate > value,
+                    and_(Document.refDate == value, Document.id > last_id),
+                    Document.refDate.is_(None)))
+
+        if limit is not None:
+            # Fetch one more document to know if there is a next page
+            query = query.limit(limit + 1)
+        if order_by == 'refDate':
+            # Needed by the cursor, even if it is not serialized
+            query = query.options(undefer(Document.refDate))
+        return query, limit, order_by
+
+    @staticmethod
+    def encode_cursor(order_by, doc_id, value=None):
+        """
+        Encodes the cursor of the page following a document.
+        :param order_by: The ordering attribute (see `paginate`)
+        :param doc_id: The id of the last document of the page
+        :param value: The refDate or the rank of the document, depending on
+        `order_by`
+        :return: The cursor
+        """
+        if order_by == 'id':
+            value = None
+        elif order_by == 'refDate' and value is not None:
+            value = value.isoformat()
+        cursor = json.dumps([order_by, value, doc_id])
+        return base64.urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            order_by, value, last_id = json.loads(
+                base64.urlsafe_b64decode(cursor.encode('ascii')))
+            return order_by, value, int(last_id)
+        except (ValueError, TypeError):
+            raise BadRequest('Invalid cursor')
 
     @staticmethod
     @pUnit.make_a_transaction
@@ -32,12 +249,119 @@ class DocController:
         document = Document(attributes)
         document.update_initial(attributes)
         session.add(document)
-        # Commit to assign an id to the document
-        session.commit()
+        # Flush to assign an id to the document, which is committed with its
+        # owner
+        session.flush()
         document_user = DocumentUser(document.id, auth_info['user_id'])
         session.add(document_user)
         return document
 
+    @staticmethod
+    @pUnit.make_a_transaction
+    def create_documents(session, documents, auth_info):
+        """
+        Creates many documents owned by the authenticated user, in a single
+        transaction. The documents are validated one by one, then inserted
+        with one multi-row INSERT per table. If the database rejects the
+        batch, the documents are inserted one by one instead, each in a
+        savepoint, to find the rejected ones.
+        :param session: The SQLAlchemy session (auto filled)
+        :param list documents: The attributes of the documents (see
+            `create_document`).
+        :param auth_info: The auth info of the owner of the documents. Their
+            documents are validated if they are allowed to (see
+            `Document.is_allowed`).
+        :return: A dict with the `created` documents, as their `index` in
+            `documents` and their `id`, and the `errors` of the documents
+            which could not be created, identified by their `index`.
+        """
+        if len(documents) > DocController.max_batch_size:
+            raise BadRequest(f'A batch cannot contain more than '
+                             f'{DocController.max_batch_size} documents')
+        rows = {}
+        errors = {}
+        for index, attributes in enumerate(documents):
+            try:
+                rows[index] = DocController.make_document_row(attributes)
+            except BadRequest as e:
+                errors[index] = str(e)
+
+        ids = {}
+        status = Status.Validated if Document.is_allowed(auth_info) \
+            else Status.InValidation
+        try:
+            with session.begin_nested():
+                ids.update(zip(rows, DocController.insert_documents(
+                    session, list(rows.values()), status,
+                    auth_info['user_id'])))
+        except DBAPIError:
+            for index, row in rows.items():
+                try:
+                    with session.begin_nested():
+                        ids[index], = DocController.insert_documents(
+                            session, [row], status, auth_info['user_id'])
+                except DBAPIError as e:
+                    errors[index] = str(e.orig).strip().splitlines()[0]
+
+        return {
+            'created': [{'index': index, 'id': ids[index]}
+                        for index in sorted(ids)],
+            'errors': [{'index': index, 'message': errors[index]}
+                       for index in sorted(errors)]
+        }
+
+    @staticmethod
+    def make_document_row(attributes):
+        """
+        Converts the attributes of a document into rows of the document and
+        visualisation tables. Empty values are considered missing.
+        :param dict attributes: The attributes of the document.
+        :return: A dict of the `document` and `visualisation` rows.
+        :raises BadRequest: if a required attribute is missing.
+        """
+        if not isinstance(attributes, dict):
+            raise BadRequest('A document must be an object')
+        missing = [attr for attr in DocController.required_attr
+                   if attributes.get(attr) in (None, '')]
+        if missing:
+            raise BadRequest(f"Missing parameters : {', '.join(missing)}")
+        rows = {}
+        for table in (Document.__table__, Visualisation.__table__):
+            rows[table.name] = {}
+            for column in table.columns:
+                if not column.primary_key:
+                    value = attributes.get(column.name)
+                    rows[table.name][column.name] = \
+                        None if value == '' else value
+        return rows
+
+    @staticmethod
+    def insert_documents(session, rows, status, user_id):
+        """
+        Inserts documents with their visualisation, validation status and
+        owner, with one INSERT statement per table.
+        :param session: The SQLAlchemy session
+        :param list rows: The rows of the documents (see `make_document_row`)
+        :param Status status: The validation status of the documents
+        :param int user_id: The id of the owner of the documents
+        :return: The ids of the documents, in the order of `rows`.
+        """
+        if not rows:
+            return []
+        table = Document.__table__
+        ids = [id for id, in session.execute(
+            table.insert().values([row[table.name] for row in rows])
+            .returning(table.c.id))]
+        visualisation_table = Visualisation.__table__
+        session.execute(visualisation_table.insert().values(
+            [dict(row[visualisation_table.name], id=id)
+             for row, id in zip(rows, ids)]))
+        session.execute(ValidationStatus.__table__.insert().values(
+            [{'doc_id': id, 'status': status} for id in ids]))
+        session.execute(DocumentUser.__table__.insert().values(
+            [{'doc_id': id, 'user_id': user_id} for id in ids]))
+        return ids
+
     @staticmethod
     @pUnit.make_a_transaction
     def validate_document(session, *args):
@@ -52,13 +376,56 @@ class DocController:
         else:
             raise AuthError
 
+    @staticmethod
+    def check_access(document, auth_info):
+        """
+        Checks that a user can read a document which is already loaded. In the
+        case where the document is in validation, only an admin or the owner of
+        the document can access it. The validation status and the owner of the
+        document should be eagerly loaded to avoid additional queries.
+        :param document: The document
+        :param auth_info: The auth info
+        :raises Unauthorized: if this is a document in validation and the user
+        is not authenticated
+        :raises AuthError: if this is a document in validation and the user has
+        no privilege on it
+        """
+        DocController.check_read_access(
+            document.validationStatus.status == Status.Validated,
+            document.owner_id() if document.documentUser else None,
+            auth_info)
+
+    @staticmethod
+    def check_read_access(validated, owner_id, auth_info):
+        """
+        Checks that a user can read a document (see `check_access`).
+        :param validated: Whether the document is validated
+        :param owner_id: The id of the owner of the document
+        :param auth_info: The auth info
+        """
+        # If we're an admin, no need to check what document it is
+        if auth_info is not None and Document.is_allowed(auth_info):
+            return
+        # If the document is validated, everybody can see it
+        if not validated:
+            # The only case where we're not allowed to access the document
+            # is when it's in validation and we're neither the owner nor an
+            # admin
+            if auth_info is None:
+                # In this case we return unauthorized because the user could
+                # access the resource if he/she authenticate
+                raise Unauthorized
+            if owner_id != auth_info["user_id"]:
+                # In this case we return forbidden because the user is
+                # authenticated but hasn't the rights on the doc
+                raise AuthError
+
     @staticmethod
     @pUnit.make_a_query
     def get_document_by_id(session, doc_id, auth_info):
         """
-        Gets a document by its id. The code is a bit tricky because in the case
-        where the document is in validation, only an admin or the owner of the
-        document can access it.
+        Gets a document by its id, with a single query which also loads what
+        is needed to check the access rights (see `check_access`).
         :param session: The SQLAlchemy session
         :param doc_id: An id of a document
         :param auth_info: The auth info
@@ -67,58 +434,86 @@ class DocController:
         no privilege on it
         :raises NoResultFound: if the document isn't in the database
         """
-        # If we're an admin, no need to check what document it is
-        if auth_info is None or not Document.is_allowed(auth_info):
-            document = session.query(Document).join(ValidationStatus) \
-                              .filter(Document.id == doc_id).one()
-            # If the document is validated, everybody can see it
-            if document.validationStatus.status != Status.Validated:
-                # The only case where we're not allowed to access the document
-                # is when it's in validation and we're neither the owner nor an
-                # admin
-                if auth_info is None:
-                    # In this case we return unauthorized because the user could
-                    # access the resource if he/she authenticate
-                    raise Unauthorized
-                if document.owner_id() != auth_info["user_id"]:
-                    # In this case we return forbidden because the user is
-                    # authenticated but hasn't the rights on the doc
-                    raise AuthError
-        return session.query(Document).filter(
+        document = DocController.query_documents(session, 'detail').filter(
             Document.id == doc_id).one()
+        DocController.check_access(document, auth_info)
+        return document
 
     @staticmethod
-    def get_document_file_location(doc_id, auth_info):
-        document = DocController.get_document_by_id(doc_id, auth_info)
-        filename = document['file']
-        location = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.exists(location):
-            return location
-        raise NotFound("File doest not exist")
+    @pUnit.make_a_query
+    def check_document_access(session, doc_id, auth_info):
+        """
+        Checks that a user can read a document, without loading the whole
+        document. Used by the routes of the resources of a document (comments,
+        archives, file).
+        :param session: The SQLAlchemy session
+        :param doc_id: An id of a document
+        :param auth_info: The auth info
+        :return: The id and the file of the document, and whether it is
+        validated
+        :raises AuthError: if this is a document in validation and the user has
+        no privilege on it
+        :raises NoResultFound: if the document isn't in the database
+        """
+        document = session.query(Document).options(
+            load_only('id', 'file'),
+            joinedload(Document.validationStatus),
+            joinedload(Document.documentUser)).filter(
+            Document.id == doc_id).one()
+        DocController.check_access(document, auth_info)
+        return {
+            'id': document.id,
+            'file': document.file,
+            'validated': document.validationStatus.status == Status.Validated
+        }
 
     @staticmethod
-    @pUnit.make_a_query
-    def get_documents(session, *args):
+    @aUnit.make_an_async_query
+    async def check_document_access_async(connection, doc_id, auth_info):
+        """
+        Asynchronous version of `check_document_access`.
+        :param connection: An asyncpg connection
+        :param doc_id: An id of a document
+        :param auth_info: The auth info
+        :return: The id and the file of the document, and whether it is
+        validated
+        :raises NotFound: if the document isn't in the database
+        """
+        query = aUnit.query_session.query(
+            Document.id, Document.file, ValidationStatus.status,
+            DocumentUser.user_id).outerjoin(ValidationStatus).outerjoin(
+            DocumentUser).filter(Document.id == doc_id).limit(1)
+        records = await aUnit.fetch(connection, query)
+        if not records:
+            raise NotFound(f'No document with id {doc_id}')
+        validated = records[0]['status'] == Status.Validated.name
+        DocController.check_read_access(validated, records[0]['user_id'],
+                                        auth_info)
+        return {
+            'id': records[0]['id'],
+            'file': records[0]['file'],
+            'validated': validated
+        }
+
+    @staticmethod
+    def search_documents(session, attributes, fields=None):
         """
-        This method si used to make a research using three criteria :
-         - keyword research, document with attributes containing keyword
+        Creates the query of a research using three criteria :
+         - keyword research, document with attributes containing keyword, or
+           full-text research when `searchMode` is 'fulltext'
          - comparison research, search between two dates
          - attribute research, document with specific attributes values
         :param session: Session object
-        :param args: List<attributes>
-        :return: List<ExtendedDocument>
+        :param attributes: The research parameters
+        :param fields: The serialized fields, see `query_documents`
+        :return: The query on validated documents
         """
 
         # @TODO: delete strong dependence to MetaData
-        # list that will contain research conditions for the query
-        keyword_conditions = []
-        attributes = args[0]
-
-        if attributes.get("keyword"):
-            keyword = attributes.pop("keyword")
-            for attr in DocController.keyword_attr:
-                keyword_conditions.append(
-                    Document.get_attr(attr).ilike('%' + keyword + '%'))
+        keyword = attributes.pop("keyword", None)
+        search_mode = attributes.pop("searchMode", None) or "substring"
+        if search_mode not in DocController.search_modes:
+            raise BadRequest(f'Unknown search mode : {search_mode}')
 
         comparison_conditions = [ValidationStatus.status == Status.Validated]
 
@@ -134,18 +529,267 @@ class DocController:
 
         for attr in sup_dict.keys():
             comparison_conditions.append(
-                Document.get_attr(attr) <= sup_dict[attr])
+                DocController.get_column(attr) <= sup_dict[attr])
 
         for attr in inf_dict.keys():
             comparison_conditions.append(
-                Document.get_attr(attr) >= inf_dict[attr])
+                DocController.get_column(attr) >= inf_dict[attr])
 
-        query = session.query(Document).join(ValidationStatus).filter_by(
-            **attributes).filter(
-            and_(*comparison_conditions)).filter(
-            or_(*keyword_conditions))
+        for attr, value in attributes.items():
+            comparison_conditions.append(
+                DocController.get_column(attr) == value)
 
-        return query.all()
+        query = DocController.query_documents(session, 'list', fields).filter(
+            and_(*comparison_conditions))
+        if not keyword:
+            return query
+        if search_mode == "fulltext":
+            condition, rank = DocController.fulltext_rank(session, keyword)
+            return query.filter(condition).order_by(rank.desc(), Document.id)
+        return query.filter(or_(
+            *[Document.get_attr(attr).ilike('%' + keyword + '%')
+              for attr in DocController.keyword_attr]))
+
+    @staticmethod
+    def get_column(attr):
+        """
+        Returns a column of documents which can be used in a research.
+        :param attr: The name of the column
+        :return: The column
+        :raises BadRequest: if documents have no such column (methods and
+        relationships are not columns)
+        """
+        if attr not in get_serializer(Document).columns:
+            raise BadRequest(f'Unknown attribute : {attr}')
+        return getattr(Document, attr)
+
+    @staticmethod
+    def fulltext_rank(session, keyword):
+        """
+        Returns the condition of the documents matching all the words of
+        `keyword` and their relevance. On PostgreSQL, the research uses the
+        full-text index of documents (see `Document.fulltext_vector`). Other
+        databases fall back to substring matching of each word, ranked by the
+        number of matches (matches in the title count double).
+        :param session: Session object
+        :param keyword: The searched words
+        :return: The condition and the rank of the documents
+        """
+        if session.bind.dialect.name == 'postgresql':
+            vector = Document.fulltext_vector()
+            ts_query = func.plainto_tsquery(Document.fulltext_config, keyword)
+            # ts_rank returns a real, which is only sent in full precision
+            # (and thus kept exactly by cursors) as a double
+            return vector.op('@@')(ts_query), \
+                cast(func.ts_rank(vector, ts_query), Float(53))
+
+        conditions = []
+        rank = 0
+        for word in keyword.split():
+            pattern = '%' + word + '%'
+            conditions.append(or_(Document.title.ilike(pattern),
+                                  Document.description.ilike(pattern)))
+            rank += case([(Document.title.ilike(pattern), 2)], else_=0) + \
+                case([(Document.description.ilike(pattern), 1)], else_=0)
+        return and_(*conditions), rank
+
+    @staticmethod
+    def find_documents(session, attributes):
+        """
+        Runs a paginated research (see `search_documents` and `paginate`).
+        :param session: Session object
+        :param attributes: The research parameters, including the optional
+        `fields`, `orderBy`, `limit` and `cursor` parameters, and the
+        `searchMode` of the keyword ('substring' by default, or 'fulltext')
+        :return: A dict containing the serialized documents and the cursor of
+        the next page (None on the last page)
+        """
+        query, fields, limit, order_by = \
+            DocController.prepare_research(session, attributes)
+        documents = query.all()
+
+        next_cursor = None
+        if limit is not None and len(documents) > limit:
+            documents = documents[:limit]
+            if order_by == 'rank':
+                document, value = documents[-1]
+            else:
+                document = documents[-1]
+                value = document.refDate
+            next_cursor = DocController.encode_cursor(order_by, document.id,
+                                                      value)
+        if order_by == 'rank':
+            documents = [document for document, _ in documents]
+        return {
+            'documents': [document.serialize(fields)
+                          for document in documents],
+            'next_cursor': next_cursor
+        }
+
+    @staticmethod
+    def prepare_research(session, attributes):
+        """
+        Creates the paginated query of a research (see `find_documents`).
+        :param session: Session object
+        :param attributes: The research parameters
+        :return: The query, the serialized fields (see `parse_fields`), the
+        limit and the ordering attribute (see `paginate`)
+        """
+        attributes = dict(attributes)
+        fields = DocController.parse_fields(attributes.pop('fields', None))
+        pagination = {key: attributes.pop(key)
+                      for key in ('orderBy', 'limit', 'cursor')
+                      if key in attributes}
+        # Results of a full-text research are ordered and paginated by
+        # relevance
+        rank = None
+        if attributes.get('searchMode') == 'fulltext' \
+                and attributes.get('keyword'):
+            del attributes['searchMode']
+            condition, rank = DocController.fulltext_rank(
+                session, attributes.pop('keyword'))
+        query = DocController.search_documents(session, attributes, fields)
+        if rank is not None:
+            query = query.filter(condition)
+        query, limit, order_by = DocController.paginate(query, pagination,
+                                                        rank)
+        return query, fields, limit, order_by
+
+    @staticmethod
+    @pUnit.make_a_query
+    def get_documents(session, attributes):
+        """
+        Makes a research (see `find_documents`).
+        :param session: Session object
+        :param attributes: The research parameters
+        :return: List<ExtendedDocument>
+        """
+        return DocController.find_documents(session, attributes)['documents']
+
+    @staticmethod
+    @pUnit.make_a_query
+    def get_documents_page(session, attributes):
+        """
+        Makes a research (see `find_documents`).
+        :param session: Session object
+        :param attributes: The research parameters
+        :return: A dict containing the documents and the next cursor
+        """
+        return DocController.find_documents(session, attributes)
+
+    @staticmethod
+    async def find_documents_async(connection, attributes):
+        """
+        Asynchronous version of `find_documents`. The query is built like the
+        one of `find_documents`, and executed by asyncpg with one more query
+        per relationship (see `AsyncPersistenceUnit.load_relationships`).
+        :param connection: An asyncpg connection
+        :param attributes: The research parameters
+        :return: A dict containing the serialized documents and the cursor of
+        the next page (None on the last page)
+        """
+        query, fields, limit, order_by = \
+            DocController.prepare_research(aUnit.query_session, attributes)
+        records = await aUnit.fetch(connection, query)
+        documents = [aUnit.to_dict(Document, record) for record in records]
+
+        next_cursor = None
+        if limit is not None and len(documents) > limit:
+            documents = documents[:limit]
+            if order_by == 'rank':
+                value = records[limit - 1]['rank']
+            else:
+                value = documents[-1].get('refDate')
+            next_cursor = DocController.encode_cursor(
+                order_by, documents[-1]['id'], value)
+        await aUnit.load_relationships(
+            connection, Document, documents,
+            DocController.get_relationships('list', fields))
+        return {
+            'documents': [DocController.serialize_document(document, fields)
+                          for document in documents],
+            'next_cursor': next_cursor
+        }
+
+    @staticmethod
+    def serialize_document(values, fields=None):
+        """
+        Serializes a document loaded by `find_documents_async` like
+        `Document.serialize` does.
+        :param values: The dict of the columns and relationships of the
+        document
+        :param fields: The serialized fields, or None if all of them are
+        :return: The serialized document
+        """
+        serialized_document = {
+            key: value for key, value in values.items()
+            if key != 'documentUser' and (fields is None or key in fields)}
+        if fields is None or 'user_id' in fields:
+            owners = values['documentUser']
+            serialized_document['user_id'] = \
+                owners[0]['user_id'] if owners else None
+        return serialized_document
+
+    @staticmethod
+    @aUnit.make_an_async_query
+    async def get_documents_async(connection, attributes):
+        """
+        Makes a research asynchronously (see `find_documents_async`).
+        :param connection: An asyncpg connection
+        :param attributes: The research parameters
+        :return: The serialized documents
+        """
+        page = await DocController.find_documents_async(connection,
+                                                        attributes)
+        return page['documents']
+
+    @staticmethod
+    @aUnit.make_an_async_query
+    async def get_documents_page_async(connection, attributes):
+        """
+        Makes a research asynchronously (see `find_documents_async`).
+        :param connection: An asyncpg connection
+        :param attributes: The research parameters
+        :return: A dict containing the documents and the next cursor
+        """
+        return await DocController.find_documents_async(connection,
+                                                        attributes)
+
+    @staticmethod
+    def filter_editable(query, auth_info):
+        """
+        Restricts a query on documents to the documents a user can modify :
+        all of them for an admin, and the documents the user owns otherwise.
+        The owner is checked in SQL, with a semi-join on DocumentUser, so the
+        owners of the documents are not loaded.
+        :param query: A query on documents
+        :param auth_info: The auth info
+        :return: The restricted query
+        """
+        if Document.is_allowed(auth_info):
+            return query
+        return query.filter(exists().where(and_(
+            DocumentUser.doc_id == Document.id,
+            DocumentUser.user_id == auth_info['user_id'])))
+
+    @staticmethod
+    def is_editable(session, doc_id, auth_info, *criteria):
+        """
+        Checks that a user can modify a document (see `filter_editable`),
+        with a single query.
+        :param session: The SQLAlchemy session
+        :param doc_id: An id of a document
+        :param auth_info: The auth info
+        :param criteria: Conditions the document must also meet when the user
+        is not an admin, on the document or its validation status
+        :return: True if the user can modify the document
+        """
+        if Document.is_allowed(auth_info):
+            return True
+        query = session.query(Document.id).join(ValidationStatus).filter(
+            Document.id == doc_id, *criteria)
+        return session.query(
+            DocController.filter_editable(query, auth_info).exists()).scalar()
 
     @staticmethod
     @pUnit.make_a_query
@@ -154,27 +798,52 @@ class DocController:
         This method si used to get documents to validate
         """
         attributes = args[0]
-        if Document.is_allowed(attributes):
-            query = session.query(Document).join(ValidationStatus).filter(
-                ValidationStatus.status == Status.InValidation)
-            return query.all()
-        else:
-            documents = session.query(Document).join(ValidationStatus).filter(
-                ValidationStatus.status == Status.InValidation).all()
-            return [doc for doc in documents if doc.owner_id() == attributes['user_id']]
+        query = DocController.query_documents(session, 'moderation').filter(
+            ValidationStatus.status == Status.InValidation)
+        return DocController.filter_editable(query, attributes).all()
 
     @staticmethod
     @pUnit.make_a_transaction
     def update_document(session, auth_info, doc_id, attributes):
+        """
+        Updates the attributes of a document, after archiving its current
+        version. The `read_only_attr` cannot be updated.
+        :param session: The SQLAlchemy session
+        :param auth_info: The auth info
+        :param doc_id: An id of a document
+        :param attributes: The new values of the attributes
+        :return: The updated document
+        :raises BadRequest: if a read-only attribute is given
+        """
+        read_only = [attr for attr in DocController.read_only_attr
+                     if attr in attributes]
+        if read_only:
+            raise BadRequest(f'Read-only attributes : {", ".join(read_only)}')
+        return DocController.update(session, auth_info, doc_id, attributes)
+
+    @staticmethod
+    @pUnit.make_a_transaction
+    def update_document_file(session, auth_info, doc_id, filename):
+        """
+        Replaces the file of a document, after archiving its current version.
+        :param session: The SQLAlchemy session
+        :param auth_info: The auth info
+        :param doc_id: An id of a document
+        :param filename: The name of the new file, as returned by
+        `util.upload.save_stream`
+        :return: The updated document
+        """
+        return DocController.update(session, auth_info, doc_id,
+                                    {'file': filename})
+
+    @staticmethod
+    def update(session, auth_info, doc_id, attributes):
         document = session.query(Document) \
             .filter(Document.id == doc_id).one()
-        # To change not supposed to be done in Controller
-        documents = session.query(Document).join(ValidationStatus).filter(
-            and_(Document.id == doc_id,
-                 ValidationStatus.status == Status.InValidation)).all()
-        doc_count = len([doc for doc in documents
-                         if doc.owner_id() == auth_info['user_id']])
-        if Document.is_allowed(auth_info) or doc_count > 0:
+        # Contributors can only update their documents in validation
+        if DocController.is_editable(
+                session, doc_id, auth_info,
+                ValidationStatus.status == Status.InValidation):
             ArchiveController.create_archive(document.serialize())
             document.update(attributes)
             session.add(document)
@@ -187,24 +856,15 @@ class DocController:
     def delete_documents(session, *args):
         an_id = args[0]
         attributes = args[1]
-        documents = session.query(Document).filter(
-            Document.id == an_id).all()
-        doc_count = len([doc for doc in documents
-                         if doc.owner_id() == attributes['user_id']])
-        if Document.is_allowed(attributes) or doc_count > 0:
-            # we also remove the associated image
-            # located in 'UPLOAD_FOLDER' directory
+        if DocController.is_editable(session, an_id, attributes):
             a_doc = session.query(Document).filter(
                 Document.id == an_id).one()
-            if a_doc:
-                ArchiveController.create_archive(a_doc.serialize())
-                session.delete(a_doc)
-            try:
-                os.remove(UPLOAD_FOLDER + '/' + a_doc.file)
-                return a_doc
-            except Exception as e:
-                print(e)
-                info_logger.error(e)
+            # The file of the document, located in the 'UPLOAD_FOLDER'
+            # directory, is kept : the archive of the deleted document still
+            # references it
+            ArchiveController.create_archive(a_doc.serialize())
+            session.delete(a_doc)
+            return a_doc
         else:
             raise AuthError
 
@@ -231,6 +891,32 @@ class DocController:
         else:
             raise NotFound
 
+    @staticmethod
+    def references_file(session, filename):
+        """
+        Checks if a file of the upload folder is used by a document or an
+        archive.
+        :param session: The SQLAlchemy session
+        :param filename: The name of the file
+        :return: True if the file is referenced
+        """
+        return session.query(or_(
+            exists().where(Document.file == filename),
+            exists().where(VersionDoc.file == filename))).scalar()
+
+    @staticmethod
+    @pUnit.make_a_query
+    def is_file_referenced(session, filename):
+        """
+        Checks if a file of the upload folder is used by a document or an
+        archive (see `references_file`). Can be passed to
+        `util.upload.delete_file` and `util.upload.sweep_files`.
+        :param session: The SQLAlchemy session (auto filled)
+        :param filename: The name of the file
+        :return: True if the file is referenced
+        """
+        return DocController.references_file(session, filename)
+
     @staticmethod
     @pUnit.make_a_query
     def check_authorization(session, auth_info, doc_id):
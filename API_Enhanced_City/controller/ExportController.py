@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from itertools import groupby, islice
+
+from entities.Document import Document
+from entities.VersionDoc import VersionDoc
+from controller.DocController import DocController
+from controller.LinkController import LinkController
+
+import persistence_unit.PersistenceUnit as pUnit
+
+
+class ExportController:
+    """
+    Exports the whole corpus without loading it in memory. Documents are read
+    with a server-side cursor, in batches of `batch_size` documents : the
+    comments, versions and links of each batch are loaded with one query
+    per relationship, and the batch is released once serialized. Memory use
+    thus depends on the batch size rather than on the number of documents.
+    """
+    batch_size = 500
+
+    @staticmethod
+    def export_documents(batch_size=None):
+        """
+        Generates all the documents, in validation or not, ordered by id. The
+        export runs in a single repeatable read transaction, so it is a
+        consistent snapshot of the database.
+        :param int batch_size: The number of documents read at once,
+            `ExportController.batch_size` by default.
+        :return: A generator of serialized documents. Each document has the
+            fields of `Document.serialize`, its `versions` (see
+            `ArchiveController`), and its `links` by target type.
+        """
+        batch_size = batch_size or ExportController.batch_size
+        session = pUnit.Session()
+        try:
+            session.connection(execution_options={
+                'isolation_level': 'REPEATABLE READ'})
+            documents = iter(
+                DocController.query_documents(session, 'list')
+                .order_by(Document.id)
+                .yield_per(batch_size))
+            while True:
+                batch = list(islice(documents, batch_size))
+                if not batch:
+                    break
+                yield from ExportController.serialize_batch(session, batch)
+        finally:
+            session.close()
+
+    @staticmethod
+    def serialize_batch(session, documents):
+        """
+        Serializes a batch of documents with their versions and links.
+        :param session: The SQLAlchemy session
+        :param documents: The documents of the batch, with their comments,
+            owner, validation status and visualization loaded.
+        :return: A generator of serialized documents.
+        """
+        ids = [document.id for document in documents]
+        versions = ExportController.group_by(
+            session.query(VersionDoc)
+            .filter(VersionDoc.doc_id.in_(ids))
+            .order_by(VersionDoc.doc_id, VersionDoc.version),
+            'doc_id')
+        links = {
+            name: ExportController.group_by(
+                session.query(target_type)
+                .filter(target_type.source_id.in_(ids))
+                .order_by(target_type.source_id, target_type.id),
+                'source_id')
+            for name, target_type in LinkController.target_types.items()}
+        for document in documents:
+            serialized_document = document.serialize()
+            serialized_document['versions'] = versions.get(document.id, [])
+            serialized_document['links'] = {
+                name: target_links.get(document.id, [])
+                for name, target_links in links.items()}
+            yield serialized_document
+
+    @staticmethod
+    def group_by(query, key):
+        """
+        Serializes the results of a query ordered by `key`, grouped by the
+        value of `key`.
+        :return: A dict of the lists of serialized objects.
+        """
+        return {value: [obj.serialize() for obj in objects]
+                for value, objects in groupby(
+                    query, lambda obj: getattr(obj, key))}
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import codecs
+import csv
+import json
+from itertools import islice
+
+from util.Exception import BadRequest, PayloadTooLarge
+from util.upload import allowed_file, get_extension
+from controller.DocController import DocController
+
+
+class ImportController:
+    """
+    Imports many documents and their files. The documents are read from
+    NDJSON (one JSON object per line) or CSV (one column per attribute), and
+    created in batches of `batch_size` documents, each in one transaction
+    (see `DocController.create_documents`). The `file` attribute of each
+    document names its file, which is saved in the upload folder before the
+    batch is created. Documents which cannot be imported are reported with
+    their index in the input instead of failing the import.
+    """
+    batch_size = 500
+    formats = ('ndjson', 'csv')
+
+    @staticmethod
+    def read_documents(stream, data_format):
+        """
+        Reads the documents of a binary stream.
+        :param stream: A binary file-like object
+        :param str data_format: 'ndjson' or 'csv'
+        :return: A generator of the attributes of the documents, or of
+            `BadRequest` exceptions for the lines which cannot be read.
+        """
+        if data_format not in ImportController.formats:
+            raise BadRequest(f"Invalid format '{data_format}', expected one "
+                             f"of : {', '.join(ImportController.formats)}")
+        lines = codecs.getreader('utf-8-sig')(stream)
+        if data_format == 'csv':
+            for row in csv.DictReader(lines):
+                yield row
+            return
+        for number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                yield BadRequest(f'Invalid JSON on line {number} : {e}')
+
+    @staticmethod
+    def import_documents(documents, auth_info, save_file, batch_size=None):
+        """
+        Imports documents and their files, batch by batch.
+        :param documents: An iterable of the attributes of the documents (see
+            `read_documents`)
+        :param auth_info: The auth info of the owner of the documents
+        :param save_file: A function taking the `file` attribute of a
+            document, saving the file in the upload folder (see
+            `util.upload.save_stream`) and returning its name in the upload
+            folder. It raises `BadRequest` if the file cannot be found.
+        :param int batch_size: The number of documents created at once,
+            `ImportController.batch_size` by default.
+        :return: A dict with the `created` documents, as their `index` and
+            their `id`, and the `errors` of the documents which could not be
+            imported, identified by their `index`.
+        """
+        batch_size = batch_size or ImportController.batch_size
+        result = {'created': [], 'errors': []}
+        documents = enumerate(documents)
+        while True:
+            batch = list(islice(documents, batch_size))
+            if not batch:
+                result['errors'].sort(key=lambda error: error['index'])
+                return result
+            valid_documents = []
+            for index, attributes in batch:
+                try:
+                    valid_documents.append((index, ImportController.save_file(
+                        attributes, save_file)))
+                except (BadRequest, PayloadTooLarge) as e:
+                    result['errors'].append({'index': index,
+                                             'message': str(e)})
+
+            # The files of the documents which are not created are left to
+            # `util.upload.sweep_files` : other requests may have saved the
+            # same content for documents which are not committed yet
+            batch_result = DocController.create_documents(
+                [attributes for _, attributes in valid_documents],
+                auth_info)
+            for created in batch_result['created']:
+                result['created'].append({
+                    'index': valid_documents[created['index']][0],
+                    'id': created['id']
+                })
+            for error in batch_result['errors']:
+                index = valid_documents[error['index']][0]
+                result['errors'].append({'index': index,
+                                         'message': error['message']})
+
+    @staticmethod
+    def save_file(attributes, save_file):
+        """
+        Saves the file of a document in the upload folder.
+        :param attributes: The attributes of the document
+        :param save_file: See `import_documents`
+        :return: The attributes, with the name of the saved file as `file`
+        """
+        if isinstance(attributes, Exception):
+            raise attributes
+        if not isinstance(attributes, dict):
+            raise BadRequest('A document must be an object')
+        name = attributes.get('file')
+        if not name:
+            raise BadRequest("Missing parameters : file")
+        if not allowed_file(get_extension(name)):
+            raise BadRequest(f'Invalid file format : {name}')
+        return dict(attributes, file=save_file(name))
@@ -1,12 +1,16 @@
+from math import hypot
 from typing import Type, Dict
 
+from sqlalchemy import and_, func
 from sqlalchemy.orm.session import Session
 
 from util.Exception import BadRequest, NotFound
+from util.db_config import has_extension
 
 from entities.LinkCityObject import LinkCityObject
 
 import persistence_unit.PersistenceUnit as pUnit
+import persistence_unit.AsyncPersistenceUnit as aUnit
 
 
 class LinkController:
@@ -21,7 +25,9 @@ class LinkController:
     - `get_links` : retrieve all links of a specified type. The type is passed
       as the `target_type_name` parameter. A `filters` dict can be also passed
       as parameter to filter results by source, target ids and other properties
-      of the link (depending on the type).
+      of the link (depending on the type). Links to city objects can also be
+      filtered spatially, with the `bbox` or `near` and `k` filters (see
+      `spatial_filter`).
     - `create_link` : creates a new link of the specified type. The type is
       passed as the `target_type_name` parameter. Properties of the new link
       are specified by the `properties` dict. Among these, `source_id` and
@@ -29,6 +35,10 @@ class LinkController:
     - `delete_link` : deletes an existing link. The type is passed as the
       `target_type_name` parameter. The link ID is passed through the `link_id`
        parameter.
+    - `create_links` and `delete_links` : batch versions of `create_link` and
+      `delete_link`, which create or delete many links in a few queries. Items
+      that cannot be created or deleted are reported instead of failing the
+      whole batch.
 
 
     `target_type_name` refers to a string representing a possibly target type
@@ -41,6 +51,22 @@ class LinkController:
         'city_object': LinkCityObject
     }
 
+    # Filters handled by `spatial_filter` instead of being compared to a
+    # property of the link
+    spatial_filters = ('bbox', 'near', 'k')
+    default_neighbours = 10
+    max_neighbours = 1000
+    # Half side of the first window searched by `nearest_links` without PostGIS
+    initial_search_radius = 100.0
+
+    # Whether the database has PostGIS, detected on the first spatial query
+    postgis = None
+
+    # Maximum number of links created or deleted by a batch request
+    max_batch_size = 10000
+    # Number of rows inserted by each INSERT statement of a batch
+    insert_chunk_size = 1000
+
     @staticmethod
     def get_target_types():
         """
@@ -63,14 +89,222 @@ class LinkController:
             are retrieved.
         :return: All links retrieved.
         """
+        target_type, query, spatial_filters = LinkController.query_links(
+            session, target_type_name, filters)
+        if spatial_filters:
+            return LinkController.spatial_filter(session, query, target_type,
+                                                 spatial_filters)
+        return query.all()
+
+    @staticmethod
+    @aUnit.make_an_async_query
+    async def get_links_async(connection, target_type_name, filters={}):
+        """
+        Asynchronous version of `get_links`. Without PostGIS, the nearest
+        links are found by ordering all the links by distance, instead of
+        searching them in growing windows.
+
+        :param connection: An asyncpg connection
+        :param str target_type_name: The name of the target type.
+        :param dict filters: The filters of the links (see `get_links`).
+        :return: The serialized links.
+        """
+        target_type, query, spatial_filters = LinkController.query_links(
+            aUnit.query_session, target_type_name, filters)
+        if spatial_filters:
+            if LinkController.postgis is None:
+                LinkController.postgis = await aUnit.has_extension(
+                    connection, 'postgis')
+            query, nearest = LinkController.filter_spatially(
+                query, target_type, spatial_filters)
+            if nearest is not None:
+                query = LinkController.order_by_distance(query, target_type,
+                                                         *nearest)
+        return [aUnit.to_dict(target_type, record)
+                for record in await aUnit.fetch(connection, query)]
+
+    @staticmethod
+    def query_links(session, target_type_name, filters):
+        """
+        Creates the query on the links of a target type, filtered by their
+        properties.
+
+        :param Session session: SQLAlchemy session
+        :param str target_type_name: The name of the target type.
+        :param dict filters: The filters of the links (see `get_links`).
+        :return: The entity class of the links, the query and the spatial
+            filters, which are not applied.
+        """
         target_type = LinkController.target_types.get(target_type_name)
         if target_type is None:
             raise BadRequest(f'{target_type_name} is not a valid link target.')
+        spatial_filters = {}
         query = session.query(target_type)
         for key, value in filters.items():
-            query = query.filter(target_type.get_attr(key) == value)
+            if key in LinkController.spatial_filters:
+                spatial_filters[key] = value
+            else:
+                query = query.filter(target_type.get_attr(key) == value)
+        return target_type, query, spatial_filters
+
+    @staticmethod
+    def spatial_filter(session, query, target_type, filters):
+        """
+        Filters links by the position of the centroid of their target.
+
+        - `bbox` : 'minx,miny,maxx,maxy' or 'minx,miny,minz,maxx,maxy,maxz'.
+          Retrieves the links whose centroid is inside the box.
+        - `near` : 'x,y' and `k` (10 by default). Retrieves the `k` links
+          whose centroid is the nearest to the point, ordered by distance. The
+          distance is computed in the horizontal plane.
+
+        Queries use a GiST index when PostGIS is installed, and the B-tree
+        index on (centroid_x, centroid_y) otherwise.
+
+        :param Session session: SQLAlchemy session
+        :param query: The query on links, already filtered by properties
+        :param target_type: The entity class of the links
+        :param dict filters: The spatial filters
+        :return: The retrieved links.
+        """
+        if LinkController.postgis is None:
+            LinkController.postgis = has_extension(session.bind, 'postgis')
+        query, nearest = LinkController.filter_spatially(query, target_type,
+                                                         filters)
+        if nearest is not None:
+            return LinkController.nearest_links(query, target_type, *nearest)
         return query.all()
 
+    @staticmethod
+    def filter_spatially(query, target_type, filters):
+        """
+        Applies the `bbox` filter and parses the `near` and `k` filters (see
+        `spatial_filter`).
+
+        :param query: The query on links
+        :param target_type: The entity class of the links
+        :param dict filters: The spatial filters
+        :return: The filtered query, and the (x, y, k) parameters of the
+            nearest links research, or None
+        """
+        if not hasattr(target_type, 'centroid_x'):
+            raise BadRequest('Links of this type cannot be filtered '
+                             'spatially.')
+        if filters.get('bbox'):
+            bbox = LinkController.parse_coordinates(filters['bbox'], (4, 6))
+            if len(bbox) == 6:
+                min_x, min_y, min_z, max_x, max_y, max_z = bbox
+                query = query.filter(
+                    target_type.centroid_z.between(min_z, max_z))
+            else:
+                min_x, min_y, max_x, max_y = bbox
+            query = query.filter(LinkController.window_condition(
+                target_type, min_x, min_y, max_x, max_y))
+
+        if filters.get('near'):
+            x, y = LinkController.parse_coordinates(filters['near'], (2,))
+            try:
+                k = int(filters.get('k') or LinkController.default_neighbours)
+            except ValueError:
+                raise BadRequest('k must be an integer')
+            if not 0 < k <= LinkController.max_neighbours:
+                raise BadRequest(f'k must be between 1 and '
+                                 f'{LinkController.max_neighbours}')
+            return query, (x, y, k)
+        elif filters.get('k'):
+            raise BadRequest('k must be used with near')
+        return query, None
+
+    @staticmethod
+    def parse_coordinates(value, lengths):
+        try:
+            coordinates = [float(coordinate) for coordinate in value.split(',')]
+        except ValueError:
+            raise BadRequest(f'Invalid coordinates : {value}')
+        if len(coordinates) not in lengths:
+            raise BadRequest(f'Invalid number of coordinates : {value}')
+        return coordinates
+
+    @staticmethod
+    def window_condition(target_type, min_x, min_y, max_x, max_y):
+        """
+        Returns the condition selecting the centroids inside a rectangle of
+        the horizontal plane.
+        """
+        if LinkController.postgis:
+            return func.ST_MakePoint(
+                target_type.centroid_x, target_type.centroid_y).op('&&')(
+                func.ST_MakeEnvelope(min_x, min_y, max_x, max_y))
+        return and_(target_type.centroid_x.between(min_x, max_x),
+                    target_type.centroid_y.between(min_y, max_y))
+
+    @staticmethod
+    def nearest_links(query, target_type, x, y, k):
+        """
+        Retrieves the `k` links whose centroid is the nearest to (x, y).
+
+        With PostGIS, the GiST index is used to order links by distance.
+        Otherwise, links are searched in square windows centered on the point
+        and growing until they contain `k` links. As the k-th nearest link
+        found in a window can be farther than a link outside of it, the links
+        are searched once more in the window circumscribing the circle going
+        through the k-th link.
+        """
+        if LinkController.postgis:
+            return LinkController.order_by_distance(query, target_type,
+                                                    x, y, k).all()
+
+        def distance(link):
+            return hypot(link.centroid_x - x, link.centroid_y - y)
+
+        def links_in_window(radius):
+            links = query.filter(LinkController.window_condition(
+                target_type, x - radius, y - radius,
+                x + radius, y + radius)).all()
+            return sorted(links, key=distance)
+
+        radius = LinkController.initial_search_radius
+        max_radius = None
+        while True:
+            links = links_in_window(radius)
+            if len(links) >= k:
+                if distance(links[k - 1]) > radius:
+                    links = links_in_window(distance(links[k - 1]))
+                return links[:k]
+            if max_radius is None:
+                min_x, max_x, min_y, max_y = query.with_entities(
+                    func.min(target_type.centroid_x),
+                    func.max(target_type.centroid_x),
+                    func.min(target_type.centroid_y),
+                    func.max(target_type.centroid_y)).one()
+                if min_x is None:
+                    return links
+                max_radius = max(abs(min_x - x), abs(max_x - x),
+                                 abs(min_y - y), abs(max_y - y))
+            if radius >= max_radius:
+                # The window contains all the links
+                return links[:k]
+            radius *= 4
+
+    @staticmethod
+    def order_by_distance(query, target_type, x, y, k):
+        """
+        Orders the links by the distance of their centroid to (x, y), and
+        limits the query to the `k` nearest. The distance is computed with
+        the GiST index when PostGIS is installed, and for every link
+        otherwise.
+        """
+        if LinkController.postgis:
+            distance = func.ST_MakePoint(
+                target_type.centroid_x, target_type.centroid_y).op('<->')(
+                func.ST_MakePoint(x, y))
+        else:
+            distance = (target_type.centroid_x - x) * \
+                (target_type.centroid_x - x) + \
+                (target_type.centroid_y - y) * (target_type.centroid_y - y)
+        return query.filter(target_type.centroid_x.isnot(None)).order_by(
+            distance).limit(k)
+
     @staticmethod
     @pUnit.make_a_transaction
     def create_link(session, target_type_name, properties={}):
@@ -115,3 +349,152 @@ class LinkController:
             raise NotFound(f'Link {target_type_name}/{link_id} does not exist.')
         session.delete(link)
         return link
+
+    @staticmethod
+    @pUnit.make_a_transaction
+    def create_links(session, target_type_name, links):
+        """
+        Creates many links of the same target type. The links are validated
+        one by one, then the valid ones are inserted with multi-row INSERT
+        statements.
+
+        :param Session session: SQLAlchemy session (auto filled)
+        :param str target_type_name: The name of the target type.
+        :param list links: The properties of the links to create (see
+            `create_link`).
+        :return: A dict with the `created` links and the `errors` of the
+            links which could not be created, identified by their `index` in
+            `links`.
+        """
+        target_type = LinkController.target_types.get(target_type_name)
+        if target_type is None:
+            raise BadRequest(f'{target_type_name} is not a valid link target.')
+        if len(links) > LinkController.max_batch_size:
+            raise BadRequest(f'A batch cannot contain more than '
+                             f'{LinkController.max_batch_size} links')
+        table = target_type.__table__
+        columns = [column for column in table.columns
+                   if not column.primary_key]
+
+        rows = {}
+        errors = {}
+        for index, properties in enumerate(links):
+            try:
+                rows[index] = LinkController.validate_link(columns, properties)
+            except BadRequest as e:
+                errors[index] = str(e)
+
+        # Referenced rows are checked with one query per foreign key instead
+        # of failing the whole INSERT
+        for column in columns:
+            for foreign_key in column.foreign_keys:
+                values = {row[column.name] for row in rows.values()
+                          if row[column.name] is not None}
+                if not values:
+                    continue
+                existing = {value for value, in session.query(
+                    foreign_key.column).filter(
+                    foreign_key.column.in_(values))}
+                for index, row in list(rows.items()):
+                    value = row[column.name]
+                    if value is not None and value not in existing:
+                        errors[index] = f'{column.name} {value} does not exist'
+                        del rows[index]
+
+        indexes = list(rows)
+        ids = []
+        chunk_size = LinkController.insert_chunk_size
+        for start in range(0, len(indexes), chunk_size):
+            chunk = [rows[index] for index in indexes[start:start + chunk_size]]
+            if session.bind.dialect.name == 'postgresql':
+                ids.extend(id for id, in session.execute(
+                    table.insert().values(chunk).returning(table.c.id)))
+            else:
+                ids.extend(session.execute(table.insert().values(row))
+                           .inserted_primary_key[0] for row in chunk)
+
+        created = [dict(id=id, **rows[index])
+                   for index, id in zip(indexes, ids)]
+        return {
+            'created': created,
+            'errors': [{'index': index, 'message': errors[index]}
+                       for index in sorted(errors)]
+        }
+
+    @staticmethod
+    def validate_link(columns, properties):
+        """
+        Converts the properties of a link into a row of its table.
+
+        :param columns: The columns of the table, without the primary key.
+        :param dict properties: The properties of the link.
+        :return: A dict containing a value for each column.
+        :raises BadRequest: if the properties are invalid.
+        """
+        if not isinstance(properties, dict):
+            raise BadRequest('A link must be an object')
+        names = {column.name for column in columns}
+        unknown = [key for key in properties if key not in names]
+        if unknown:
+            raise BadRequest(f'Unknown properties : {", ".join(unknown)}')
+        row = {}
+        for column in columns:
+            value = properties.get(column.name)
+            if value is None:
+                if not column.nullable:
+                    raise BadRequest(f'Missing {column.name}')
+            else:
+                try:
+                    value = column.type.python_type(value)
+                except (TypeError, ValueError):
+                    raise BadRequest(f'Invalid {column.name} : {value!r}')
+            row[column.name] = value
+        return row
+
+    @staticmethod
+    @pUnit.make_a_transaction
+    def delete_links(session, target_type_name, link_ids):
+        """
+        Deletes many links of the same target type with a single DELETE
+        statement.
+
+        :param Session session: SQLAlchemy session (auto filled)
+        :param str target_type_name: The name of the target type.
+        :param list link_ids: IDs of the links.
+        :return: A dict with the `deleted` links and the `errors` of the IDs
+            which could not be deleted, identified by their `index` in
+            `link_ids`.
+        """
+        def is_id(link_id):
+            return isinstance(link_id, int) and not isinstance(link_id, bool)
+
+        target_type = LinkController.target_types.get(target_type_name)
+        if target_type is None:
+            raise BadRequest(f'{target_type_name} is not a valid link target.')
+        if len(link_ids) > LinkController.max_batch_size:
+            raise BadRequest(f'A batch cannot contain more than '
+                             f'{LinkController.max_batch_size} links')
+
+        ids = {link_id for link_id in link_ids if is_id(link_id)}
+        links = []
+        if ids:
+            links = session.query(target_type).filter(
+                target_type.id.in_(ids)).order_by(target_type.id).all()
+        deleted_ids = {link.id for link in links}
+
+        errors = []
+        for index, link_id in enumerate(link_ids):
+            if not is_id(link_id):
+                errors.append({'index': index,
+                               'message': f'Invalid link ID : {link_id!r}'})
+            elif link_id not in deleted_ids:
+                errors.append({'index': index, 'message':
+                               f'Link {target_type_name}/{link_id} does not '
+                               f'exist.'})
+
+        deleted = [link.serialize() for link in links]
+        if deleted_ids:
+            session.query(target_type).filter(
+                target_type.id.in_(deleted_ids)).delete(
+                synchronize_session=False)
+        return {'deleted': deleted, 'errors': errors}
@@ -3,12 +3,13 @@
 
 from time import time
 
-from util.Exception import Unauthorized
+from util.Exception import NotFound, Unauthorized
 from util.encryption import *
 from util.log import info_logger
 from entities.User import User
 from entities.UserRole import UserRole
 import persistence_unit.PersistenceUnit as pUnit
+import persistence_unit.AsyncPersistenceUnit as aUnit
 
 
 class UserController:
@@ -64,6 +65,26 @@ class UserController:
         user = session.query(User).filter(User.id == user_id).one()
         return user
 
+    @staticmethod
+    @aUnit.make_an_async_query
+    async def get_user_role_async(connection, user_id):
+        """
+        Gets asynchronously the current role of a user.
+        :param connection: An asyncpg connection
+        :param user_id: The ID of the user
+        :return: The serialized role of the user, or None if they have none
+        :raises NotFound: if the user does not exist
+        """
+        query = aUnit.query_session.query(
+            User.id, UserRole.id.label('role_id'), UserRole.label).outerjoin(
+            UserRole, User.role_id == UserRole.id).filter(User.id == user_id)
+        records = await aUnit.fetch(connection, query)
+        if not records:
+            raise NotFound('The user of the token does not exist')
+        if records[0]['role_id'] is None:
+            return None
+        return {'id': records[0]['role_id'], 'label': records[0]['label']}
+
     @staticmethod
     @pUnit.make_a_transaction
     def login(session, *args):
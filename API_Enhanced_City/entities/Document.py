@@ -2,8 +2,8 @@
 # coding: utf8
 
 from sqlalchemy import Column, Integer, ForeignKey, String, DateTime
+from sqlalchemy import DDL, func
 from sqlalchemy.orm import relationship
-from util.serialize import serialize
 
 from util.db_config import Base
 from entities.Entity import Entity
@@ -15,6 +15,10 @@ from entities.ValidationStatus import ValidationStatus, Status
 
 class Document(Entity, Base):
     __tablename__ = "document"
+    serialize_exclude = ('documentUser',)
+
+    # Text search configuration of the full-text index
+    fulltext_config = 'simple'
 
     id = Column(Integer, primary_key=True)
 
@@ -24,7 +28,8 @@ class Document(Entity, Base):
     refDate = Column(DateTime(timezone=True))
     publicationDate = Column(DateTime(timezone=True))
     rightsHolder = Column(String)
-    file = Column(String)
+    # Indexed to count the references to a file of the upload folder
+    file = Column(String, index=True)
 
     comments = relationship("Comment",
                             cascade="all, delete-orphan")
@@ -65,6 +70,16 @@ class Document(Entity, Base):
                 setattr(self, attKey, attVal)
         return self
 
+    @staticmethod
+    def fulltext_vector():
+        """
+        Returns the PostgreSQL expression of the text vector of a document.
+        It must stay identical to the expression of `fulltext_index` for the
+        index to be used.
+        """
+        return func.to_tsvector(Document.fulltext_config,
+                                Document.title + ' ' + Document.description)
+
     @staticmethod
     def is_allowed(auth_info):
         role = auth_info['role']['label']
@@ -80,10 +95,16 @@ class Document(Entity, Base):
     def is_owner(self, auth_info):
         return auth_info['user_id'] == self.owner_id()
 
-    def serialize(self):
-        serialized_object = {}
-        for attr in self.get_all_attr():
-            if attr != 'documentUser':
-                serialized_object[attr] = serialize(getattr(self, attr))
-        serialized_object['user_id'] = self.owner_id()
+    def serialize(self, fields=None):
+        serialized_object = super().serialize(fields)
+        if fields is None or 'user_id' in fields:
+            serialized_object['user_id'] = self.owner_id()
         return serialized_object
+
+
+# GIN index on the text vector of the documents, maintained by PostgreSQL on
+# each insert and update. Ignored by other databases.
+fulltext_index = DDL(
+    f"CREATE INDEX IF NOT EXISTS ix_document_fulltext ON document "
+    f"USING gin (to_tsvector('{Document.fulltext_config}', "
+    f"title || ' ' || description))").execute_if(dialect='postgresql')
@@ -1,10 +1,9 @@
 #!/usr/bin/env python3
 # coding: utf8
 
-from sqlalchemy import Column, Integer, ForeignKey, String
+from sqlalchemy import Column, Integer, ForeignKey, Index, String
 from sqlalchemy.orm import relationship
 
-from util.serialize import serialize
 from util.db_config import Base
 
 from entities.Entity import Entity
@@ -12,6 +11,10 @@ from entities.Entity import Entity
 
 class DocumentUser(Base, Entity):
     __tablename__ = "document_user"
+    serialize_exclude = ('document', 'user')
+    # Used to find the documents of a user with an index-only scan
+    __table_args__ = (Index('ix_document_user_user_id_doc_id',
+                            'user_id', 'doc_id'),)
 
     id = Column(Integer, primary_key=True)
     doc_id = Column(Integer, ForeignKey("document.id"))
@@ -22,10 +25,3 @@ class DocumentUser(Base, Entity):
     def __init__(self, doc_id, user_id):
         self.doc_id = doc_id
         self.user_id = user_id
-
-    def serialize(self):
-        serialized_object = {}
-        for attr in self.get_all_attr():
-            if attr != 'document' and attr != 'user':
-                serialized_object[attr] = serialize(getattr(self, attr))
-        return serialized_object
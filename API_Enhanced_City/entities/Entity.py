@@ -2,10 +2,14 @@
 # coding: utf8
 
 
-from util.serialize import serialize
+from sqlalchemy import inspect
+
+from util.serialize import get_serializer
 
 
 class Entity:
+    # Attributes ignored by `serialize`
+    serialize_exclude = ()
 
     def update(self, new_values):
         for attKey, attVal in new_values.items():
@@ -20,16 +24,10 @@ class Entity:
         return None
 
     def get_all_attr(self):
-        return {i for i in dir(self)
-                if not (i.startswith('_')
-                        or callable(getattr(self, i))
-                        or i == "metadata")}
-
-    def serialize(self):
-        serialized_object = {}
-        for attr in self.get_all_attr():
-            serialized_object[attr] = serialize(getattr(self, attr))
-        return serialized_object
+        return {attr.key for attr in inspect(type(self)).attrs}
+
+    def serialize(self, fields=None):
+        return get_serializer(type(self)).serialize(self, fields)
 
     def __str__(self):
         return str(self.serialize())
@@ -2,9 +2,9 @@
 # coding: utf8
 
 from sqlalchemy import Column, Integer, String, Float
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index, DDL
 
-from util.db_config import Base
+from util.db_config import Base, has_extension
 from entities.Entity import Entity
 
 
@@ -13,9 +13,14 @@ class LinkCityObject(Base, Entity):
     Represents a link between a document and a city object.
     """
     __tablename__ = "link_city_object"
+    # Used by bounding box queries when PostGIS is not available
+    __table_args__ = (Index('ix_link_city_object_centroid',
+                            'centroid_x', 'centroid_y'),)
 
     id = Column(Integer, primary_key=True)
-    source_id = Column(Integer, ForeignKey('document.id'), nullable=False)
+    # Indexed to find the links of documents
+    source_id = Column(Integer, ForeignKey('document.id'), nullable=False,
+                       index=True)
     target_id = Column(String, nullable=False)
     centroid_x = Column(Float)
     centroid_y = Column(Float)
@@ -34,3 +39,13 @@ class LinkCityObject(Base, Entity):
         self.centroid_y = centroid_y
         self.centroid_z = centroid_z
         # @todo Check if target_id corresponds to a existing city object
+
+
+# GiST index on the centroids of the city objects, used by bounding box and
+# nearest neighbours queries. Only created when PostGIS is installed.
+centroid_gist_index = DDL(
+    "CREATE INDEX IF NOT EXISTS ix_link_city_object_centroid_gist "
+    "ON link_city_object USING gist (ST_MakePoint(centroid_x, centroid_y))"
+).execute_if(dialect='postgresql',
+             callable_=lambda ddl, target, bind, **kw:
+             has_extension(bind, 'postgis'))
@@ -6,7 +6,6 @@ from sqlalchemy.orm import relationship
 from util.encryption import encrypt
 
 from util.db_config import Base
-from util.serialize import serialize
 from util.Exception import UnprocessableEntity
 
 from entities.Entity import Entity
@@ -16,6 +15,8 @@ from entities.UserRole import UserRole, LEVEL_MAX
 
 class User(Entity, Base):
     __tablename__ = "user"
+    serialize_exclude = ('password', 'comments', 'version',
+                         'extended_document')
 
     id = Column(Integer, primary_key=True)
     username = Column(String, nullable=False, unique=True)
@@ -57,10 +58,3 @@ class User(Entity, Base):
         if level is None:
             raise UnprocessableEntity(f'Unknown role : {attributes["role"]}')
         return level == LEVEL_MAX
-
-    def serialize(self):
-        serialized_object = {}
-        for attr in self.get_all_attr():
-            if attr != 'password' and attr != 'comments' and attr != 'version' and attr != 'extended_document':
-                serialized_object[attr] = serialize(getattr(self, attr))
-        return serialized_object
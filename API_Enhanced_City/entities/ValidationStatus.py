@@ -11,8 +11,10 @@ import enum
 
 
 class Status(enum.Enum):
-    Validated = enum.auto(),
-    InValidation = enum.auto()
+    # The values are the names, which are sent in the responses (see
+    # `util.response_encoding.dumps`) and stored in the database
+    Validated = 'Validated'
+    InValidation = 'InValidation'
 
 
 class ValidationStatus(Base, Entity):
@@ -23,7 +25,8 @@ class ValidationStatus(Base, Entity):
     __tablename__ = "validation_status"
 
     doc_id = Column(Integer, ForeignKey('document.id'), primary_key=True)
-    status = Column(Enum(Status), nullable=False)
+    # Indexed to find the documents in validation
+    status = Column(Enum(Status), nullable=False, index=True)
 
     def __init__(self, status):
         """
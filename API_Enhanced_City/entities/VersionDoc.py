@@ -12,7 +12,8 @@ class VersionDoc(Entity, Base):
     __tablename__ = "versions"
 
     id = Column(Integer, primary_key=True)
-    doc_id = Column(Integer)
+    # Indexed to export the versions of many documents at once
+    doc_id = Column(Integer, index=True)
     user_id = Column(Integer,
                      ForeignKey("user.id"),
                      nullable=False)
@@ -22,7 +23,8 @@ class VersionDoc(Entity, Base):
     refDate = Column(DateTime(timezone=True))
     publicationDate = Column(DateTime(timezone=True))
     rightsHolder = Column(String)
-    file = Column(String)
+    # Indexed to count the references to a file of the upload folder
+    file = Column(String, index=True)
     quaternionX = Column(Float)
     quaternionY = Column(Float)
     quaternionZ = Column(Float)
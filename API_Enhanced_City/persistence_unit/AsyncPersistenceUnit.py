@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import asyncio
+import re
+from functools import wraps
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+from sqlalchemy import String, any_, bindparam, create_engine, inspect, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql.base import PGDialect
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.sql.elements import BindParameter
+from sqlalchemy.sql.visitors import traverse
+
+from util.log import info_logger
+from util.VarConfig import VarConfig
+from util.db_config import get_engine_config
+from util.serialize import get_serializer
+
+# Session which never connects to the database : it builds the queries of the
+# controllers with the ORM, which are then compiled and executed by asyncpg.
+# Its bind is a mock engine, so that the dialect of the queries is known.
+query_session = sessionmaker(bind=create_engine(
+    'postgresql://', strategy='mock', executor=None))()
+
+# Dialect used to compile the queries, with the `$1` placeholders of asyncpg
+# written as `:1` by SQLAlchemy
+_dialect = PGDialect(paramstyle='numeric')
+_placeholder = re.compile(r'(?<![:\w]):(\d+)')
+
+_pools = {}
+
+
+async def get_pool():
+    """
+    Returns the asyncpg connection pool of the running event loop, creating
+    it on first use with the connection settings of the configuration (see
+    `get_engine_config`) : the pool holds between `pool_size` and
+    `pool_size + max_overflow` connections.
+    :return: The connection pool.
+    """
+    if asyncpg is None:
+        raise RuntimeError('asyncpg is required by the asynchronous API')
+    loop = asyncio.get_event_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        config = VarConfig.get()
+        engine_config = get_engine_config()
+        server_settings = {}
+        if engine_config['statement_timeout'] > 0:
+            server_settings['statement_timeout'] = \
+                str(engine_config['statement_timeout'])
+        pool = _pools[loop] = await asyncpg.create_pool(
+            host=config['host'], port=int(config['port']),
+            user=config['user'], password=config['password'],
+            database=config['dbname'],
+            min_size=engine_config['pool_size'],
+            max_size=engine_config['pool_size'] +
+            engine_config['max_overflow'],
+            server_settings=server_settings)
+    return pool
+
+
+async def close_pool():
+    """
+    Closes the connection pool of the running event loop, if any.
+    """
+    pool = _pools.pop(asyncio.get_event_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+def compile_query(statement):
+    """
+    Compiles a SQLAlchemy statement (or ORM query) for asyncpg. Strings
+    compared to columns of other types are cast by PostgreSQL, as they are
+    when they are sent by psycopg2 (for instance dates and ids passed as URL
+    parameters).
+    :param statement: A statement or an ORM query
+    :return: The SQL string and the list of its arguments
+    """
+    if hasattr(statement, 'statement'):
+        statement = statement.enable_eagerloads(False).statement
+    compiled = statement.compile(dialect=_dialect)
+
+    # Types of the expressions compared to strings, keyed by parameter name
+    casts = {}
+
+    def visit_binary(binary):
+        for expression, bind in ((binary.left, binary.right),
+                                 (binary.right, binary.left)):
+            if isinstance(bind, BindParameter) \
+                    and isinstance(bind.value, str) \
+                    and not expression.type._isnull \
+                    and not isinstance(expression.type, String):
+                casts[compiled.bind_names[bind]] = \
+                    expression.type.compile(dialect=_dialect)
+
+    traverse(statement, {}, {'binary': visit_binary})
+    params = compiled.construct_params()
+    args = [params[name] for name in compiled.positiontup]
+    for position, name in enumerate(compiled.positiontup):
+        processor = compiled._bind_processors.get(name)
+        if processor is not None and args[position] is not None:
+            args[position] = processor(args[position])
+
+    def placeholder(match):
+        name = compiled.positiontup[int(match.group(1)) - 1]
+        if name in casts:
+            return f'CAST(CAST(${match.group(1)} AS TEXT) AS {casts[name]})'
+        return f'${match.group(1)}'
+
+    return _placeholder.sub(placeholder, compiled.string), args
+
+
+async def fetch(connection, statement):
+    """
+    Executes a statement (see `compile_query`).
+    :param connection: An asyncpg connection
+    :param statement: A statement or an ORM query
+    :return: The list of the fetched records
+    """
+    sql, args = compile_query(statement)
+    return await connection.fetch(sql, *args)
+
+
+def to_dict(cls, record):
+    """
+    Converts a record of the table of a mapped class into a dict of the
+    serialized columns of the class (see `Serializer`), keyed by attribute
+    name. Columns missing from the record are ignored.
+    :param cls: The mapped class
+    :param record: An asyncpg record
+    :return: The dict of the values of the columns
+    """
+    mapper = inspect(cls)
+    values = {}
+    for key in get_serializer(cls).columns:
+        name = mapper.columns[key].name
+        if name in record:
+            values[key] = record[name]
+    return values
+
+
+async def load_relationships(connection, cls, objects, keys):
+    """
+    Loads relationships of objects converted by `to_dict`, with one query
+    per relationship (like `selectinload`). Related objects are converted to
+    dicts, and added to the objects under the name of the relationship.
+    :param connection: An asyncpg connection
+    :param cls: The mapped class of the objects
+    :param objects: The objects, as dicts
+    :param keys: The names of the relationships to load
+    """
+    mapper = inspect(cls)
+    for key in keys:
+        relationship = mapper.relationships[key]
+        (local, remote), = relationship.local_remote_pairs
+        local_key = mapper.get_property_by_column(local).key
+        target = relationship.mapper
+        remote_key = target.get_property_by_column(remote).key
+        values = list({obj[local_key] for obj in objects})
+        related = {}
+        if values:
+            statement = select([target.local_table]).where(
+                remote == any_(bindparam(f'{key}_values', values,
+                                         type_=ARRAY(remote.type))))
+            if relationship.order_by:
+                statement = statement.order_by(*relationship.order_by)
+            for record in await fetch(connection, statement):
+                item = to_dict(target.class_, record)
+                related.setdefault(item[remote_key], []).append(item)
+        for obj in objects:
+            items = related.get(obj[local_key], [])
+            if relationship.uselist:
+                obj[key] = items
+            else:
+                obj[key] = items[0] if items else None
+
+
+async def has_extension(connection, name):
+    """
+    Checks if a PostgreSQL extension is installed in the database.
+    :param connection: An asyncpg connection
+    :param name: The name of the extension (e.g. 'postgis')
+    :return: True if the extension is installed
+    """
+    return await connection.fetchval(
+        'SELECT 1 FROM pg_extension WHERE extname = $1', name) is not None
+
+
+def make_an_async_query(old_function):
+    """
+    Asynchronous version of `make_a_query` : the decorated coroutine receives
+    a connection of the pool, in a read-only transaction, instead of a
+    session. It should return serialized objects.
+    """
+    @wraps(old_function)
+    async def new_function(*args):
+        pool = await get_pool()
+        try:
+            async with pool.acquire() as connection:
+                async with connection.transaction(readonly=True):
+                    return await old_function(connection, *args)
+        except Exception as e:
+            info_logger.error(e)
+            raise e
+
+    return new_function
@@ -1,37 +1,98 @@
 #!/usr/bin/env python3
 # coding: utf8
 
-import sys
+import threading
 import time
-from sqlalchemy.exc import OperationalError
+from sqlalchemy.exc import OperationalError, SQLAlchemyError
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 from util.log import info_logger
-from util.db_config import get_db_info
+from util.db_config import get_db_info, get_engine_config, get_engine_options
 from util.serialize import serialize
 
 
-def try_to_connect():
-    remaining_tries = 10
-    while remaining_tries:
+def get_engine():
+    """
+    Returns the engine, creating it on first use. Creating the engine does
+    not connect to the database : connections are opened by the pool when
+    they are needed.
+    :return: The engine.
+    """
+    global engine
+    if engine is None:
+        with _engine_lock:
+            if engine is None:
+                created_engine = create_engine(get_db_info(),
+                                               **get_engine_options())
+                Session.configure(bind=created_engine)
+                engine = created_engine
+    return engine
+
+
+def init_engine():
+    """
+    Creates the engine and waits until the database accepts connections.
+    Called once when a server starts, so that it does not start before the
+    database. Failed attempts are retried with an exponential backoff (see
+    `get_engine_config`).
+    :return: The engine.
+    :raises OperationalError: if the database cannot be reached after the
+    last attempt.
+    """
+    config = get_engine_config()
+    remaining_tries = config['connect_retries']
+    delay = config['connect_backoff']
+    while True:
         try:
             print('Trying to connect to Database...')
             print('Config : ', get_db_info())
-            created_engine = create_engine(get_db_info())
-            created_engine.connect()
+            get_engine().connect().close()
             print('Connection succeed!')
-            return created_engine
+            return engine
         except OperationalError as e:
             remaining_tries -= 1
             print('Connection failed', end=' ')
             print(e)
-            if remaining_tries == 0:
-                sys.exit()
-            print('- new try')
+            if remaining_tries <= 0:
+                raise
+            print(f'- new try in {delay}s')
+
+            time.sleep(delay)
+            delay = min(delay * 2, config['connect_max_backoff'])
+
 
-            time.sleep(0.5)
+def get_health():
+    """
+    Reports the state of the connection pool and the latency of a trivial
+    query to the database.
+    :return: A dict with the `pool` counters and the `database` status.
+    """
+    pool = get_engine().pool
+    health = {'pool': None}
+    if isinstance(pool, QueuePool):
+        health['pool'] = {
+            'size': pool.size(),
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow()
+        }
+    start = time.perf_counter()
+    try:
+        with get_engine().connect() as connection:
+            connection.execute(text('SELECT 1'))
+        health['database'] = {
+            'status': 'ok',
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3)
+        }
+    except SQLAlchemyError as e:
+        info_logger.error(e)
+        # The error is only logged, as it may contain the address and the
+        # credentials of the database
+        health['database'] = {'status': 'unavailable'}
+    return health
 
 
 def make_a_transaction(old_function):
@@ -69,5 +130,18 @@ def make_a_query(old_function):
     return new_function
 
 
-engine = try_to_connect()
-Session = sessionmaker(engine)
+class LazySessionMaker(sessionmaker):
+    """
+    Session factory which creates the engine (see `get_engine`) when the
+    first session is created.
+    """
+
+    def __call__(self, **local_kw):
+        if engine is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+
+engine = None
+_engine_lock = threading.Lock()
+Session = LazySessionMaker()
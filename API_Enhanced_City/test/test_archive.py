@@ -130,13 +130,13 @@ class TestArchive:
 
     def test_delete_document(self):
         print("delete a document")
-        expected_response = None
-        assert expected_response == DocController.delete_documents(1, {
+        # The deleted document is returned, even if its file does not exist
+        assert 1 == DocController.delete_documents(1, {
                 'user_id' : 1,
                 "role": {
                     'label' : 'admin'
                 }
-            })
+            })['id']
 
     def test_get_archive(self):
         print("get the archives")
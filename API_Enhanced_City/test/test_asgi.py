@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import asyncio
+
+import api.asgi as asgi
+
+
+def request(method, path, headers=None):
+    """
+    Sends a request to the ASGI application and returns the status and the
+    headers of the response.
+    """
+    scope = {
+        'type': 'http',
+        'method': method,
+        'path': path,
+        'query_string': b'',
+        'headers': [(key.lower().encode('latin-1'), value.encode('latin-1'))
+                    for key, value in (headers or {}).items()]
+    }
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.get_event_loop().run_until_complete(
+        asgi.app(scope, receive, send))
+    return messages[0]['status'], {
+        key.decode('latin-1'): value.decode('latin-1')
+        for key, value in messages[0]['headers']}
+
+
+class TestAsgi:
+    def test_preflight(self):
+        print("Preflight requests are answered like the Flask application")
+        status, headers = request('OPTIONS', '/document', {
+            'Origin': 'http://example.com',
+            'Access-Control-Request-Method': 'GET',
+            'Access-Control-Request-Headers': 'Authorization'
+        })
+        assert status == 200
+        assert headers['access-control-allow-origin'] == 'http://example.com'
+        assert headers['access-control-allow-methods'] == 'GET, HEAD, OPTIONS'
+        assert headers['access-control-allow-headers'] == 'Authorization'
+        assert 'Origin' in headers['vary']
+
+    def test_cors_headers(self):
+        print("The origin of a request is allowed")
+        status, headers = request('POST', '/document')
+        assert status == 405
+        assert headers['access-control-allow-origin'] == '*'
+        assert headers['access-control-expose-headers'] == 'X-Next-Cursor'
+        assert 'vary' not in headers
+        status, headers = request('POST', '/document',
+                                  {'Origin': 'http://example.com'})
+        assert headers['access-control-allow-origin'] == 'http://example.com'
+        assert 'access-control-allow-methods' not in headers
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import asyncio
+import json
+
+import pytest
+
+from util.Exception import AuthError, BadRequest, NotFound, Unauthorized
+from util.JsonCustomEncoder import JsonCustomEncoder
+from controller.Controller import Controller
+from controller.DocController import DocController
+from controller.CommentController import CommentController
+from controller.LinkController import LinkController
+from controller.UserController import UserController
+import persistence_unit.AsyncPersistenceUnit as aUnit
+
+pytest.importorskip('asyncpg')
+
+
+def run(coroutine):
+    return asyncio.get_event_loop().run_until_complete(coroutine)
+
+
+def encode(content):
+    return json.dumps(content, cls=JsonCustomEncoder, sort_keys=True)
+
+
+class TestAsync:
+    def test_init(self):
+        Controller.recreate_tables()
+        print("Starting asynchronous API tests")
+        for i in range(5):
+            document = DocController.create_document({
+                'user_id': 1,
+                'title': f'title {i}',
+                'source': 'source',
+                'description': f'description {i}',
+                'file': '1.gif',
+                'refDate': f'2018-0{i + 1}-01',
+                'role': {'label': 'admin'}
+            }, {
+                'user_id': 1
+            })
+            CommentController.create_comment(document['id'], {
+                'user_id': 1,
+                'description': f'comment {i}'
+            })
+            LinkController.create_link('city_object', {
+                'source_id': document['id'],
+                'target_id': f'building_{i}',
+                'centroid_x': i * 10.0,
+                'centroid_y': 0.0,
+                'centroid_z': 0.0
+            })
+        DocController.create_document({
+            'user_id': 1,
+            'title': 'in validation',
+            'source': 'source',
+            'description': 'description',
+            'file': '1.gif',
+            'role': {'label': 'contributor'}
+        }, {
+            'user_id': 1
+        })
+
+    @pytest.mark.parametrize('attributes', [
+        {},
+        {'limit': '2', 'orderBy': 'refDate'},
+        {'limit': '2', 'orderBy': 'refDate', 'fields': 'title'},
+        {'refDateStart': '2018-02-15'},
+        {'keyword': 'title 3', 'searchMode': 'fulltext'},
+        {'keyword': 'description', 'searchMode': 'fulltext', 'limit': '2'},
+        {'keyword': 'description'}
+    ])
+    def test_get_documents(self, attributes):
+        print("Asynchronous researches return the same documents")
+        page = DocController.get_documents_page(dict(attributes))
+        async_page = run(DocController.get_documents_page_async(
+            dict(attributes)))
+        assert encode(async_page) == encode(page)
+
+    def test_get_documents_with_cursor(self):
+        print("The cursors of both APIs are interchangeable")
+        page = run(DocController.get_documents_page_async({'limit': '3'}))
+        next_page = DocController.get_documents_page({
+            'limit': '3', 'cursor': page['next_cursor']})
+        assert [document['id'] for document in next_page['documents']] == \
+            [4, 5]
+
+    def test_get_documents_fulltext_with_cursor(self):
+        print("The cursors of full-text researches are interchangeable")
+        attributes = {'keyword': 'description', 'searchMode': 'fulltext',
+                      'limit': '2'}
+        page = run(DocController.get_documents_page_async(dict(attributes)))
+        next_page = DocController.get_documents_page(dict(
+            attributes, cursor=page['next_cursor']))
+        documents = DocController.get_documents(dict(attributes, limit='4'))
+        assert next_page['documents'] == documents[2:]
+
+    def test_get_documents_invalid_parameter(self):
+        print("Invalid research parameters are rejected")
+        with pytest.raises(BadRequest):
+            run(DocController.get_documents_async({'limit': 'abc'}))
+
+    def test_get_comments(self):
+        print("Get the comments of a document asynchronously")
+        comments = run(CommentController.get_comments_async(1))
+        assert encode(comments) == encode(CommentController.get_comments(1))
+
+    def test_check_document_access(self):
+        print("Documents in validation are only accessible to their owner")
+        with pytest.raises(Unauthorized):
+            run(DocController.check_document_access_async(6, None))
+        with pytest.raises(AuthError):
+            run(DocController.check_document_access_async(
+                6, {'user_id': 2, 'role': {'label': 'contributor'}}))
+        access = run(DocController.check_document_access_async(
+            6, {'user_id': 1, 'role': {'label': 'contributor'}}))
+        assert access == {'id': 6, 'file': '1.gif', 'validated': False}
+
+    @pytest.mark.parametrize('filters', [
+        {},
+        {'source_id': '2'},
+        {'bbox': '5,-1,35,1'},
+        {'near': '21,0', 'k': '2'}
+    ])
+    def test_get_links(self, filters):
+        print("Get links asynchronously")
+        links = run(LinkController.get_links_async('city_object', filters))
+        assert links == LinkController.get_links('city_object', filters)
+
+    def test_get_user_role(self):
+        print("Get the current role of a user asynchronously")
+        user = UserController.create_user({
+            'username': 'async user',
+            'password': 'password',
+            'email': 'async@example.com',
+            'firstName': 'first',
+            'lastName': 'last'
+        })
+        role = run(UserController.get_user_role_async(user['id']))
+        assert role['label'] == 'contributor'
+        with pytest.raises(NotFound):
+            run(UserController.get_user_role_async(user['id'] + 1))
+
+    def test_close_pool(self):
+        run(aUnit.close_pool())
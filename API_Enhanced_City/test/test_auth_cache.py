@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from time import time
+
+from flask import Flask
+
+from api.helpers import format_response, use_authentication, ResponseOK
+from controller.Controller import Controller
+from controller.UserController import UserController
+from entities.User import User
+from entities.UserRole import UserRole
+import persistence_unit.PersistenceUnit as pUnit
+from test.test_query_count import count_queries
+from util.AuthCache import AuthCache, auth_cache
+
+
+def create_app():
+    app = Flask(__name__)
+
+    @app.route('/me')
+    @format_response
+    @use_authentication()
+    def get_auth_info(auth_info):
+        return ResponseOK(auth_info)
+
+    return app
+
+
+def login():
+    UserController.create_user({
+        'username': 'user',
+        'password': 'password',
+        'email': 'user@example.com',
+        'firstName': 'first',
+        'lastName': 'last'
+    })
+    token = UserController.login({'username': 'user',
+                                  'password': 'password'})['token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def update_user(update):
+    session = pUnit.Session()
+    try:
+        update(session, session.query(User).filter(
+            User.username == 'user').one())
+        session.commit()
+    finally:
+        session.close()
+
+
+class TestAuthCache:
+    def test_miss_then_hit(self):
+        print("Cache a token and read it back")
+        cache = AuthCache()
+        assert cache.get('token') is None
+        cache.put('token', {'user_id': 1, 'exp': time() + 60})
+        assert cache.get('token')['user_id'] == 1
+        assert cache.stats()['hits'] == 1
+        assert cache.stats()['misses'] == 1
+
+    def test_expired_token(self):
+        print("A token is not served after its expiration")
+        cache = AuthCache()
+        cache.put('token', {'user_id': 1, 'exp': time() - 1})
+        assert cache.get('token') is None
+        assert cache.stats()['size'] == 0
+
+    def test_ttl(self):
+        print("An entry does not outlive the cache ttl")
+        cache = AuthCache(ttl=0)
+        cache.put('token', {'user_id': 1, 'exp': time() + 60})
+        assert cache.get('token') is None
+
+    def test_bounded_size(self):
+        print("The least recently used token is evicted")
+        cache = AuthCache(max_size=2)
+        cache.put('token1', {'user_id': 1})
+        cache.put('token2', {'user_id': 2})
+        cache.get('token1')
+        cache.put('token3', {'user_id': 3})
+        assert cache.get('token1') is not None
+        assert cache.get('token2') is None
+        assert cache.get('token3') is not None
+
+    def test_invalidate_user(self):
+        print("Invalidate all the tokens of a user")
+        cache = AuthCache()
+        cache.put('token1', {'user_id': 1})
+        cache.put('token2', {'user_id': 1})
+        cache.put('token3', {'user_id': 2})
+        cache.invalidate_user(1)
+        assert cache.get('token1') is None
+        assert cache.get('token2') is None
+        assert cache.get('token3') is not None
+
+
+class TestAuthentication:
+    def test_cached_token(self):
+        Controller.recreate_tables()
+        auth_cache.clear()
+        print("An authenticated request only looks the user up once")
+        client = create_app().test_client()
+        headers = login()
+        with count_queries() as statements:
+            first = client.get('/me', headers=headers)
+            second = client.get('/me', headers=headers)
+        assert first.status_code == second.status_code == 200
+        assert first.get_json() == second.get_json()
+        assert len(statements) == 1
+
+    def test_role_change(self):
+        Controller.recreate_tables()
+        auth_cache.clear()
+        print("The next request after a role change sees the new role")
+        client = create_app().test_client()
+        headers = login()
+        assert client.get('/me', headers=headers).get_json()['role'][
+            'label'] == 'contributor'
+
+        def set_role(session, user):
+            user.set_role(session.query(UserRole).filter(
+                UserRole.label == 'moderator').one())
+
+        update_user(set_role)
+        assert auth_cache.stats()['size'] == 0
+        assert client.get('/me', headers=headers).get_json()['role'][
+            'label'] == 'moderator'
+
+    def test_other_update(self):
+        Controller.recreate_tables()
+        auth_cache.clear()
+        print("Updating a user without changing their role keeps the cache")
+        client = create_app().test_client()
+        headers = login()
+        client.get('/me', headers=headers)
+
+        def set_email(session, user):
+            user.email = 'other@example.com'
+
+        update_user(set_email)
+        assert auth_cache.stats()['size'] == 1
+
+    def test_deleted_user(self):
+        Controller.recreate_tables()
+        auth_cache.clear()
+        print("The token of a deleted user is not served from the cache")
+        client = create_app().test_client()
+        headers = login()
+        assert client.get('/me', headers=headers).status_code == 200
+        update_user(lambda session, user: session.delete(user))
+        assert auth_cache.stats()['size'] == 0
+        assert client.get('/me', headers=headers).status_code == 404
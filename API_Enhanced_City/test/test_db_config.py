@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+import persistence_unit.PersistenceUnit as pUnit
+from util.VarConfig import VarConfig
+from util.db_config import get_engine_config, get_engine_options
+
+
+class TestDbConfig:
+    def test_default_engine_options(self):
+        print("The pool settings have default values")
+        options = get_engine_options()
+        assert options['pool_size'] == 5
+        assert options['max_overflow'] == 10
+        assert options['pool_pre_ping'] is False
+        assert 'connect_args' not in options
+
+    def test_configured_engine_options(self, monkeypatch):
+        print("The pool settings and statement timeout can be configured")
+        monkeypatch.setenv('EXTENDED_DOC_POOL_SIZE', '20')
+        monkeypatch.setenv('EXTENDED_DOC_POOL_PRE_PING', 'True')
+        monkeypatch.setenv('EXTENDED_DOC_STATEMENT_TIMEOUT', '5000')
+        monkeypatch.setenv('EXTENDED_DOC_CONNECT_BACKOFF', '0.1')
+        VarConfig.reload()
+        try:
+            options = get_engine_options()
+            assert options['pool_size'] == 20
+            assert options['pool_pre_ping'] is True
+            assert options['connect_args'] == {
+                'options': '-c statement_timeout=5000'
+            }
+            assert get_engine_config()['connect_backoff'] == 0.1
+        finally:
+            monkeypatch.undo()
+            VarConfig.reload()
+
+    def test_health(self):
+        print("Report the state of the pool and of the database")
+        health = pUnit.get_health()
+        assert health['database']['status'] == 'ok'
+        assert health['database']['latency_ms'] >= 0
+        assert set(health['pool']) == {'size', 'checked_in', 'checked_out',
+                                       'overflow'}
+        assert health['pool']['checked_out'] == 0
+
+    def test_lazy_engine(self, monkeypatch):
+        print("The engine is created without connecting to the database")
+        monkeypatch.setenv('EXTENDED_DOC_PORT', '1')
+        monkeypatch.setenv('EXTENDED_DOC_CONNECT_RETRIES', '2')
+        monkeypatch.setenv('EXTENDED_DOC_CONNECT_BACKOFF', '0')
+        VarConfig.reload()
+        monkeypatch.setattr(pUnit, 'engine', None)
+        bind = pUnit.Session.kw.get('bind')
+        try:
+            engine = pUnit.get_engine()
+            assert pUnit.get_engine() is engine
+            assert pUnit.Session().get_bind() is engine
+            with pytest.raises(OperationalError):
+                pUnit.init_engine()
+            engine.dispose()
+        finally:
+            pUnit.Session.configure(bind=bind)
+            monkeypatch.undo()
+            VarConfig.reload()
+
+    def test_health_unavailable(self, monkeypatch):
+        print("The health report does not disclose the database error")
+        monkeypatch.setenv('EXTENDED_DOC_PORT', '1')
+        VarConfig.reload()
+        monkeypatch.setattr(pUnit, 'engine', None)
+        bind = pUnit.Session.kw.get('bind')
+        try:
+            health = pUnit.get_health()
+            assert health['database'] == {'status': 'unavailable'}
+            pUnit.get_engine().dispose()
+        finally:
+            pUnit.Session.configure(bind=bind)
+            monkeypatch.undo()
+            VarConfig.reload()
@@ -1,15 +1,20 @@
 #!/usr/bin/env python3
 # coding: utf8
 
+import io
+import os
+
 import pytest
 import sqlalchemy.orm
 import sqlalchemy.exc
 
 from entities.ValidationStatus import Status
-from util.Exception import AuthError
+from util.Exception import AuthError, BadRequest, Unauthorized
 from controller.Controller import Controller
 from controller.DocController import DocController
 from controller.UserController import UserController
+from controller.ArchiveController import ArchiveController
+import util.upload as upload
 
 import datetime
 import psycopg2
@@ -192,6 +197,100 @@ class TestDocument:
         assert len(response) == 1
         assert response[0]['id'] == 2
 
+    def test_get_documents_fulltext(self):
+        print('Get documents with a full-text research')
+        response = DocController.get_documents({
+            'keyword': 'details title',
+            'searchMode': 'fulltext'
+        })
+        assert [document['id'] for document in response] == [4]
+        response = DocController.get_documents({
+            'keyword': 'description',
+            'searchMode': 'fulltext'
+        })
+        assert [document['id'] for document in response] == [1, 2]
+        with pytest.raises(BadRequest):
+            DocController.get_documents({
+                'keyword': 'description',
+                'searchMode': 'regex'
+            })
+
+    def test_get_documents_fulltext_paginated(self):
+        print('Get the results of a full-text research page by page')
+        attributes = {'keyword': 'description', 'searchMode': 'fulltext'}
+        page = DocController.get_documents_page(dict(attributes, limit='1'))
+        assert [document['id'] for document in page['documents']] == [1]
+        page = DocController.get_documents_page(dict(
+            attributes, limit='1', cursor=page['next_cursor']))
+        assert [document['id'] for document in page['documents']] == [2]
+        assert page['next_cursor'] is None
+        with pytest.raises(BadRequest):
+            DocController.get_documents(dict(attributes, orderBy='refDate'))
+        with pytest.raises(BadRequest):
+            DocController.get_documents(dict(
+                attributes, cursor=DocController.encode_cursor('rank', 1,
+                                                               'abc')))
+
+    def test_get_documents_paginated(self):
+        print('Get documents page by page')
+        page = DocController.get_documents_page({'limit': '2'})
+        assert [document['id'] for document in page['documents']] == [1, 2]
+        page = DocController.get_documents_page({
+            'limit': '2',
+            'cursor': page['next_cursor']
+        })
+        assert [document['id'] for document in page['documents']] == [4]
+        assert page['next_cursor'] is None
+
+    def test_get_documents_paginated_by_ref_date(self):
+        print('Get documents ordered by refDate page by page')
+        ids = []
+        page = {'next_cursor': None}
+        while True:
+            page = DocController.get_documents_page({
+                'limit': '1',
+                'orderBy': 'refDate',
+                'cursor': page['next_cursor']
+            })
+            ids += [document['id'] for document in page['documents']]
+            if page['next_cursor'] is None:
+                break
+        assert ids == [2, 4, 1]
+
+    def test_get_documents_default_page_size(self, monkeypatch):
+        print('Get documents without limit returns all of them, or the next '
+              'page when a cursor is given')
+        monkeypatch.setattr(DocController, 'default_page_size', 1)
+        page = DocController.get_documents_page({})
+        assert [document['id'] for document in page['documents']] == [1, 2, 4]
+        assert page['next_cursor'] is None
+        page = DocController.get_documents_page({
+            'cursor': DocController.encode_cursor('id', 1)})
+        assert [document['id'] for document in page['documents']] == [2]
+        assert page['next_cursor'] is not None
+
+    def test_get_documents_invalid_page(self):
+        print('Get documents with invalid pagination parameters')
+        with pytest.raises(BadRequest):
+            DocController.get_documents({'limit': '0'})
+        with pytest.raises(BadRequest):
+            DocController.get_documents({'orderBy': 'title'})
+        with pytest.raises(BadRequest):
+            DocController.get_documents({'cursor': 'not a cursor'})
+
+    def test_get_documents_unknown_attribute(self):
+        print('Get documents filtered by attributes which are not columns')
+        for attr in ['serialize', 'is_allowed', 'comments', 'serializeEnd']:
+            with pytest.raises(BadRequest):
+                DocController.get_documents({attr: 'x'})
+
+    def test_get_documents_fields(self):
+        print('Get only some fields of documents')
+        response = DocController.get_documents({'fields': 'title,user_id'})
+        assert response[0] == {'id': 1, 'title': 'title', 'user_id': 1}
+        with pytest.raises(BadRequest):
+            DocController.get_documents({'fields': 'password'})
+
     def test_get_documents_to_validate_admin(self):
         print('Get documents to validate as an admin')
         response = DocController.get_documents_to_validate({
@@ -219,6 +318,25 @@ class TestDocument:
         with pytest.raises(sqlalchemy.orm.exc.NoResultFound):
             DocController.get_document_by_id(-1, None)
 
+    def test_get_document_in_validation(self):
+        print('Get a document in validation as owner, admin or other user')
+        contributor = {'user_id': 1, 'role': {'label': 'contributor'}}
+        owner = {'user_id': 2, 'role': {'label': 'contributor'}}
+        admin = {'user_id': 1, 'role': {'label': 'admin'}}
+        for get_document in [DocController.get_document_by_id,
+                             DocController.check_document_access]:
+            with pytest.raises(Unauthorized):
+                get_document(3, None)
+            with pytest.raises(AuthError):
+                get_document(3, contributor)
+            assert get_document(3, owner)['id'] == 3
+            assert get_document(3, admin)['id'] == 3
+
+    def test_is_file_referenced(self):
+        print('Check if a file is used by a document or an archive')
+        assert DocController.is_file_referenced('1.gif')
+        assert not DocController.is_file_referenced('unknown.gif')
+
     def test_update_document_as_contributor(self):
         print('Update a document as contributor')
         with pytest.raises(AuthError):
@@ -244,6 +362,16 @@ class TestDocument:
         assert response['visualization']['positionX'] == 12
         assert response['description'] == 'another description'
 
+    def test_update_read_only_attributes(self):
+        print('The file of a document cannot be updated with its attributes')
+        for attributes in [{'file': '../../../etc/passwd'}, {'id': 10}]:
+            with pytest.raises(BadRequest):
+                DocController.update_document({
+                    'user_id': 1,
+                    'role': {'label': 'admin'}
+                }, 1, attributes)
+        assert DocController.get_document_by_id(1, None)['file'] == '1.gif'
+
     def test_update_non_existing_document(self):
         print('Update a non existing document')
         with pytest.raises(sqlalchemy.orm.exc.NoResultFound):
@@ -256,6 +384,16 @@ class TestDocument:
                 'description': 'another description'
             })
 
+    def test_update_document_as_owner(self):
+        print('Update a document in validation as its owner')
+        response = DocController.update_document({
+            'user_id': 2,
+            'role': {'label': 'contributor'}
+        }, 3, {
+            'description': 'description of my document'
+        })
+        assert response['description'] == 'description of my document'
+
     def test_delete_document_as_contributor(self):
         print('Delete a document as contributor')
         with pytest.raises(AuthError):
@@ -274,6 +412,28 @@ class TestDocument:
         except Exception as e:
             print(e)
 
+    def test_delete_document_keeps_file(self, tmp_path, monkeypatch):
+        print('The file of a deleted document is kept for its archive')
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        filename, _ = upload.save_stream(io.BytesIO(b'content'), 'gif')
+        admin = {'user_id': 1, 'role': {'label': 'admin'}}
+        document = DocController.create_document({
+            'title': 'title',
+            'source': 'source',
+            'description': 'a description',
+            'file': filename,
+            'user_id': 1,
+            'role': {'label': 'admin'}
+        }, admin)
+        DocController.delete_documents(document['id'], admin)
+        assert os.path.exists(os.path.join(str(tmp_path), filename))
+        archives = ArchiveController.get_archive(document['id'])
+        assert archives[-1]['file'] == filename
+        assert not upload.delete_file(filename,
+                                      DocController.is_file_referenced,
+                                      grace_period=0)
+        assert os.path.exists(os.path.join(str(tmp_path), filename))
+
 
 if __name__ == "__main__":
     TestDocument().test_document_init()
@@ -287,12 +447,23 @@ if __name__ == "__main__":
     TestDocument().test_validate_document_2()
     TestDocument().test_get_all_documents()
     TestDocument().test_get_specific_documents()
+    TestDocument().test_get_documents_fulltext()
+    TestDocument().test_get_documents_fulltext_paginated()
+    TestDocument().test_get_documents_paginated()
+    TestDocument().test_get_documents_paginated_by_ref_date()
+    TestDocument().test_get_documents_invalid_page()
+    TestDocument().test_get_documents_unknown_attribute()
+    TestDocument().test_get_documents_fields()
     TestDocument().test_get_documents_to_validate_admin()
     TestDocument().test_get_documents_to_validate_contributor()
     TestDocument().test_get_document_by_id()
     TestDocument().test_get_non_existing_document()
+    TestDocument().test_get_document_in_validation()
+    TestDocument().test_is_file_referenced()
     TestDocument().test_update_document_as_contributor()
     TestDocument().test_update_document_as_admin()
+    TestDocument().test_update_document_as_owner()
+    TestDocument().test_update_read_only_attributes()
     TestDocument().test_update_non_existing_document()
     TestDocument().test_delete_document_as_contributor()
     TestDocument().test_delete_document_as_admin()
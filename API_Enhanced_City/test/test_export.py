@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from controller.Controller import Controller
+from controller.DocController import DocController
+from controller.ExportController import ExportController
+from controller.LinkController import LinkController
+from entities.ValidationStatus import Status
+from test.test_query_count import count_queries, create_documents
+
+
+class TestExport:
+    def test_init(self):
+        Controller.recreate_tables()
+        print("Starting export tests")
+        create_documents(4)
+        create_documents(1, role='contributor')
+        DocController.update_document({
+            'user_id': 1,
+            'role': {'label': 'admin'}
+        }, 2, {'title': 'new title'})
+        LinkController.create_link('city_object', {
+            'source_id': 3,
+            'target_id': 'building',
+            'centroid_x': 1.0,
+            'centroid_y': 2.0,
+            'centroid_z': 3.0
+        })
+
+    def test_export_documents(self):
+        print("Export all the documents with their relationships")
+        documents = list(ExportController.export_documents(batch_size=2))
+        assert [document['id'] for document in documents] == [1, 2, 3, 4, 5]
+        assert documents[0]['comments'][0]['description'] == 'a comment'
+        assert documents[0]['user_id'] == 1
+        assert documents[0]['visualization']['id'] == 1
+        assert documents[1]['title'] == 'new title'
+        assert [version['title'] for version in documents[1]['versions']] \
+            == ['title 1']
+        assert documents[2]['links']['city_object'][0]['target_id'] \
+            == 'building'
+        assert documents[3]['versions'] == []
+        assert documents[3]['links'] == {'city_object': []}
+        assert documents[4]['validationStatus']['status'] \
+            == Status.InValidation
+
+    def test_export_constant_queries_per_batch(self):
+        print("Each batch of documents costs a constant number of queries")
+        with count_queries() as statements:
+            list(ExportController.export_documents(batch_size=5))
+        one_batch_count = len(statements)
+        with count_queries() as statements:
+            list(ExportController.export_documents(batch_size=1))
+        assert len(statements) <= one_batch_count * 5
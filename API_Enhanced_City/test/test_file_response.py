@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from flask import Flask
+
+from api.helpers import send_stored_file
+
+CONTENT = b'0123456789' * 100
+DIGEST = 'ab6c5f3237f551d208fc2ca5225a4cca20b3fd638794a804f0ed5549d5041734'
+
+app = Flask(__name__)
+
+
+def get_file(location, headers=None, **options):
+    with app.test_request_context(headers=headers or {}):
+        return send_stored_file(str(location), DIGEST, **options)
+
+
+class TestFileResponse:
+    def test_etag(self, tmp_path):
+        print("Files are sent with their hash as a strong ETag")
+        location = tmp_path / 'file.pdf'
+        location.write_bytes(CONTENT)
+        response = get_file(location)
+        assert response.status_code == 200
+        assert response.headers['ETag'] == f'"{DIGEST}"'
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert response.headers['Cache-Control'] == 'public, no-cache'
+
+    def test_conditional(self, tmp_path):
+        print("Conditional requests are answered with a 304 status")
+        location = tmp_path / 'file.pdf'
+        location.write_bytes(CONTENT)
+        response = get_file(location, {'If-None-Match': f'"{DIGEST}"'})
+        assert response.status_code == 304
+        last_modified = get_file(location).headers['Last-Modified']
+        response = get_file(location, {'If-Modified-Since': last_modified})
+        assert response.status_code == 304
+        response = get_file(location, {'If-None-Match': '"other"'})
+        assert response.status_code == 200
+
+    def test_range(self, tmp_path):
+        print("Range requests are answered with a 206 status")
+        location = tmp_path / 'file.pdf'
+        location.write_bytes(CONTENT)
+        response = get_file(location, {'Range': 'bytes=10-19'})
+        assert response.status_code == 206
+        assert response.headers['Content-Range'] == 'bytes 10-19/1000'
+        response.direct_passthrough = False
+        assert response.get_data() == b'0123456789'
+        response = get_file(location, {'Range': 'bytes=5000-'})
+        assert response.status_code == 416
+
+    def test_cache_control(self, tmp_path):
+        print("Immutable files are cached for a long time, others privately")
+        location = tmp_path / 'file.pdf'
+        location.write_bytes(CONTENT)
+        assert get_file(location, immutable=True).headers['Cache-Control'] \
+            == 'public, max-age=31536000, immutable'
+        assert get_file(location, private=True).headers['Cache-Control'] \
+            == 'private, no-cache'
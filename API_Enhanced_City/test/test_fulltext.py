@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from util.db_config import Base
+from controller.DocController import DocController
+from entities.Comment import Comment
+from entities.Document import Document, fulltext_index
+from entities.DocumentUser import DocumentUser
+from entities.User import User
+from entities.VersionDoc import VersionDoc
+
+
+class TestFullTextFallback:
+    """
+    Full-text research on a database without full-text index (SQLite)
+    """
+    session = None
+
+    def test_init(self):
+        print("Create an in-memory SQLite database")
+        engine = create_engine('sqlite://')
+        Base.metadata.create_all(engine)
+        # The full-text index is only created on PostgreSQL
+        fulltext_index.execute(bind=engine)
+        TestFullTextFallback.session = sessionmaker(engine)()
+        for doc_id, title, description in [
+                (1, 'Lyon', 'A view of the Rhone river'),
+                (2, 'Bridges', 'Bridges over the Rhone in Lyon'),
+                (3, 'Paris', 'The Seine river')]:
+            document = Document({'role': {'label': 'admin'}})
+            document.update_initial({
+                'id': doc_id,
+                'title': title,
+                'description': description,
+                'source': 'source'
+            })
+            document.documentUser.append(DocumentUser(doc_id, 1))
+            TestFullTextFallback.session.add(document)
+        TestFullTextFallback.session.commit()
+
+    def test_search_all_words(self):
+        print("Only documents containing all the words are returned")
+        query = DocController.search_documents(
+            TestFullTextFallback.session,
+            {'keyword': 'rhone lyon', 'searchMode': 'fulltext'})
+        assert {document.id for document in query.all()} == {1, 2}
+
+    def test_search_ranking(self):
+        print("Documents are ranked by relevance")
+        query = DocController.search_documents(
+            TestFullTextFallback.session,
+            {'keyword': 'bridges rhone', 'searchMode': 'fulltext'})
+        assert [document.id for document in query.all()] == [2]
+        query = DocController.search_documents(
+            TestFullTextFallback.session,
+            {'keyword': 'lyon', 'searchMode': 'fulltext'})
+        assert [document.id for document in query.all()] == [1, 2]
+        TestFullTextFallback.session.close()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import io
+import os
+
+import pytest
+
+import util.upload as upload
+from controller.Controller import Controller
+from controller.DocController import DocController
+from controller.ImportController import ImportController
+from entities.ValidationStatus import Status
+from util.Exception import BadRequest
+
+ADMIN = {'user_id': 1, 'role': {'label': 'admin'}}
+CONTRIBUTOR = {'user_id': 1, 'role': {'label': 'contributor'}}
+
+NDJSON = b'''{"title": "a", "source": "s", "description": "d", "file": "a.gif"}
+{"title": "b", "source": "s", "description": "d", "file": "b.gif"}
+
+not json
+{"title": "c", "source": "s", "description": "d", "file": "c.gif",}
+{"title": "d", "source": "s", "description": "d", "file": "a.gif", \
+"refDate": "not a date"}
+'''
+
+CSV = b'''title,source,description,file,refDate,positionX
+a,s,d,a.gif,2018-01-01,0
+b,s,d,a.gif,,1.5
+c,s,,a.gif,,
+'''
+
+
+def save_files(names):
+    def save_file(name):
+        if name not in names:
+            raise BadRequest(f"Missing file '{name}'")
+        return upload.save_stream(io.BytesIO(name.encode('utf-8')),
+                                  upload.get_extension(name))[0]
+    return save_file
+
+
+class TestImport:
+    def test_init(self):
+        Controller.recreate_tables()
+        print("Starting import tests")
+
+    def test_create_documents(self):
+        print("Create many documents and report the invalid ones")
+        result = DocController.create_documents([
+            {'title': 'a', 'source': 's', 'description': 'd',
+             'file': 'a.gif', 'refDate': '2018-01-01', 'positionX': 1.5},
+            {'title': 'b', 'source': 's', 'file': 'b.gif'},
+            {'title': 'c', 'source': 's', 'description': 'd',
+             'file': 'c.gif', 'positionY': 'not a number'},
+            {'title': 'd', 'source': 's', 'description': 'd',
+             'file': 'd.gif'}
+        ], CONTRIBUTOR)
+        assert [created['index'] for created in result['created']] == [0, 3]
+        assert [error['index'] for error in result['errors']] == [1, 2]
+        assert result['errors'][0]['message'] == \
+            'Missing parameters : description'
+
+        document = DocController.get_document_by_id(
+            result['created'][0]['id'], CONTRIBUTOR)
+        assert document['title'] == 'a'
+        assert document['user_id'] == 1
+        assert document['visualization']['positionX'] == 1.5
+        assert document['validationStatus']['status'] == Status.InValidation
+
+    def test_create_documents_too_many(self):
+        print("Batches of documents are limited")
+        with pytest.raises(BadRequest):
+            DocController.create_documents(
+                [{}] * (DocController.max_batch_size + 1), ADMIN)
+
+    def test_import_ndjson(self, tmp_path, monkeypatch):
+        print("Import documents and their files from NDJSON")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        documents = ImportController.read_documents(io.BytesIO(NDJSON),
+                                                    'ndjson')
+        result = ImportController.import_documents(
+            documents, ADMIN, save_files({'a.gif', 'c.gif'}),
+            batch_size=2)
+        assert [created['index'] for created in result['created']] == [0]
+        assert [error['index'] for error in result['errors']] == [1, 2, 3, 4]
+        assert result['errors'][1]['message'].startswith(
+            'Invalid JSON on line 4')
+
+        document = DocController.get_document_by_id(
+            result['created'][0]['id'], ADMIN)
+        assert document['validationStatus']['status'] == Status.Validated
+        assert (tmp_path / document['file']).exists()
+
+    def test_import_csv(self, tmp_path, monkeypatch):
+        print("Import documents from CSV")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        documents = ImportController.read_documents(io.BytesIO(CSV), 'csv')
+        result = ImportController.import_documents(
+            documents, ADMIN, save_files({'a.gif'}))
+        assert [created['index'] for created in result['created']] == [0, 1]
+        assert result['errors'] == [{
+            'index': 2, 'message': 'Missing parameters : description'}]
+        document = DocController.get_document_by_id(
+            result['created'][1]['id'], ADMIN)
+        assert document['refDate'] is None
+        assert document['visualization']['positionX'] == 1.5
+
+    def test_import_sweeps_unused_files(self, tmp_path, monkeypatch):
+        print("Files of the documents which are not created are swept")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        documents = [{'title': 'a', 'source': 's', 'description': 'd',
+                      'file': 'new.gif', 'refDate': 'not a date'}]
+        result = ImportController.import_documents(
+            documents, ADMIN, save_files({'new.gif'}))
+        assert result['created'] == []
+        # Kept until the grace period is over
+        assert upload.sweep_files(DocController.is_file_referenced) == 0
+        assert upload.sweep_files(DocController.is_file_referenced,
+                                  grace_period=0) == 1
+        assert os.listdir(str(tmp_path)) == []
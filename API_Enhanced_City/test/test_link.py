@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import random
+from math import hypot
+
+import pytest
+
+from util.Exception import BadRequest
+from controller.Controller import Controller
+from controller.DocController import DocController
+from controller.LinkController import LinkController
+
+random.seed(42)
+CENTROIDS = [(random.uniform(0, 10000), random.uniform(0, 10000),
+              random.uniform(0, 100)) for _ in range(200)]
+
+
+class TestLink:
+    def test_init(self):
+        Controller.recreate_tables()
+        print("Starting link tests")
+        DocController.create_document({
+            'user_id': 1,
+            'title': 'title',
+            'source': 'source',
+            'description': 'a description',
+            'file': '1.gif',
+            'role': {'label': 'admin'}
+        }, {
+            'user_id': 1
+        })
+
+    def test_create_links(self):
+        print("Create links to city objects")
+        for i, (x, y, z) in enumerate(CENTROIDS):
+            link = LinkController.create_link('city_object', {
+                'source_id': 1,
+                'target_id': f'building_{i}',
+                'centroid_x': x,
+                'centroid_y': y,
+                'centroid_z': z
+            })
+            assert link['target_id'] == f'building_{i}'
+
+    def test_get_links_in_bbox(self):
+        print("Get the links inside a bounding box")
+        links = LinkController.get_links('city_object', {
+            'bbox': '2000,3000,6000,5000'
+        })
+        expected = {f'building_{i}' for i, (x, y, z) in enumerate(CENTROIDS)
+                    if 2000 <= x <= 6000 and 3000 <= y <= 5000}
+        assert {link['target_id'] for link in links} == expected
+
+    def test_get_links_in_3d_bbox(self):
+        print("Get the links inside a 3D bounding box")
+        links = LinkController.get_links('city_object', {
+            'bbox': '0,0,10,10000,10000,20',
+            'source_id': 1
+        })
+        expected = {f'building_{i}' for i, (x, y, z) in enumerate(CENTROIDS)
+                    if 10 <= z <= 20}
+        assert {link['target_id'] for link in links} == expected
+
+    def test_get_nearest_links(self):
+        print("Get the nearest links of a point")
+        for x, y, k in [(5000, 5000, 5), (0, 0, 20), (-50000, 3000, 3)]:
+            links = LinkController.get_links('city_object', {
+                'near': f'{x},{y}',
+                'k': str(k)
+            })
+            expected = sorted(range(len(CENTROIDS)), key=lambda i: hypot(
+                CENTROIDS[i][0] - x, CENTROIDS[i][1] - y))[:k]
+            assert [link['target_id'] for link in links] == \
+                [f'building_{i}' for i in expected]
+
+    def test_get_all_nearest_links(self):
+        print("Ask for more neighbours than there are links")
+        links = LinkController.get_links('city_object', {
+            'near': '5000,5000',
+            'k': '1000'
+        })
+        assert len(links) == len(CENTROIDS)
+
+    def test_invalid_spatial_filters(self):
+        print("Get links with invalid spatial filters")
+        with pytest.raises(BadRequest):
+            LinkController.get_links('city_object', {'bbox': '1,2,3'})
+        with pytest.raises(BadRequest):
+            LinkController.get_links('city_object', {'near': 'a,b'})
+        with pytest.raises(BadRequest):
+            LinkController.get_links('city_object', {'near': '1,2',
+                                                     'k': '0'})
+
+    def test_create_links_batch(self):
+        print("Create a batch of links with invalid items")
+        result = LinkController.create_links('city_object', [
+            {'source_id': 1, 'target_id': 'batch_0', 'centroid_x': 1,
+             'centroid_y': 2, 'centroid_z': 3},
+            {'source_id': 1, 'centroid_x': 1},
+            {'source_id': 42, 'target_id': 'batch_2'},
+            'not a link',
+            {'source_id': 1, 'target_id': 'batch_4', 'centroid_x': 'a'},
+            {'source_id': 1, 'target_id': 'batch_5', 'color': 'red'},
+            {'source_id': '1', 'target_id': 'batch_6'}
+        ])
+        assert [link['target_id'] for link in result['created']] == \
+            ['batch_0', 'batch_6']
+        assert result['created'][0]['centroid_x'] == 1.0
+        assert result['created'][1]['source_id'] == 1
+        assert result['created'][1]['centroid_x'] is None
+        assert [error['index'] for error in result['errors']] == [1, 2, 3, 4, 5]
+        links = LinkController.get_links('city_object', {
+            'target_id': 'batch_6'
+        })
+        assert links[0]['id'] == result['created'][1]['id']
+
+    def test_create_links_batch_errors(self):
+        print("Create a batch of links with an invalid type or size")
+        with pytest.raises(BadRequest):
+            LinkController.create_links('nothing', [])
+        with pytest.raises(BadRequest):
+            LinkController.create_links('city_object', [{}] * (
+                LinkController.max_batch_size + 1))
+
+    def test_delete_links_batch(self):
+        print("Delete a batch of links")
+        created = LinkController.create_links('city_object', [
+            {'source_id': 1, 'target_id': f'deleted_{i}'} for i in range(3)
+        ])['created']
+        ids = [link['id'] for link in created]
+        result = LinkController.delete_links('city_object',
+                                             ids + [100000, 'a', ids[0]])
+        assert [link['id'] for link in result['deleted']] == ids
+        assert [error['index'] for error in result['errors']] == [3, 4]
+        assert LinkController.get_links('city_object', {
+            'target_id': 'deleted_0'
+        }) == []
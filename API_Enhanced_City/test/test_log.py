@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import json
+
+import util.log as log
+from util.VarConfig import VarConfig
+
+
+def configure(monkeypatch, folder, **variables):
+    monkeypatch.setenv('EXTENDED_DOC_LOG_FOLDER', str(folder))
+    for key, value in variables.items():
+        monkeypatch.setenv(f'EXTENDED_DOC_{key.upper()}', value)
+    VarConfig.reload()
+    log.configure_logging()
+
+
+def reset(monkeypatch):
+    log.stop_logging()
+    monkeypatch.undo()
+    VarConfig.reload()
+
+
+class TestLog:
+    def test_json_records(self, tmp_path, monkeypatch):
+        print("Records are written as JSON by a background thread")
+        configure(monkeypatch, tmp_path)
+        try:
+            raise ValueError('invalid value')
+        except ValueError as e:
+            log.info_logger.error(e, exc_info=True,
+                                  extra={'duration_ms': 12.5})
+        log.info_logger.info('%s documents', 3)
+        reset(monkeypatch)
+        records = [json.loads(line) for line in
+                   (tmp_path / 'info.log').read_text().splitlines()]
+        assert records[0]['level'] == 'ERROR'
+        assert records[0]['message'] == 'invalid value'
+        assert records[0]['duration_ms'] == 12.5
+        assert 'ValueError: invalid value' in records[0]['exception']
+        assert records[1]['message'] == '3 documents'
+        assert records[1]['logger'] == 'info_logger'
+        assert not (tmp_path / 'sqlalchemy.log').exists()
+
+    def test_rotation(self, tmp_path, monkeypatch):
+        print("Log files are rotated")
+        configure(monkeypatch, tmp_path, log_max_bytes='1000',
+                  log_backup_count='2', log_format='text')
+        for i in range(100):
+            log.info_logger.info(f'Record {i}')
+        reset(monkeypatch)
+        assert sorted(path.name for path in tmp_path.iterdir()) == \
+            ['info.log', 'info.log.1', 'info.log.2']
+        assert (tmp_path / 'info.log').read_text().splitlines()[-1] \
+            .endswith('Record 99')
+
+    def test_external_rotation(self, tmp_path, monkeypatch):
+        print("Log files rotated by another program are reopened")
+        configure(monkeypatch, tmp_path, log_max_bytes='100',
+                  log_rotation='external', log_format='text')
+        log.info_logger.info('Before the rotation')
+        log._listener.queue.join()
+        (tmp_path / 'info.log').rename(tmp_path / 'info.log.1')
+        for i in range(10):
+            log.info_logger.info(f'Record {i}')
+        reset(monkeypatch)
+        assert sorted(path.name for path in tmp_path.iterdir()) == \
+            ['info.log', 'info.log.1']
+        assert len((tmp_path / 'info.log').read_text().splitlines()) == 10
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import atexit
+import json
+import os
+
+from flask import Flask
+from sqlalchemy import text
+
+import util.metrics as metrics
+from util.VarConfig import VarConfig
+import persistence_unit.PersistenceUnit as pUnit
+
+
+def create_app():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route('/statements/<int:count>')
+    def run_statements(count):
+        session = pUnit.Session()
+        try:
+            for _ in range(count):
+                session.execute(text('SELECT 1'))
+        finally:
+            session.close()
+        return 'ok'
+
+    return app
+
+
+class TestMetrics:
+    def test_histogram(self):
+        print("Histograms are exposed with cumulative buckets")
+        histogram = metrics.Histogram('duration_seconds', 'Duration.',
+                                      ('route',), (0.1, 1))
+        histogram.observe(0.05, ('/a',))
+        histogram.observe(0.5, ('/a',))
+        histogram.observe(5, ('/a',))
+        assert list(histogram.samples()) == [
+            'duration_seconds_bucket{route="/a",le="0.1"} 1',
+            'duration_seconds_bucket{route="/a",le="1"} 2',
+            'duration_seconds_bucket{route="/a",le="+Inf"} 3',
+            'duration_seconds_sum{route="/a"} 5.55',
+            'duration_seconds_count{route="/a"} 3'
+        ]
+
+    def test_disabled(self):
+        print("Metrics are disabled by default")
+        client = create_app().test_client()
+        assert client.get('/metrics').status_code == 404
+
+    def test_request_metrics(self, monkeypatch):
+        print("The SQL statements of each request are counted")
+        monkeypatch.setenv('EXTENDED_DOC_METRICS', 'true')
+        monkeypatch.setenv('EXTENDED_DOC_SLOW_QUERY_THRESHOLD', '0')
+        VarConfig.reload()
+        try:
+            client = create_app().test_client()
+            slow_queries = metrics.slow_queries.get()
+            assert client.get('/statements/3').status_code == 200
+            labels = ('GET', '/statements/<int:count>')
+            assert metrics.request_statements.get_sum(labels) == 3
+            assert metrics.request_sql_duration.get_sum(labels) > 0
+            assert metrics.request_duration.get_count(labels + ('200',)) == 1
+            assert metrics.slow_queries.get() >= slow_queries + 3
+
+            response = client.get('/metrics')
+            assert response.mimetype == 'text/plain'
+            body = response.get_data(as_text=True)
+            assert '# TYPE http_request_duration_seconds histogram' in body
+            assert 'http_request_sql_statements_sum{method="GET",' \
+                   'route="/statements/<int:count>"} 3' in body
+        finally:
+            monkeypatch.delenv('EXTENDED_DOC_METRICS')
+            monkeypatch.delenv('EXTENDED_DOC_SLOW_QUERY_THRESHOLD')
+            VarConfig.reload()
+
+    def test_restricted_access(self, monkeypatch):
+        print("Only the allowed addresses can read the metrics")
+        monkeypatch.setenv('EXTENDED_DOC_METRICS', 'true')
+        VarConfig.reload()
+        try:
+            client = create_app().test_client()
+            assert client.get('/metrics').status_code == 200
+            remote = {'REMOTE_ADDR': '10.1.2.3'}
+            assert client.get('/metrics',
+                              environ_base=remote).status_code == 403
+            monkeypatch.setenv('EXTENDED_DOC_METRICS_ALLOW',
+                               '127.0.0.1, 10.0.0.0/8')
+            VarConfig.reload()
+            assert client.get('/metrics',
+                              environ_base=remote).status_code == 200
+        finally:
+            monkeypatch.delenv('EXTENDED_DOC_METRICS')
+            monkeypatch.delenv('EXTENDED_DOC_METRICS_ALLOW')
+            VarConfig.reload()
+
+    def test_several_processes(self, tmp_path, monkeypatch):
+        print("The metrics of all the processes are summed")
+        monkeypatch.setenv('EXTENDED_DOC_METRICS', 'true')
+        monkeypatch.setenv('EXTENDED_DOC_METRICS_FOLDER', str(tmp_path))
+        VarConfig.reload()
+        try:
+            client = create_app().test_client()
+            assert client.get('/statements/2').status_code == 200
+            labels = ('GET', '/statements/<int:count>')
+            total = metrics.request_statements.get_sum(labels)
+            # Metrics written by another worker process
+            other = metrics.request_statements.copy()
+            other.observe(5, labels)
+            (tmp_path / 'metrics_1.json').write_text(json.dumps(
+                {other.name: other.get_state()}))
+            body = client.get('/metrics').get_data(as_text=True)
+            assert 'http_request_sql_statements_sum{method="GET",' \
+                   f'route="/statements/<int:count>"}} {total + 5}' in body
+            assert sorted(path.name for path in tmp_path.iterdir()) == \
+                sorted(['metrics_1.json', f'metrics_{os.getpid()}.json'])
+            metrics.clear_folder(str(tmp_path))
+            assert list(tmp_path.iterdir()) == []
+        finally:
+            atexit.unregister(metrics.write_state)
+            monkeypatch.delenv('EXTENDED_DOC_METRICS')
+            monkeypatch.delenv('EXTENDED_DOC_METRICS_FOLDER')
+            VarConfig.reload()
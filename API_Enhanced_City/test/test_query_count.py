@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+import persistence_unit.PersistenceUnit as pUnit
+from controller.Controller import Controller
+from controller.DocController import DocController
+from controller.CommentController import CommentController
+
+
+@contextmanager
+def count_queries():
+    """
+    Counts the SQL statements executed on the engine within the block.
+    """
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = pUnit.get_engine()
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+
+def create_documents(number, role='admin'):
+    for i in range(number):
+        document = DocController.create_document({
+            'user_id': 1,
+            'title': f'title {i}',
+            'source': 'source',
+            'description': 'a description',
+            'file': f'{i}.gif',
+            'role': {'label': role}
+        }, {
+            'user_id': 1
+        })
+        CommentController.create_comment(document['id'], {
+            'user_id': 1,
+            'description': 'a comment'
+        })
+
+
+class TestQueryCount:
+    def test_init(self):
+        Controller.recreate_tables()
+        print("Starting query count tests")
+
+    def test_get_documents_constant_queries(self):
+        print("Searching documents costs a constant number of queries")
+        create_documents(2)
+        with count_queries() as statements:
+            assert len(DocController.get_documents({})) == 2
+        few_documents_count = len(statements)
+
+        create_documents(8)
+        with count_queries() as statements:
+            assert len(DocController.get_documents({})) == 10
+        assert len(statements) == few_documents_count
+        # Documents with their visualisation, then comments and owners
+        assert len(statements) == 3
+
+    def test_get_documents_fields_queries(self):
+        print("Relationships which are not returned are not loaded")
+        with count_queries() as statements:
+            DocController.get_documents({'fields': 'title,refDate'})
+        assert len(statements) == 1
+
+    def test_get_documents_page_by_ref_date_queries(self):
+        print("The cursor of a page does not load the ordering column")
+        with count_queries() as statements:
+            page = DocController.get_documents_page({
+                'fields': 'title',
+                'orderBy': 'refDate',
+                'limit': '1'
+            })
+        assert page['next_cursor'] is not None
+        assert len(statements) == 1
+
+    def test_get_documents_to_validate_constant_queries(self):
+        print("Getting the moderation queue costs a constant number of "
+              "queries")
+        create_documents(3, role='contributor')
+        with count_queries() as statements:
+            assert len(DocController.get_documents_to_validate({
+                'user_id': 1,
+                'role': {'label': 'admin'}
+            })) == 3
+        # Documents with their visualisation and owners, then comments
+        assert len(statements) == 2
+
+    def test_get_documents_to_validate_as_owner(self):
+        print("Contributors get the documents they own in the moderation "
+              "queue, filtered in SQL")
+        with count_queries() as statements:
+            documents = DocController.get_documents_to_validate({
+                'user_id': 1,
+                'role': {'label': 'contributor'}
+            })
+        assert len(documents) == 3
+        assert len(statements) == 2
+        assert DocController.get_documents_to_validate({
+            'user_id': 2,
+            'role': {'label': 'contributor'}
+        }) == []
+
+    def test_is_editable_queries(self):
+        print("Checking that a user owns a document costs a single query")
+        doc_id = DocController.get_documents_to_validate({
+            'user_id': 1,
+            'role': {'label': 'admin'}
+        })[0]['id']
+        session = pUnit.Session()
+        try:
+            with count_queries() as statements:
+                assert DocController.is_editable(
+                    session, doc_id,
+                    {'user_id': 1, 'role': {'label': 'contributor'}})
+            assert len(statements) == 1
+            assert not DocController.is_editable(
+                session, doc_id,
+                {'user_id': 2, 'role': {'label': 'contributor'}})
+        finally:
+            session.close()
+
+    def test_get_document_by_id_queries(self):
+        print("Getting a document does not lazy load its relationships")
+        with count_queries() as statements:
+            document = DocController.get_document_by_id(1, None)
+        assert document['comments'][0]['description'] == 'a comment'
+        # The access is checked on the loaded document
+        assert len(statements) == 1
+
+    def test_check_document_access_queries(self):
+        print("Checking the access to a document costs a single query")
+        with count_queries() as statements:
+            document = DocController.check_document_access(1, None)
+        assert document == {'id': 1, 'file': '0.gif', 'validated': True}
+        assert len(statements) == 1
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from flask import Flask
+
+from api.helpers import cache_response, format_response, ResponseOK
+from controller.Controller import Controller
+from controller.TourController import TourController
+from entities.GuidedTour import GuidedTour
+import persistence_unit.PersistenceUnit as pUnit
+from util.ResponseCache import MemoryBackend, response_cache
+from util.VarConfig import VarConfig
+
+calls = []
+
+
+def create_app():
+    app = Flask(__name__)
+
+    @app.route('/guidedTour')
+    @cache_response('guided_tour', 'document_guided_tour')
+    @format_response
+    def get_tours():
+        calls.append(1)
+        return ResponseOK(TourController.get_tours())
+
+    return app
+
+
+class TestResponseCache:
+    def test_memory_backend(self):
+        print("The memory backend evicts expired and least recently used "
+              "entries")
+        backend = MemoryBackend(max_size=2)
+        backend.set('a', 1, 60)
+        backend.set('b', 2, 60)
+        backend.get('a')
+        backend.set('c', 3, 60)
+        assert backend.get('b') is None
+        assert backend.get('a') == 1
+        backend.set('d', 4, -1)
+        assert backend.get('d') is None
+        backend.increment_versions(['document'])
+        assert backend.get_versions(['document', 'link_city_object']) == [1, 0]
+
+    def test_etag_without_cache(self):
+        Controller.recreate_tables()
+        print("Responses have an ETag when the cache is disabled")
+        TourController.create_tour('tour', 'description')
+        client = create_app().test_client()
+        del calls[:]
+        response = client.get('/guidedTour')
+        assert response.status_code == 200
+        assert response.headers['Cache-Control'] == 'public, no-cache'
+        etag = response.headers['ETag']
+        response = client.get('/guidedTour',
+                              headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert len(calls) == 2
+
+    def test_cached_responses(self, monkeypatch):
+        print("Cached responses are invalidated by committed writes")
+        monkeypatch.setenv('EXTENDED_DOC_RESPONSE_CACHE', 'memory')
+        VarConfig.reload()
+        response_cache.configure()
+        try:
+            client = create_app().test_client()
+            del calls[:]
+            etag = client.get('/guidedTour').headers['ETag']
+            client.get('/guidedTour?b=2&a=1')
+            response = client.get('/guidedTour?a=1&b=2',
+                                  headers={'If-None-Match': etag})
+            assert response.status_code == 304
+            assert len(calls) == 2
+
+            TourController.update(1, {'name': 'new name'})
+            response = client.get('/guidedTour',
+                                  headers={'If-None-Match': etag})
+            assert response.status_code == 200
+            assert response.get_json()[0]['name'] == 'new name'
+            assert len(calls) == 3
+        finally:
+            monkeypatch.delenv('EXTENDED_DOC_RESPONSE_CACHE')
+            VarConfig.reload()
+            response_cache.configure()
+
+    def test_rollback(self, monkeypatch):
+        print("Rolled back writes do not invalidate the cached responses")
+        monkeypatch.setenv('EXTENDED_DOC_RESPONSE_CACHE', 'memory')
+        VarConfig.reload()
+        response_cache.configure()
+        try:
+            client = create_app().test_client()
+            client.get('/guidedTour')
+            hits = response_cache.hits
+            session = pUnit.Session()
+            try:
+                session.execute(GuidedTour.__table__.update().values(
+                    name='rolled back'))
+                session.rollback()
+            finally:
+                session.close()
+            client.get('/guidedTour')
+            assert response_cache.hits == hits + 1
+        finally:
+            monkeypatch.delenv('EXTENDED_DOC_RESPONSE_CACHE')
+            VarConfig.reload()
+            response_cache.configure()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import datetime
+import gzip
+import json
+
+from flask import Flask
+
+from api.helpers import format_response, ResponseOK
+from entities.ValidationStatus import Status
+from util.JsonCustomEncoder import JsonCustomEncoder
+from util.VarConfig import VarConfig
+import util.response_encoding as response_encoding
+
+CONTENT = [{
+    'id': i,
+    'description': 'a description ' * 20,
+    'refDate': datetime.datetime(2018, 1, 2, 3, 4, 5, 678,
+                                 datetime.timezone(datetime.timedelta(
+                                     hours=2))),
+    'publicationDate': datetime.date(2018, 1, 2),
+    'validationStatus': {'status': Status.Validated},
+    'position': (1.5, None),
+    'title': 'é'
+} for i in range(10)]
+
+
+def create_app():
+    app = Flask(__name__)
+    response_encoding.init_app(app)
+
+    @app.route('/documents/<int:count>')
+    @format_response
+    def get_documents(count):
+        return ResponseOK(CONTENT[:count])
+
+    return app
+
+
+class TestResponseEncoding:
+    def test_dumps(self, monkeypatch):
+        print("Responses are encoded as JsonCustomEncoder does")
+        body = response_encoding.dumps(CONTENT)
+        assert json.loads(body.decode('utf-8')) == json.loads(
+            json.dumps(CONTENT, cls=JsonCustomEncoder))
+        assert body.startswith(b'[{"description":')
+        monkeypatch.setattr(response_encoding, 'orjson', None)
+        assert response_encoding.dumps(CONTENT) == body
+
+    def test_choose_encoding(self):
+        print("The content coding is negotiated with Accept-Encoding")
+        assert response_encoding.choose_encoding(None) is None
+        assert response_encoding.choose_encoding('identity') is None
+        assert response_encoding.choose_encoding('gzip;q=0') is None
+        assert response_encoding.choose_encoding('deflate, gzip;q=0.5') \
+            == 'gzip'
+        expected = 'br' if response_encoding.brotli is not None else 'gzip'
+        assert response_encoding.choose_encoding('gzip, br') == expected
+
+    def test_compressed_response(self, monkeypatch):
+        print("Large responses are compressed")
+        monkeypatch.setattr(response_encoding, 'brotli', None)
+        client = create_app().test_client()
+        response = client.get('/documents/10',
+                              headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert response.headers['Vary'] == 'Accept-Encoding'
+        assert gzip.decompress(response.get_data()) == \
+            response_encoding.dumps(CONTENT)
+        assert int(response.headers['Content-Length']) == \
+            len(response.get_data())
+
+        response = client.get('/documents/1',
+                              headers={'Accept-Encoding': 'gzip'})
+        assert 'Content-Encoding' not in response.headers
+        response = client.get('/documents/10')
+        assert 'Content-Encoding' not in response.headers
+
+    def test_compression_disabled(self, monkeypatch):
+        print("Compression can be disabled")
+        monkeypatch.setenv('EXTENDED_DOC_COMPRESSION', 'false')
+        VarConfig.reload()
+        try:
+            client = create_app().test_client()
+            response = client.get('/documents/10',
+                                  headers={'Accept-Encoding': 'gzip'})
+            assert 'Content-Encoding' not in response.headers
+        finally:
+            monkeypatch.delenv('EXTENDED_DOC_COMPRESSION')
+            VarConfig.reload()
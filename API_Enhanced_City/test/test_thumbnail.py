@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import io
+import os
+
+import pytest
+
+import util.upload as upload
+from util.thumbnail import ThumbnailCache, get_thumbnail_width
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def save_image(width, height, color='red'):
+    content = io.BytesIO()
+    Image.new('RGB', (width, height), color).save(content, 'PNG')
+    content.seek(0)
+    filename, _ = upload.save_stream(content, 'png')
+    return filename
+
+
+class TestThumbnail:
+    def test_thumbnail_width(self):
+        print("Requested widths are rounded up to a thumbnail width")
+        assert get_thumbnail_width(1) == 64
+        assert get_thumbnail_width(200) == 256
+        assert get_thumbnail_width(256) == 256
+        assert get_thumbnail_width(5000) is None
+
+    def test_generate_thumbnail(self, tmp_path, monkeypatch):
+        print("Thumbnails are generated in the background")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path / 'upload'))
+        cache = ThumbnailCache(str(tmp_path / 'thumbnails'), workers=1)
+        filename = save_image(800, 400)
+        assert cache.get(filename, 256) is None
+        cache.wait()
+        location, etag = cache.get(filename, 256)
+        assert etag == f'{upload.get_file_digest(filename)}-256'
+        with Image.open(location) as thumbnail:
+            assert thumbnail.size == (256, 128)
+
+    def test_not_an_image(self, tmp_path, monkeypatch):
+        print("Only images have thumbnails")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path / 'upload'))
+        cache = ThumbnailCache(str(tmp_path / 'thumbnails'), workers=1)
+        filename, _ = upload.save_stream(io.BytesIO(b'%PDF'), 'pdf')
+        assert cache.get(filename, 256) is None
+        cache.wait()
+        assert cache.get(filename, 256) is None
+
+    def test_evict_least_recently_used(self, tmp_path, monkeypatch):
+        print("The least recently used thumbnails are evicted")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path / 'upload'))
+        folder = tmp_path / 'thumbnails'
+        cache = ThumbnailCache(str(folder), workers=1)
+        filenames = [save_image(300, 300, color)
+                     for color in ('red', 'green', 'blue')]
+        for filename in filenames[:2]:
+            cache.get(filename, 64)
+            cache.wait()
+        # Use the first thumbnail, so that the second one is evicted
+        assert cache.get(filenames[0], 64) is not None
+        cache.max_size = sum(os.path.getsize(str(path))
+                             for path in folder.iterdir()) + 1
+        cache.get(filenames[2], 64)
+        cache.wait()
+        assert cache.get(filenames[0], 64) is not None
+        assert cache.get(filenames[2], 64) is not None
+        assert len(os.listdir(str(folder))) == 2
+
+    def test_cache_shared_by_processes(self, tmp_path, monkeypatch):
+        print("The size of the cache is bounded for all the processes")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path / 'upload'))
+        folder = tmp_path / 'thumbnails'
+        filenames = [save_image(300, 300, color)
+                     for color in ('red', 'green', 'blue', 'yellow')]
+        first_cache = ThumbnailCache(str(folder), workers=1,
+                                     rescan_interval=0)
+        first_cache.get(filenames[0], 64)
+        first_cache.wait()
+        max_size = 2 * os.path.getsize(str(next(folder.iterdir()))) + 1
+        first_cache.max_size = max_size
+        # Another process with its own cache of the same folder
+        second_cache = ThumbnailCache(str(folder), max_size, workers=1,
+                                      rescan_interval=0)
+        for filename in filenames[1:3]:
+            second_cache.get(filename, 64)
+            second_cache.wait()
+        first_cache.get(filenames[3], 64)
+        first_cache.wait()
+        assert sum(os.path.getsize(str(path))
+                   for path in folder.iterdir()) <= max_size
+        assert first_cache.get(filenames[0], 64) is None
+
+    def test_thumbnail_of_another_process(self, tmp_path, monkeypatch):
+        print("A thumbnail generated by another process is served before the "
+              "folder is listed again")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path / 'upload'))
+        folder = str(tmp_path / 'thumbnails')
+        filename = save_image(300, 300)
+        first_cache = ThumbnailCache(folder, workers=1)
+        assert first_cache.get(filename, 128) is None
+        first_cache.wait()
+        second_cache = ThumbnailCache(folder, workers=1)
+        second_cache.get(filename, 64)
+        second_cache.wait()
+        assert first_cache.get(filename, 64) is not None
+        assert not first_cache._pending
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import hashlib
+import io
+import os
+import time
+
+import pytest
+
+import util.upload as upload
+from util.Exception import NotFound, PayloadTooLarge
+
+CONTENT = os.urandom(3 * upload.CHUNK_SIZE + 123)
+
+
+class TestUpload:
+    def test_save_stream(self, tmp_path, monkeypatch):
+        print("Save a stream in chunks and hash it")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        filename, sha256 = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        assert sha256 == hashlib.sha256(CONTENT).hexdigest()
+        assert filename == f'{sha256[:2]}/{sha256[2:4]}/{sha256}.pdf'
+        assert (tmp_path / filename).read_bytes() == CONTENT
+        assert os.listdir(str(tmp_path)) == [sha256[:2]]
+
+    def test_save_stream_deduplicated(self, tmp_path, monkeypatch):
+        print("The same content is only stored once")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        first, _ = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        second, _ = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        assert first == second
+        assert os.listdir(str(tmp_path / os.path.dirname(first))) == \
+            [os.path.basename(first)]
+
+    def test_delete_file(self, tmp_path, monkeypatch):
+        print("A file is only deleted when it is not referenced anymore")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        filename, _ = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        assert not upload.delete_file(filename, lambda name: True,
+                                      grace_period=0)
+        assert (tmp_path / filename).exists()
+        assert upload.delete_file(filename, lambda name: False,
+                                  grace_period=0)
+        assert os.listdir(str(tmp_path)) == []
+        assert not upload.delete_file(filename)
+
+    def test_delete_file_referenced_meanwhile(self, tmp_path, monkeypatch):
+        print("A file referenced while it is deleted is kept")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        filename, _ = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        checks = []
+
+        def is_referenced(name):
+            # The same content is saved and referenced after the first check
+            if checks:
+                upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+            checks.append(name)
+            return len(checks) > 1
+
+        assert not upload.delete_file(filename, is_referenced,
+                                      grace_period=0)
+        assert (tmp_path / filename).read_bytes() == CONTENT
+        assert os.listdir(str(tmp_path / os.path.dirname(filename))) == \
+            [os.path.basename(filename)]
+
+    def test_delete_recent_file(self, tmp_path, monkeypatch):
+        print("A shared file saved recently is kept, as its references may "
+              "not be committed yet")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        filename, _ = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        assert not upload.delete_file(filename, lambda name: False)
+        assert (tmp_path / filename).exists()
+        # Saving the same content again refreshes the file
+        old = time.time() - 2 * upload.DEFAULT_GRACE_PERIOD
+        os.utime(str(tmp_path / filename), (old, old))
+        upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        assert not upload.delete_file(filename, lambda name: False)
+        os.utime(str(tmp_path / filename), (old, old))
+        assert upload.delete_file(filename, lambda name: False)
+
+    def test_sweep_files(self, tmp_path, monkeypatch):
+        print("Sweep the files which are not referenced anymore")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        used, _ = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        unused, _ = upload.save_stream(io.BytesIO(b'unused'), 'pdf')
+        recent, _ = upload.save_stream(io.BytesIO(b'recent'), 'pdf')
+        old = time.time() - 2 * upload.DEFAULT_GRACE_PERIOD
+        for filename in (used, unused):
+            os.utime(str(tmp_path / filename), (old, old))
+        assert upload.sweep_files(lambda name: name == used) == 1
+        assert (tmp_path / used).exists()
+        assert not (tmp_path / unused).exists()
+        assert (tmp_path / recent).exists()
+
+    def test_file_outside_of_upload_folder(self, tmp_path, monkeypatch):
+        print("Files outside of the upload folder cannot be read or deleted")
+        folder = tmp_path / 'upload'
+        folder.mkdir()
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(folder))
+        secret = tmp_path / 'secret.txt'
+        secret.write_bytes(CONTENT)
+        for filename in ['../secret.txt', 'a/../../secret.txt',
+                         str(secret)]:
+            with pytest.raises(NotFound):
+                upload.get_file_location(filename)
+            assert not upload.delete_file(filename)
+        assert secret.exists()
+
+    def test_save_stream_too_large(self, tmp_path, monkeypatch):
+        print("A stream larger than the maximum size is not saved")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        with pytest.raises(PayloadTooLarge):
+            upload.save_stream(io.BytesIO(CONTENT), 'pdf',
+                               max_size=len(CONTENT) - 1)
+        assert os.listdir(str(tmp_path)) == []
+
+    def test_configured_max_size(self, tmp_path, monkeypatch):
+        print("The maximum size of an upload can be configured")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        monkeypatch.setattr(upload.VarConfig, '_config',
+                            {'max_upload_size': '10'})
+        assert upload.get_max_upload_size() == 10
+        with pytest.raises(PayloadTooLarge):
+            upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+
+    def test_find_image(self, tmp_path, monkeypatch):
+        print("Find a file from its name without extension")
+        monkeypatch.setattr(upload, 'UPLOAD_FOLDER', str(tmp_path))
+        (tmp_path / 'legacy.png').write_bytes(b'legacy')
+        filename, sha256 = upload.save_stream(io.BytesIO(CONTENT), 'pdf')
+        assert upload.find_image('legacy') == 'legacy.png'
+        assert upload.find_image(sha256) == filename
+        assert upload.find_image('unknown') is None
+
+        # Files saved and deleted once the index is built
+        other, other_sha256 = upload.save_stream(io.BytesIO(b'other'), 'gif')
+        assert upload.find_image(other_sha256) == other
+        upload.delete_file(other)
+        assert upload.find_image(other_sha256) is None
+
+        # Files saved and deleted by another process
+        (tmp_path / 'legacy.png').unlink()
+        (tmp_path / 'external.jpg').write_bytes(b'external')
+        assert upload.find_image('legacy') is None
+        assert upload.find_image('external') == 'external.jpg'
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import os
+import signal
+import threading
+
+import pytest
+
+from util.VarConfig import VarConfig
+
+
+class TestVarConfig:
+    def test_parsed_once(self):
+        print("The configuration is only parsed once")
+        assert VarConfig.get() is VarConfig.get()
+
+    def test_immutable(self):
+        print("The configuration cannot be modified")
+        with pytest.raises(TypeError):
+            VarConfig.get()['password'] = 'another password'
+
+    def test_environment_override(self, monkeypatch):
+        print("Environment variables override the .env file on reload")
+        reloaded = []
+        VarConfig.on_reload(reloaded.append)
+        monkeypatch.setenv('EXTENDED_DOC_DBNAME', 'overridden')
+        VarConfig.reload()
+        assert VarConfig.get()['dbname'] == 'overridden'
+        assert reloaded == [VarConfig.get()]
+        VarConfig._callbacks.remove(reloaded.append)
+        monkeypatch.delenv('EXTENDED_DOC_DBNAME')
+        VarConfig.reload()
+        assert VarConfig.get()['dbname'] != 'overridden'
+
+    def test_watch_once(self):
+        print("The configuration watcher is started once per process")
+        thread = VarConfig.watch()
+        assert thread.is_alive()
+        assert VarConfig.watch() is thread
+
+    def test_sighup_while_locked(self):
+        print("SIGHUP does not deadlock when the configuration is locked")
+        reloaded = threading.Event()
+        VarConfig.on_reload(lambda config: reloaded.set())
+        previous_handler = signal.getsignal(signal.SIGHUP)
+        try:
+            VarConfig.install_sighup_handler()
+            with VarConfig._lock:
+                os.kill(os.getpid(), signal.SIGHUP)
+                assert not reloaded.wait(0.1)
+            assert reloaded.wait(5)
+        finally:
+            signal.signal(signal.SIGHUP, previous_handler)
+            VarConfig._callbacks.pop()
+
+    def test_callback_registered_once(self):
+        print("A reload callback is only registered once")
+        reloaded = []
+        VarConfig.on_reload(reloaded.append)
+        VarConfig.on_reload(reloaded.append)
+        try:
+            VarConfig.reload()
+            assert len(reloaded) == 1
+        finally:
+            VarConfig._callbacks.remove(reloaded.append)
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+from collections import OrderedDict
+from threading import Lock
+from time import time
+
+
+class AuthCache:
+    """
+    Bounded cache of the authentication info decoded from JWT tokens. It is
+    used by the `use_authentication` decorator to avoid decoding the token and
+    querying the user table on every authenticated request.
+
+    Entries are keyed by the encoded token and expire at the token's `exp`
+    claim, or after `ttl` seconds if it comes first. When the cache is full,
+    the least recently used entry is evicted. Entries can be invalidated for a
+    specific user (when this user is deleted or their role changes).
+    """
+
+    def __init__(self, max_size=1024, ttl=300):
+        """
+        :param int max_size: Maximum number of tokens kept in the cache.
+        :param float ttl: Maximum lifetime of an entry, in seconds.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, token):
+        """
+        Returns the decoded payload cached for `token`, or None if the token is
+        not cached or its entry has expired.
+        :param str token: The encoded JWT.
+        :return: The decoded payload or None.
+        """
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, payload = entry
+            if expires_at <= time():
+                del self._entries[token]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(token)
+            self.hits += 1
+            return payload
+
+    def put(self, token, payload):
+        """
+        Caches the decoded payload of a token.
+        :param str token: The encoded JWT.
+        :param dict payload: The decoded JWT. Its `exp` claim, if any, bounds
+            the lifetime of the entry.
+        """
+        expires_at = time() + self.ttl
+        if payload.get('exp') is not None:
+            expires_at = min(expires_at, float(payload['exp']))
+        with self._lock:
+            self._entries[token] = (expires_at, payload)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate_user(self, user_id):
+        """
+        Removes all the entries belonging to a user.
+        :param int user_id: The ID of the user.
+        """
+        with self._lock:
+            tokens = [token for token, (_, payload) in self._entries.items()
+                      if payload.get('user_id') == user_id]
+            for token in tokens:
+                del self._entries[token]
+
+    def clear(self):
+        """
+        Removes all the entries of the cache. Counters are left untouched.
+        """
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """
+        Returns the counters of the cache, which are used to size it.
+        :return: A dict containing the size, max size, hits and misses.
+        """
+        with self._lock:
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses
+            }
+
+
+auth_cache = AuthCache()
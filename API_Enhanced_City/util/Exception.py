@@ -34,6 +34,10 @@ class Conflict(Exception):
     pass
 
 
+class PayloadTooLarge(Exception):
+    pass
+
+
 def throw(ex):
     """
     Transforms a raise statement into an expression. Used in lambda functions
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import json
+from collections import OrderedDict
+from threading import Lock
+from time import time
+from urllib.parse import urlencode
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+
+from util.VarConfig import VarConfig
+
+# Default values of the response cache variables of the `.env` file
+default_response_cache_config = {
+    'response_cache': '',
+    'response_cache_ttl': '60',
+    'response_cache_max_size': '1024'
+}
+
+
+class MemoryBackend:
+    """
+    Storage of the response cache in the memory of the process. Entries are
+    evicted when they expire or, when the backend is full, in least recently
+    used order. The versions of the tables are never evicted.
+    """
+
+    def __init__(self, max_size=1024):
+        """
+        :param int max_size: Maximum number of entries kept in the backend.
+        """
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get_versions(self, names):
+        with self._lock:
+            return [self._versions.get(name, 0) for name in names]
+
+    def increment_versions(self, names):
+        with self._lock:
+            for name in names:
+                self._versions[name] = self._versions.get(name, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+
+
+class RedisBackend:
+    """
+    Storage of the response cache in a Redis server, shared by all the
+    processes of the API : a write committed by one process invalidates the
+    responses cached by the others.
+    """
+    prefix = 'response_cache:'
+
+    def __init__(self, url):
+        """
+        :param str url: The URL of the Redis server, e.g.
+            `redis://localhost:6379/0`.
+        """
+        if redis is None:
+            raise RuntimeError('redis is required by the Redis response cache')
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(self.prefix + key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self.prefix + key, json.dumps(value),
+                         ex=max(1, int(ttl)))
+
+    def get_versions(self, names):
+        values = self._client.mget(
+            [f'{self.prefix}version:{name}' for name in names])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def increment_versions(self, names):
+        pipeline = self._client.pipeline()
+        for name in names:
+            pipeline.incr(f'{self.prefix}version:{name}')
+        pipeline.execute()
+
+    def clear(self):
+        keys = list(self._client.scan_iter(self.prefix + '*'))
+        if keys:
+            self._client.delete(*keys)
+
+
+class ResponseCache:
+    """
+    Cache of the responses of read routes, keyed by the path and the
+    normalized query string of the request. Each route declares the tables
+    it reads : the key also contains the version of these tables, which is
+    incremented when a transaction writing to them is committed. A write
+    thus makes the cached responses unreachable, and they are evicted when
+    they expire.
+
+    The cache is disabled until a backend is set, see `configure`.
+    """
+
+    def __init__(self, backend=None, ttl=60):
+        """
+        :param backend: A `MemoryBackend`, a `RedisBackend` or any object
+            with the same methods, or None to disable the cache.
+        :param float ttl: Lifetime of the cached responses, in seconds.
+        """
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def configure(self, config=None):
+        """
+        Sets the backend from the `response_cache` variable of the
+        configuration : `memory` to cache the responses in each process, a
+        `redis://` URL to share them between processes, or empty to disable
+        the cache. Responses are kept `response_cache_ttl` seconds, and the
+        memory backend holds at most `response_cache_max_size` responses.
+        :param dict config: The configuration, `VarConfig.get()` by default.
+        """
+        settings = dict(default_response_cache_config)
+        settings.update((key, value) for key, value in
+                        (config if config is not None
+                         else VarConfig.get()).items()
+                        if key in default_response_cache_config)
+        backend = settings['response_cache'].strip()
+        self.ttl = float(settings['response_cache_ttl'])
+        if not backend:
+            self.backend = None
+        elif backend == 'memory':
+            self.backend = MemoryBackend(
+                int(settings['response_cache_max_size']))
+        elif backend.startswith(('redis://', 'rediss://', 'unix://')):
+            self.backend = RedisBackend(backend)
+        else:
+            raise ValueError(f'Invalid response_cache : {backend}')
+        if self.enabled:
+            track_writes()
+
+    def make_key(self, path, args, tables):
+        """
+        Returns the key of the response of a request.
+        :param str path: The path of the request.
+        :param args: The query arguments of the request, a `MultiDict`.
+        :param tables: The names of the tables read by the route.
+        :return: The key, which changes when one of the tables is written.
+        """
+        query = urlencode(sorted(args.items(multi=True)))
+        versions = self.backend.get_versions(tables)
+        return f'{path}?{query}#' + ','.join(map(str, versions))
+
+    def get(self, key):
+        """
+        Returns the response cached for `key`, or None.
+        :param str key: A key returned by `make_key`.
+        :return: A dict containing the `etag`, `body`, `mimetype` and `headers`
+            of the response, or None.
+        """
+        entry = self.backend.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, entry):
+        """
+        Caches a response for `ttl` seconds.
+        :param str key: A key returned by `make_key`.
+        :param dict entry: The response, see `get`.
+        """
+        self.backend.set(key, entry, self.ttl)
+
+    def invalidate(self, tables):
+        """
+        Invalidates the cached responses of the routes reading the tables.
+        :param tables: The names of the tables.
+        """
+        if self.enabled and tables:
+            self.backend.increment_versions(sorted(tables))
+
+    def clear(self):
+        """
+        Removes all the cached responses. Counters are left untouched.
+        """
+        if self.enabled:
+            self.backend.clear()
+
+    def stats(self):
+        """
+        Returns the counters of the cache.
+        :return: A dict containing the hits and the misses.
+        """
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+response_cache = ResponseCache()
+
+
+def record_write(conn, clauseelement, multiparams, params, result):
+    if isinstance(clauseelement, UpdateBase):
+        conn.info.setdefault('written_tables', set()).add(
+            clauseelement.table.name)
+
+
+def invalidate_written_tables(conn):
+    response_cache.invalidate(conn.info.pop('written_tables', None))
+
+
+def forget_written_tables(conn):
+    conn.info.pop('written_tables', None)
+
+
+def track_writes():
+    """
+    Records the tables written by the INSERT, UPDATE and DELETE statements of
+    all the SQLAlchemy engines, whether they are emitted by the ORM or by
+    Core, and invalidates their cached responses when the transaction is
+    committed.
+    """
+    if not event.contains(Engine, 'after_execute', record_write):
+        event.listen(Engine, 'after_execute', record_write)
+        event.listen(Engine, 'commit', invalidate_written_tables)
+        event.listen(Engine, 'rollback', forget_written_tables)
@@ -1,26 +1,137 @@
 #!/usr/bin/env python3
 # coding: utf8
 
+import logging
 import os
+import signal
+import threading
+import time
+from types import MappingProxyType
+
+ENV_FILE = '.env'
+ENV_PREFIX = 'EXTENDED_DOC_'
 
 
 class VarConfig:
+    """
+    Process-wide configuration of the application. The `.env` file is parsed
+    once, the first time the configuration is needed, and the result is kept
+    in an immutable mapping. Environment variables named `EXTENDED_DOC_<KEY>`
+    (for instance `EXTENDED_DOC_PASSWORD`) override the values of the file.
+
+    The configuration can be reloaded explicitly with `reload`, on SIGHUP
+    (see `install_sighup_handler`) or when the modification time of the file
+    changes (see `watch`). Callbacks registered with `on_reload` are called
+    after each reload.
+    """
+    _config = None
+    _mtime = None
+    _callbacks = []
+    _lock = threading.Lock()
+    _watcher = None
+    _watcher_pid = None
+
     @staticmethod
     def get():
+        """
+        Returns the configuration. Only the first call reads the `.env` file.
+        :return: An immutable mapping of the configuration variables.
+        """
+        config = VarConfig._config
+        if config is None:
+            with VarConfig._lock:
+                if VarConfig._config is None:
+                    VarConfig._load()
+                config = VarConfig._config
+        return config
+
+    @staticmethod
+    def reload():
+        """
+        Parses the `.env` file again and notifies the registered callbacks.
+        """
+        with VarConfig._lock:
+            VarConfig._load()
+        for callback in VarConfig._callbacks:
+            callback(VarConfig._config)
+
+    @staticmethod
+    def on_reload(callback):
+        """
+        Registers a function to call each time the configuration is reloaded.
+        A function which is already registered is not registered again.
+        :param callback: A function taking the new configuration as parameter.
+        """
+        if callback not in VarConfig._callbacks:
+            VarConfig._callbacks.append(callback)
+
+    @staticmethod
+    def install_sighup_handler():
+        """
+        Reloads the configuration when the process receives SIGHUP. Has to be
+        called from the main thread.
+        """
+        def handle_sighup(signum, frame):
+            # The handler runs in the main thread, which may hold the lock of
+            # the configuration : the reload is done by another thread
+            threading.Thread(target=VarConfig.reload, daemon=True).start()
+
+        if hasattr(signal, 'SIGHUP'):
+            signal.signal(signal.SIGHUP, handle_sighup)
+
+    @staticmethod
+    def watch(interval=5):
+        """
+        Starts a daemon thread which reloads the configuration when the
+        modification time of the `.env` file changes. The thread is started
+        once per process : threads do not survive a fork, so a forked worker
+        starts its own thread when it calls `watch`.
+        :param float interval: The time between two checks, in seconds.
+        :return: The thread.
+        """
+        if VarConfig._watcher_pid == os.getpid():
+            return VarConfig._watcher
+
+        def check_mtime():
+            while True:
+                time.sleep(interval)
+                try:
+                    if VarConfig._read_mtime() != VarConfig._mtime:
+                        VarConfig.reload()
+                except Exception as e:
+                    logging.getLogger('info_logger').error(e)
+
+        thread = threading.Thread(target=check_mtime, daemon=True)
+        thread.start()
+        VarConfig._watcher = thread
+        VarConfig._watcher_pid = os.getpid()
+        return thread
+
+    @staticmethod
+    def _read_mtime():
+        try:
+            return os.stat(ENV_FILE).st_mtime
+        except OSError:
+            return None
+
+    @staticmethod
+    def _load():
         config = {}
-        with open(".env", 'r') as file:
+        mtime = VarConfig._read_mtime()
+        with open(ENV_FILE, 'r') as file:
             for line in file.readlines():
                 # Allow empty line or comment line (starting with '#')
                 if '=' in line and line[0] != '#':
-                    var, value = line.replace('\n', '').split('=')
+                    var, value = line.replace('\n', '').split('=', 1)
                     config[var] = value
 
-            # if the environment variable "EXTENDED_DOC_PASSWORD" exists
-            if os.environ.get("EXTENDED_DOC_PASSWORD"):
-                config['password'] = os.environ["EXTENDED_DOC_PASSWORD"]
+        for var, value in os.environ.items():
+            if var.startswith(ENV_PREFIX):
+                config[var[len(ENV_PREFIX):].lower()] = value
 
-            return config
+        VarConfig._config = MappingProxyType(config)
+        VarConfig._mtime = mtime
 
 
 if __name__ == '__main__':
-    print(VarConfig.get())
+    print(dict(VarConfig.get()))
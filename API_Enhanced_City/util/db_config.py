@@ -2,6 +2,7 @@
 # coding: utf8
 
 from util.VarConfig import VarConfig
+from sqlalchemy import text
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -14,3 +15,80 @@ def get_db_info():
     return f'{config["ordbms"]}://{config["user"]}:' \
            f'{config["password"]}@{config["host"]}:' \
            f'{config["port"]}/{config["dbname"]}'
+
+
+# Default values of the optional connection settings of the `.env` file
+default_engine_config = {
+    'pool_size': '5',
+    'max_overflow': '10',
+    'pool_timeout': '30',
+    'pool_recycle': '-1',
+    'pool_pre_ping': 'false',
+    'statement_timeout': '0',
+    'connect_retries': '10',
+    'connect_backoff': '0.5',
+    'connect_max_backoff': '30'
+}
+
+
+def get_engine_config():
+    """
+    Returns the connection settings of the configuration, converted to their
+    types. Missing settings take their value in `default_engine_config`.
+
+    - `pool_size`, `max_overflow`, `pool_timeout` (seconds), `pool_recycle`
+      (seconds, -1 to never recycle) and `pool_pre_ping` configure the
+      connection pool of the engine.
+    - `statement_timeout` (milliseconds, 0 to disable) aborts the statements
+      which take too long (PostgreSQL only).
+    - `connect_retries`, `connect_backoff` and `connect_max_backoff`
+      (seconds) configure the retries of the first connection to the
+      database, whose delay doubles after each failed attempt.
+    :return: A dict of the connection settings.
+    """
+    config = dict(default_engine_config)
+    config.update((key, value) for key, value in VarConfig.get().items()
+                  if key in default_engine_config)
+    return {
+        'pool_size': int(config['pool_size']),
+        'max_overflow': int(config['max_overflow']),
+        'pool_timeout': float(config['pool_timeout']),
+        'pool_recycle': int(config['pool_recycle']),
+        'pool_pre_ping': config['pool_pre_ping'].lower() in ('true', '1',
+                                                             'yes'),
+        'statement_timeout': int(config['statement_timeout']),
+        'connect_retries': int(config['connect_retries']),
+        'connect_backoff': float(config['connect_backoff']),
+        'connect_max_backoff': float(config['connect_max_backoff'])
+    }
+
+
+def get_engine_options():
+    """
+    Returns the keyword arguments of `create_engine` built from the
+    connection settings (see `get_engine_config`).
+    :return: A dict of arguments for `create_engine`.
+    """
+    config = get_engine_config()
+    options = {key: config[key] for key in ('pool_size', 'max_overflow',
+                                            'pool_timeout', 'pool_recycle',
+                                            'pool_pre_ping')}
+    if config['statement_timeout'] > 0 \
+            and VarConfig.get()['ordbms'].startswith('postgresql'):
+        options['connect_args'] = {
+            'options': f'-c statement_timeout={config["statement_timeout"]}'
+        }
+    return options
+
+
+def has_extension(bind, name):
+    """
+    Checks if a PostgreSQL extension is installed in the database.
+    :param bind: An engine or a connection
+    :param name: The name of the extension (e.g. 'postgis')
+    :return: True if the database is a PostgreSQL database with the extension
+    """
+    if bind.dialect.name != 'postgresql':
+        return False
+    return bind.execute(text('SELECT 1 FROM pg_extension WHERE extname = :name'),
+                        name=name).first() is not None
@@ -1,30 +1,171 @@
 #!/usr/bin/env python3
 # coding: utf8
 
+import atexit
+import datetime
+import json
 import logging
 import os
+import queue
+from logging.handlers import QueueHandler, QueueListener, \
+    RotatingFileHandler, WatchedFileHandler
 
-print(os.getcwd())
+from util.VarConfig import VarConfig
 
 default_formatter = '[%(levelname)s] %(asctime)s : %(message)s'
 
+# Default values of the logging variables of the `.env` file
+default_log_config = {
+    'log_folder': 'log',
+    'log_format': 'json',
+    'log_max_bytes': str(10 * 1024 * 1024),
+    'log_backup_count': '5',
+    'log_rotation': 'size',
+    'log_sql': 'false'
+}
 
-def set_logger(a_logger, level, file_name, mode, formatter):
-    a_logger.setLevel(level)
-    file_handler = logging.FileHandler(file_name, mode=mode)
-    formatter = logging.Formatter(formatter)
-    file_handler.setFormatter(formatter)
-    a_logger.addHandler(file_handler)
+# Values of `log_rotation`
+LOG_ROTATIONS = ('size', 'external')
 
+# Attributes of every `LogRecord`. The other attributes of a record are
+# passed with the `extra` argument of the logging methods.
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {'message'}
 
-info_logger = logging.getLogger('sqlalchemy.engine')
-set_logger(info_logger, logging.DEBUG, 'log/sqlalchemy.log', 'w',
-           default_formatter)
+info_logger = logging.getLogger('info_logger')
+info_logger.setLevel(logging.DEBUG)
 
-info_logger = logging.getLogger('sqlalchemy.engine')
-set_logger(info_logger, logging.INFO, 'log/sqlalchemy_info.log', 'w',
-           default_formatter)
+_listener = None
+_queue_handlers = []
 
-info_logger = logging.getLogger('info_logger')
-set_logger(info_logger, logging.DEBUG, 'log/info.log', 'w',
-           default_formatter)
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a JSON object on one line, with its time (ISO 8601,
+    UTC), level, logger and message, the traceback of its exception, and the
+    `extra` fields passed to the logging method.
+    """
+
+    def format(self, record):
+        entry = {
+            'time': datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES and key not in entry:
+                entry[key] = value
+        return json.dumps(entry, default=str)
+
+
+class RecordQueueHandler(QueueHandler):
+    """
+    Puts the records in a queue without formatting them : only the message
+    is computed in the calling thread, as its arguments may change later.
+    Records, including their traceback, are formatted by the thread of the
+    `QueueListener`.
+    """
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def get_log_config():
+    """
+    Returns the logging settings of the configuration, converted to their
+    types. Missing settings take their value in `default_log_config`.
+    :return: A dict of the logging settings.
+    """
+    config = dict(default_log_config)
+    config.update((key, value) for key, value in VarConfig.get().items()
+                  if key in default_log_config)
+    return {
+        'log_folder': config['log_folder'],
+        'log_format': config['log_format'],
+        'log_max_bytes': int(config['log_max_bytes']),
+        'log_backup_count': int(config['log_backup_count']),
+        'log_rotation': config['log_rotation'],
+        'log_sql': config['log_sql'].lower() in ('true', '1', 'yes')
+    }
+
+
+def configure_logging():
+    """
+    Installs the log handlers, replacing the ones of a previous call. The
+    loggers only put the records in a queue, and a background thread writes
+    them to rotating files of the `log_folder` folder : `info.log`, and
+    `sqlalchemy.log` when `log_sql` is true. Records are written as JSON
+    objects, or as text with `log_format=text`.
+
+    With `log_rotation=size`, files are rotated above `log_max_bytes` bytes,
+    keeping `log_backup_count` old files. This rotation is only safe when a
+    single process writes the files. When several processes do (e.g. the
+    workers of gunicorn), `log_rotation=external` makes each of them append
+    to the files, which are reopened once rotated by another program such
+    as logrotate.
+    """
+    global _listener
+    stop_logging()
+    config = get_log_config()
+    if config['log_rotation'] not in LOG_ROTATIONS:
+        raise ValueError(f"Invalid log_rotation : {config['log_rotation']}")
+    os.makedirs(config['log_folder'], exist_ok=True)
+    if config['log_format'] == 'text':
+        formatter = logging.Formatter(default_formatter)
+    else:
+        formatter = JsonFormatter()
+
+    loggers = [(info_logger, logging.DEBUG, 'info.log')]
+    if config['log_sql']:
+        loggers.append((logging.getLogger('sqlalchemy.engine'),
+                        logging.INFO, 'sqlalchemy.log'))
+
+    log_queue = queue.Queue(-1)
+    file_handlers = []
+    for a_logger, level, file_name in loggers:
+        path = os.path.join(config['log_folder'], file_name)
+        if config['log_rotation'] == 'external':
+            file_handler = WatchedFileHandler(path, delay=True)
+        else:
+            file_handler = RotatingFileHandler(
+                path, maxBytes=config['log_max_bytes'],
+                backupCount=config['log_backup_count'], delay=True)
+        file_handler.setFormatter(formatter)
+        # Routes the records of each logger to its own file
+        file_handler.addFilter(logging.Filter(a_logger.name))
+        file_handlers.append(file_handler)
+
+        queue_handler = RecordQueueHandler(log_queue)
+        a_logger.setLevel(level)
+        a_logger.addHandler(queue_handler)
+        _queue_handlers.append((a_logger, queue_handler))
+
+    _listener = QueueListener(log_queue, *file_handlers,
+                              respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging():
+    """
+    Writes the queued records and removes the handlers installed by
+    `configure_logging`.
+    """
+    global _listener
+    while _queue_handlers:
+        a_logger, queue_handler = _queue_handlers.pop()
+        a_logger.removeHandler(queue_handler)
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
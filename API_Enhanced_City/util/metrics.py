@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import atexit
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import request, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from util.VarConfig import VarConfig
+
+# Default value of the `slow_query_threshold` variable of the `.env` file, in
+# milliseconds
+DEFAULT_SLOW_QUERY_THRESHOLD = 500
+# Default value of the `metrics_allow` variable of the `.env` file : the
+# addresses allowed to read the metrics
+DEFAULT_ALLOWED_NETWORKS = '127.0.0.1,::1'
+# Minimum interval between two writes of the metrics of a process in the
+# `metrics_folder`, in seconds
+WRITE_INTERVAL = 1
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+slow_query_logger = logging.getLogger('info_logger')
+
+# Time of the last `write_state` of the current process
+last_write_time = 0
+write_lock = threading.Lock()
+
+
+def is_enabled(config=None):
+    """
+    Checks if the instrumentation is enabled by the `metrics` variable of the
+    configuration (false by default).
+    """
+    config = config if config is not None else VarConfig.get()
+    return config.get('metrics', 'false').lower() in ('true', '1', 'yes')
+
+
+def format_labels(names, values, extra=''):
+    labels = [f'{name}="{escape(value)}"'
+              for name, value in zip(names, values)]
+    if extra:
+        labels.append(extra)
+    return '{' + ','.join(labels) + '}' if labels else ''
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+        .replace('\n', '\\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Prometheus counter, with a value per combination of labels.
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, label_names=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, labels=()):
+        return self._values.get(labels, 0)
+
+    def copy(self):
+        """
+        Returns a counter with the same name and labels, without values.
+        """
+        return Counter(self.name, self.documentation, self.label_names)
+
+    def get_state(self):
+        with self._lock:
+            return [[list(labels), value]
+                    for labels, value in self._values.items()]
+
+    def merge(self, state):
+        for labels, value in state:
+            self.inc(tuple(labels), value)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f'{self.name}{format_labels(self.label_names, labels)} ' \
+                  f'{format_value(value)}'
+
+
+class Histogram:
+    """
+    Prometheus histogram, with buckets per combination of labels. Buckets
+    are cumulative in the exposition, as Prometheus expects.
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, label_names=(),
+                 buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, labels=()):
+        with self._lock:
+            counts, total = self._values.get(
+                labels, ([0] * len(self.buckets), 0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._values[labels] = (counts, total + value)
+
+    def get_count(self, labels=()):
+        counts, _ = self._values.get(labels, ([0], 0))
+        return sum(counts)
+
+    def get_sum(self, labels=()):
+        return self._values.get(labels, (None, 0))[1]
+
+    def copy(self):
+        """
+        Returns a histogram with the same name, labels and buckets, without
+        values.
+        """
+        return Histogram(self.name, self.documentation, self.label_names,
+                         self.buckets[:-1])
+
+    def get_state(self):
+        with self._lock:
+            return [[list(labels), list(counts), total]
+                    for labels, (counts, total) in self._values.items()]
+
+    def merge(self, state):
+        with self._lock:
+            for labels, counts, total in state:
+                labels = tuple(labels)
+                current_counts, current_total = self._values.get(
+                    labels, ([0] * len(self.buckets), 0))
+                self._values[labels] = (
+                    [a + b for a, b in zip(current_counts, counts)],
+                    current_total + total)
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total)
+                      for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                bucket_labels = format_labels(
+                    self.label_names, labels, f'le="{format_value(bound)}"')
+                yield f'{self.name}_bucket{bucket_labels} {cumulative}'
+            label_string = format_labels(self.label_names, labels)
+            yield f'{self.name}_sum{label_string} {format_value(total)}'
+            yield f'{self.name}_count{label_string} {cumulative}'
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Duration of the HTTP requests.',
+    ('method', 'route', 'status'))
+request_statements = Histogram(
+    'http_request_sql_statements', 'Number of SQL statements per request.',
+    ('method', 'route'), STATEMENT_BUCKETS)
+request_sql_duration = Histogram(
+    'http_request_sql_duration_seconds',
+    'Time spent executing SQL statements per request.', ('method', 'route'))
+slow_queries = Counter(
+    'sql_slow_queries_total',
+    'Number of SQL statements slower than the slow query threshold.')
+
+registry = [request_duration, request_statements, request_sql_duration,
+            slow_queries]
+
+
+def get_folder(config=None):
+    """
+    Returns the folder where the processes of the server write their metrics,
+    configured by the `metrics_folder` variable of the configuration, or None
+    if each process only reports its own metrics.
+    """
+    config = config if config is not None else VarConfig.get()
+    return config.get('metrics_folder') or None
+
+
+def write_state(folder):
+    """
+    Writes the metrics of the current process in `folder`, in a file named
+    after its pid.
+    :param folder: The metrics folder (see `get_folder`)
+    """
+    global last_write_time
+    location = os.path.join(folder, f'metrics_{os.getpid()}.json')
+    with write_lock:
+        last_write_time = time.monotonic()
+        with open(location + '.part', 'w') as file:
+            json.dump({metric.name: metric.get_state()
+                       for metric in registry}, file)
+        os.replace(location + '.part', location)
+
+
+def read_states(folder):
+    """
+    Sums the metrics written in `folder` by all the processes, including the
+    ones which have exited, so that counters never decrease.
+    :param folder: The metrics folder (see `get_folder`)
+    :return: The list of the summed metrics, in the order of `registry`
+    """
+    metrics = [metric.copy() for metric in registry]
+    for name in os.listdir(folder):
+        if not (name.startswith('metrics_') and name.endswith('.json')):
+            continue
+        try:
+            with open(os.path.join(folder, name)) as file:
+                states = json.load(file)
+        except (OSError, ValueError):
+            # Removed meanwhile
+            continue
+        for metric in metrics:
+            metric.merge(states.get(metric.name, []))
+    return metrics
+
+
+def clear_folder(folder):
+    """
+    Removes the metrics written by the previous runs of the server.
+    :param folder: The metrics folder (see `get_folder`)
+    """
+    os.makedirs(folder, exist_ok=True)
+    for name in os.listdir(folder):
+        if name.startswith('metrics_'):
+            os.remove(os.path.join(folder, name))
+
+
+def render():
+    """
+    Renders the metrics in the Prometheus text exposition format. When a
+    `metrics_folder` is configured, the metrics of all the processes are
+    summed.
+    :return: The text of the metrics
+    """
+    metrics = registry
+    folder = get_folder()
+    if folder is not None:
+        write_state(folder)
+        metrics = read_states(folder)
+    lines = []
+    for metric in metrics:
+        lines.append(f'# HELP {metric.name} {metric.documentation}')
+        lines.append(f'# TYPE {metric.name} {metric.type}')
+        lines.extend(metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def is_allowed(address, config=None):
+    """
+    Checks if an address is allowed to read the metrics by the `metrics_allow`
+    variable of the configuration, a comma separated list of addresses and
+    networks (e.g. '127.0.0.1,10.0.0.0/8'), only the local host by default.
+    :param address: The IP address of the client
+    :return: True if the address is allowed
+    """
+    config = config if config is not None else VarConfig.get()
+    try:
+        address = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network.strip(), strict=False)
+               for network in config.get('metrics_allow',
+                                         DEFAULT_ALLOWED_NETWORKS).split(',')
+               if network.strip())
+
+
+def get_metrics():
+    if not is_allowed(request.remote_addr):
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+    return Response(render(), mimetype='text/plain; version=0.0.4')
+
+
+class RequestStats(threading.local):
+    """
+    SQL statements of the request handled by the current thread. `active`
+    is False outside of requests, when statements are not counted.
+    """
+    active = False
+    statements = 0
+    sql_duration = 0.0
+
+
+current_request = RequestStats()
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    duration = time.perf_counter() - conn.info['query_start_time'].pop()
+    if current_request.active:
+        current_request.statements += 1
+        current_request.sql_duration += duration
+    threshold = float(VarConfig.get().get('slow_query_threshold',
+                                          DEFAULT_SLOW_QUERY_THRESHOLD))
+    if duration * 1000 >= threshold:
+        slow_queries.inc()
+        slow_query_logger.warning(
+            f'Slow query ({duration * 1000:.1f} ms) : {statement}',
+            extra={'duration_ms': round(duration * 1000, 3)})
+
+
+def instrument_engines():
+    """
+    Times the SQL statements executed by all the SQLAlchemy engines.
+    """
+    if not event.contains(Engine, 'before_cursor_execute',
+                          before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+
+
+def init_app(app):
+    """
+    Instruments a Flask application when the `metrics` variable of the
+    configuration is true : the duration, the number of SQL statements and
+    the SQL time of each request are recorded by route, and exposed by the
+    `GET /metrics` route, to the addresses of `metrics_allow` (see
+    `is_allowed`). Statements slower than `slow_query_threshold`
+    milliseconds are logged.
+
+    Each process records its own metrics : when the server runs several
+    processes, `metrics_folder` should be configured, so that they write
+    their metrics there (at most every `WRITE_INTERVAL` seconds, and when
+    they exit) and the route sums those of all the processes.
+    :param app: The Flask application
+    """
+    if not is_enabled():
+        return
+    instrument_engines()
+    folder = get_folder()
+    if folder is not None:
+        os.makedirs(folder, exist_ok=True)
+        # Registered once, even if several applications are created
+        atexit.unregister(write_state)
+        atexit.register(write_state, folder)
+
+    @app.before_request
+    def start_request():
+        current_request.active = True
+        current_request.statements = 0
+        current_request.sql_duration = 0.0
+        request.metrics_start_time = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        start_time = getattr(request, 'metrics_start_time', None)
+        if start_time is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_duration.observe(
+                time.perf_counter() - start_time,
+                (request.method, route, str(response.status_code)))
+            request_statements.observe(current_request.statements,
+                                       (request.method, route))
+            request_sql_duration.observe(current_request.sql_duration,
+                                         (request.method, route))
+        current_request.active = False
+        if folder is not None \
+                and time.monotonic() - last_write_time >= WRITE_INTERVAL:
+            write_state(folder)
+        return response
+
+    app.add_url_rule('/metrics', 'metrics', get_metrics)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import gzip
+import json
+from datetime import date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from flask import request
+
+from util.JsonCustomEncoder import JsonCustomEncoder
+from util.VarConfig import VarConfig
+
+# Default values of the compression variables of the `.env` file
+default_compression_config = {
+    'compression': 'true',
+    'compression_min_size': '1024'
+}
+
+# Compression levels : responses are compressed for every request, so the
+# faster levels are preferred to the smaller outputs
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/x-ndjson',
+                          'text/html', 'text/plain')
+
+
+def default(obj):
+    """
+    Converts the objects which are not natively serialized by orjson, as
+    `JsonCustomEncoder` does.
+    """
+    if isinstance(obj, date):
+        return obj.isoformat()
+    try:
+        return list(iter(obj))
+    except TypeError:
+        raise TypeError(f'{type(obj).__name__} is not JSON serializable')
+
+
+def dumps(content):
+    """
+    Encodes a value in compact JSON, with sorted keys, as UTF-8. orjson is
+    used when it is installed, and the standard library with
+    `JsonCustomEncoder` otherwise. Both give the same output : dates are
+    written in ISO 8601, and enumerations by the name of their member.
+    orjson writes the value of the members instead, so the enumerations
+    sent in the responses must have their names as values (see `Status`).
+    :param content: The value to encode.
+    :return: The encoded value, in bytes.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=default, option=(
+            orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS |
+            orjson.OPT_PASSTHROUGH_DATETIME))
+    return json.dumps(content, cls=JsonCustomEncoder, sort_keys=True,
+                      ensure_ascii=False, separators=(',', ':')) \
+        .encode('utf-8')
+
+
+def get_compression_config():
+    """
+    Returns the compression settings of the configuration, converted to
+    their types. Missing settings take their value in
+    `default_compression_config`.
+    :return: A dict of the compression settings.
+    """
+    config = dict(default_compression_config)
+    config.update((key, value) for key, value in VarConfig.get().items()
+                  if key in default_compression_config)
+    return {
+        'compression': config['compression'].lower() in ('true', '1', 'yes'),
+        'compression_min_size': int(config['compression_min_size'])
+    }
+
+
+def choose_encoding(accept_encoding):
+    """
+    Chooses the content coding of a response from the `Accept-Encoding`
+    header of the request : `br` when brotli is installed and accepted, then
+    `gzip`.
+    :param str accept_encoding: The value of the header.
+    :return: `br`, `gzip`, or None if the client accepts neither.
+    """
+    accepted = set()
+    for coding in (accept_encoding or '').split(','):
+        name, _, parameters = coding.strip().partition(';')
+        quality = parameters.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and ('br' in accepted or '*' in accepted):
+        return 'br'
+    if 'gzip' in accepted or '*' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    """
+    Compresses a body with a content coding returned by `choose_encoding`.
+    :param bytes body: The body of a response.
+    :param str encoding: `br` or `gzip`.
+    :return: The compressed body.
+    """
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response):
+    """
+    Compresses the body of a Flask response when the client accepts it and
+    the body is larger than `compression_min_size` bytes. Streamed responses
+    and files are sent as is. The ETag of a compressed response is weak, as
+    its bytes depend on the content coding.
+    :param response: The Flask response.
+    :return: The response.
+    """
+    config = get_compression_config()
+    if not config['compression'] or response.direct_passthrough \
+            or response.is_streamed or response.status_code != 200 \
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES \
+            or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.content_length is None \
+            or response.content_length < config['compression_min_size']:
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    """
+    Compresses the responses of a Flask application with gzip, or brotli when
+    it is installed, as negotiated with the `Accept-Encoding` header. Enabled
+    unless `compression` is false in the configuration, e.g. when a reverse
+    proxy already compresses the responses.
+    :param app: The Flask application
+    """
+    app.after_request(compress_response)
@@ -1,17 +1,72 @@
 #!/usr/bin/env python3
 # coding: utf8
 
+from sqlalchemy import inspect
+
+
+class Serializer:
+    """
+    Serializer of a mapped class. The columns and relationships to serialize
+    are computed once from the SQLAlchemy mapper of the class, ignoring the
+    attributes listed in the `serialize_exclude` attribute of the class.
+    """
+
+    def __init__(self, cls):
+        mapper = inspect(cls)
+        exclude = set(getattr(cls, 'serialize_exclude', ()))
+        self.columns = tuple(attr.key for attr in mapper.column_attrs
+                             if attr.key not in exclude)
+        self.relationships = tuple((rel.key, rel.uselist)
+                                   for rel in mapper.relationships
+                                   if rel.key not in exclude)
+
+    def serialize(self, obj, fields=None):
+        """
+        Serializes an instance of the mapped class into a dict. Related
+        entities are serialized with their own `serialize` method.
+        :param obj: An instance of the mapped class.
+        :param fields: If specified, only the columns and relationships in
+            this collection are serialized.
+        :return: A dict containing the values of the columns and the
+        serialized relationships.
+        """
+        columns = self.columns
+        relationships = self.relationships
+        if fields is not None:
+            columns = [key for key in columns if key in fields]
+            relationships = [(key, uselist) for key, uselist in relationships
+                             if key in fields]
+        serialized_object = {key: getattr(obj, key) for key in columns}
+        for key, uselist in relationships:
+            value = getattr(obj, key)
+            if value is None:
+                serialized_object[key] = None
+            elif uselist:
+                serialized_object[key] = [item.serialize() for item in value]
+            else:
+                serialized_object[key] = value.serialize()
+        return serialized_object
+
+
+_serializers = {}
+
+
+def get_serializer(cls):
+    """
+    Returns the serializer of a mapped class, creating it on first use.
+    :param cls: A mapped class.
+    :return: The `Serializer` of the class.
+    """
+    serializer = _serializers.get(cls)
+    if serializer is None:
+        serializer = _serializers[cls] = Serializer(cls)
+    return serializer
+
 
 def serialize(objects_to_serialize):
-    try:
-        return objects_to_serialize.serialize()
-
-    except AttributeError:
-        try:
-            doc_lists = []
-            for obj in objects_to_serialize:
-                doc_lists.append(obj.serialize())
-            return doc_lists
-
-        except (TypeError, AttributeError):
-            return objects_to_serialize
+    serialize_method = getattr(objects_to_serialize, 'serialize', None)
+    if serialize_method is not None:
+        return serialize_method()
+    if isinstance(objects_to_serialize, (list, tuple)):
+        return [serialize(obj) for obj in objects_to_serialize]
+    return objects_to_serialize
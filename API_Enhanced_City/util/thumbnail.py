@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# coding: utf8
+
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from util.VarConfig import VarConfig
+import util.upload as upload
+
+THUMBNAIL_FOLDER = 'thumbnails'
+# Widths of the generated thumbnails. Requested widths are rounded up to one
+# of them, so that a few derivatives are stored per image.
+THUMBNAIL_WIDTHS = (64, 128, 256, 512, 1024)
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+FORMATS = {'png': 'PNG', 'jpg': 'JPEG', 'jpeg': 'JPEG', 'gif': 'GIF'}
+
+# Default values of the `thumbnail_cache_size` (in bytes) and
+# `thumbnail_workers` variables of the `.env` file
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+DEFAULT_WORKERS = 2
+# Interval between two listings of the thumbnail folder, in seconds
+DEFAULT_RESCAN_INTERVAL = 60
+
+
+def get_thumbnail_width(width):
+    """
+    Rounds a requested width up to one of the `THUMBNAIL_WIDTHS`.
+    :param width: The requested width, in pixels
+    :return: The width of the thumbnail, or None if the requested width is
+    larger than the largest thumbnail
+    """
+    for thumbnail_width in THUMBNAIL_WIDTHS:
+        if width <= thumbnail_width:
+            return thumbnail_width
+    return None
+
+
+class ThumbnailCache:
+    """
+    Disk cache of the resized images of the upload folder. Thumbnails are
+    generated by a pool of worker threads, so that requests never wait for
+    them : `get` returns None until the thumbnail is ready, and the original
+    file should be sent meanwhile.
+
+    The least recently used thumbnails are removed when the total size of the
+    cache exceeds `max_size`. The use of the thumbnails is tracked in memory
+    and in the modification time of the files, so that it survives restarts.
+    The folder is shared by the worker processes of the server : the files
+    are listed again every `rescan_interval` seconds, so that `max_size`
+    bounds the thumbnails of all the processes, and a thumbnail missing from
+    the memory of a process is looked up on disk before being generated.
+    The lock only guards the memory of the cache : the folder is listed and
+    the files are touched and removed without holding it.
+    Thumbnails are only generated when Pillow is installed.
+    """
+
+    def __init__(self, folder=THUMBNAIL_FOLDER, max_size=None, workers=None,
+                 rescan_interval=DEFAULT_RESCAN_INTERVAL):
+        self.folder = folder
+        self.max_size = max_size
+        self.workers = workers
+        self.rescan_interval = rescan_interval
+        self._files = None
+        self._size = 0
+        self._next_scan = 0
+        self._pending = {}
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self, filename, width):
+        """
+        Returns the thumbnail of an image, or schedules its generation.
+        :param filename: The name of the image, relative to `UPLOAD_FOLDER`
+        :param width: The width of the thumbnail, one of `THUMBNAIL_WIDTHS`
+        :return: The path of the thumbnail and its ETag, or None if it is not
+        ready (or cannot be generated)
+        """
+        extension = upload.get_extension(filename)
+        if Image is None or extension not in IMAGE_EXTENSIONS:
+            return None
+        digest = upload.get_file_digest(filename) or \
+            hashlib.sha256(filename.encode('utf-8')).hexdigest()
+        name = f'{digest}_{width}.{extension}'
+        location = os.path.join(self.folder, name)
+        self._rescan_if_needed()
+        with self._lock:
+            known = name in self._files
+            if known:
+                self._files.move_to_end(name)
+        try:
+            os.utime(location)
+            if not known:
+                # Generated by another process since the last listing
+                size = os.path.getsize(location)
+                with self._lock:
+                    self._add(name, size)
+            return location, f'{digest}-{width}'
+        except OSError:
+            # Not generated yet, or removed by another process
+            pass
+        with self._lock:
+            self._size -= self._files.pop(name, 0)
+            if name not in self._pending:
+                self._pending[name] = self._get_executor().submit(
+                    self._generate, filename, name, width)
+        return None
+
+    def wait(self):
+        """
+        Waits for the thumbnails being generated.
+        """
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.exception()
+
+    def _generate(self, filename, name, width):
+        try:
+            source = upload.get_file_location(filename)
+            with Image.open(source) as image:
+                image.thumbnail((width, image.height * width), Image.LANCZOS)
+                temp_file = tempfile.NamedTemporaryFile(
+                    dir=self.folder, suffix='.part', delete=False)
+                try:
+                    with temp_file:
+                        image.save(temp_file,
+                                   FORMATS[upload.get_extension(filename)])
+                    size = os.path.getsize(temp_file.name)
+                    os.replace(temp_file.name,
+                               os.path.join(self.folder, name))
+                except BaseException:
+                    os.remove(temp_file.name)
+                    raise
+            self._rescan_if_needed()
+            self._store(name, size)
+        except Exception as e:
+            logging.getLogger('info_logger').error(
+                f'Cannot create the thumbnail of {filename} : {e}')
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+
+    def _store(self, name, size):
+        # Adds a thumbnail, then removes the least recently used ones
+        max_size = self.max_size
+        if max_size is None:
+            max_size = int(VarConfig.get().get('thumbnail_cache_size',
+                                               DEFAULT_CACHE_SIZE))
+        removed = []
+        with self._lock:
+            self._add(name, size)
+            while self._size > max_size and self._files:
+                removed_name, removed_size = self._files.popitem(last=False)
+                self._size -= removed_size
+                removed.append(removed_name)
+        for removed_name in removed:
+            try:
+                os.remove(os.path.join(self.folder, removed_name))
+            except OSError:
+                pass
+
+    def _add(self, name, size):
+        self._size += size - self._files.pop(name, 0)
+        self._files[name] = size
+
+    def _rescan_if_needed(self):
+        # Other processes also add and remove thumbnails
+        with self._lock:
+            if self._files is not None and time.monotonic() < self._next_scan:
+                return
+            # Other threads keep using the current listing meanwhile
+            self._next_scan = time.monotonic() + self.rescan_interval
+        os.makedirs(self.folder, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.folder):
+            try:
+                if entry.is_file() and not entry.name.endswith('.part'):
+                    entries.append((entry.stat().st_mtime, entry.name,
+                                    entry.stat().st_size))
+            except OSError:
+                # Removed meanwhile
+                pass
+        entries.sort()
+        files = OrderedDict((name, size) for _, name, size in entries)
+        with self._lock:
+            self._files = files
+            self._size = sum(files.values())
+
+    def _get_executor(self):
+        # Created on first use, so that each worker process has its own
+        if self._executor is None:
+            workers = self.workers or int(VarConfig.get().get(
+                'thumbnail_workers', DEFAULT_WORKERS))
+            self._executor = ThreadPoolExecutor(max_workers=workers)
+        return self._executor
+
+
+thumbnail_cache = ThumbnailCache()
@@ -1,15 +1,30 @@
 #!/usr/bin/env python3
 # coding: utf8
 
+import hashlib
 import os
 import re
-from flask import safe_join
-
+import tempfile
+import threading
+import time
 import uuid
 
+from werkzeug.security import safe_join
+
+from util.Exception import NotFound, PayloadTooLarge
+from util.VarConfig import VarConfig
+
 UPLOAD_FOLDER = 'upload'
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'png', 'jpg', 'jpeg', 'gif'}
 
+# Size of the chunks written by `save_stream`, in bytes
+CHUNK_SIZE = 64 * 1024
+# Maximum size of an uploaded file when `max_upload_size` is not configured
+DEFAULT_MAX_UPLOAD_SIZE = 100 * 1024 * 1024
+# Age, in seconds, under which a file is not deleted when `upload_grace_period`
+# is not configured
+DEFAULT_GRACE_PERIOD = 3600
+
 
 def get_extension(filename):
     if '.' in filename:
@@ -20,27 +35,304 @@ def allowed_file(extension):
     return extension in ALLOWED_EXTENSIONS
 
 
-def save_file(file):
+def get_max_upload_size():
+    """
+    Returns the maximum size of an uploaded file, in bytes, configured by the
+    `max_upload_size` variable of the `.env` file.
+    """
+    return int(VarConfig.get().get('max_upload_size', DEFAULT_MAX_UPLOAD_SIZE))
+
+
+def get_grace_period():
+    """
+    Returns the age, in seconds, under which `delete_file` keeps the files
+    which may be shared, configured by the `upload_grace_period` variable of
+    the `.env` file.
+    """
+    return float(VarConfig.get().get('upload_grace_period',
+                                     DEFAULT_GRACE_PERIOD))
+
+
+def get_blob_path(digest, extension):
+    """
+    Returns the path of a file in the content-addressed store, relative to
+    `UPLOAD_FOLDER`. Files are named after the SHA-256 of their content and
+    sharded in two levels of subdirectories named after the first bytes of
+    the hash (e.g. 'ab/cd/abcd...ef.png').
+    :param digest: The SHA-256 of the content, in hexadecimal
+    :param extension: The extension of the file
+    :return: The path of the file
+    """
+    return f'{digest[:2]}/{digest[2:4]}/{digest}.{extension}'
+
+
+def get_file_digest(filename):
+    """
+    Returns the SHA-256 of a file of the content-addressed store, which is
+    its name (see `get_blob_path`).
+    :param filename: The name of the file, relative to `UPLOAD_FOLDER`
+    :return: The SHA-256 in hexadecimal, or None if the file was stored
+    before the content-addressed store (with a random name)
+    """
+    digest = os.path.basename(filename).split('.', 1)[0]
+    if re.fullmatch('[0-9a-f]{64}', digest):
+        return digest
+    return None
+
+
+def get_file_location(filename):
+    """
+    Returns the path of a file of `UPLOAD_FOLDER`. Names which would resolve
+    outside of the folder (absolute paths, '..' components) are rejected.
+    :param filename: The name of the file, relative to `UPLOAD_FOLDER`
+    :return: The path of the file
+    :raises NotFound: if the file does not exist or is not in the folder
+    """
+    if filename:
+        location = safe_join(UPLOAD_FOLDER, filename)
+        if location is not None and os.path.isfile(location):
+            return location
+    raise NotFound("File doest not exist")
+
+
+def save_stream(stream, extension, max_size=None):
+    """
+    Saves the content of a stream in `UPLOAD_FOLDER`. The stream is read and
+    written in chunks of `CHUNK_SIZE` bytes to a temporary file, which is
+    renamed once complete, so the content is never fully held in memory and a
+    partially written file is never visible.
+
+    Files are stored by content (see `get_blob_path`) : saving the same
+    content twice returns the same file name and only stores it once.
+    :param stream: A binary file-like object
+    :param extension: The extension of the saved file
+    :param max_size: The maximum size of the file, in bytes. Defaults to
+    `get_max_upload_size`.
+    :return: The name of the saved file, relative to `UPLOAD_FOLDER`, and the
+    SHA-256 of its content
+    :raises PayloadTooLarge: if the stream is larger than `max_size`
+    """
+    if max_size is None:
+        max_size = get_max_upload_size()
     if not os.path.isdir(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
+    sha256 = hashlib.sha256()
+    size = 0
+    temp_file = tempfile.NamedTemporaryFile(dir=UPLOAD_FOLDER, suffix='.part',
+                                            delete=False)
+    try:
+        with temp_file:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    raise PayloadTooLarge(f'The file is larger than '
+                                          f'{max_size} bytes')
+                sha256.update(chunk)
+                temp_file.write(chunk)
+        digest = sha256.hexdigest()
+        filename = get_blob_path(digest, extension)
+        location = os.path.join(UPLOAD_FOLDER, filename)
+        # Replacing an existing blob is harmless, as it has the same content,
+        # and makes sure that it exists even if it was deleted meanwhile
+        for attempt in range(3):
+            os.makedirs(os.path.dirname(location), exist_ok=True)
+            try:
+                os.replace(temp_file.name, location)
+                break
+            except FileNotFoundError:
+                # `delete_file` removed the empty shard directory meanwhile
+                if attempt == 2:
+                    raise
+    except BaseException:
+        os.remove(temp_file.name)
+        raise
+    file_index.add(filename)
+    return filename, digest
+
+
+def save_file(file):
     extension = get_extension(file.filename)
     if extension in ALLOWED_EXTENSIONS:
-        filename = f'{str(uuid.uuid4())}.{extension}'
-        file.save(os.path.join(UPLOAD_FOLDER, filename))
+        filename, _ = save_stream(file.stream, extension)
         return filename
     else:
         return None
 
 
-def delete_file(filename):
-    os.remove(os.path.join(filename))
+def delete_file(filename, is_referenced=None, grace_period=None):
+    """
+    Deletes a file of `UPLOAD_FOLDER`. As the same file can be shared by many
+    documents and archives, `is_referenced` should be given to only delete
+    the file when it is not referenced anymore. A file which does not exist
+    is ignored.
+
+    `save_stream` may store the same content again while the file is being
+    deleted, for a reference which is not committed yet, and thus cannot be
+    seen by `is_referenced`. Saving a file refreshes its modification time :
+    when `is_referenced` is given, files modified less than `grace_period`
+    seconds ago are kept, and left to `sweep_files`. The file is also renamed
+    before being removed, so that a concurrent save creates a new file
+    instead of saving into the removed one, and it is put back if it was
+    saved or referenced meanwhile.
+    :param filename: The name of the file, relative to `UPLOAD_FOLDER`
+    :param is_referenced: A function taking the name of the file and
+    returning True if it is still used
+    :param grace_period: The age of the files which can be deleted, in
+    seconds. Defaults to `get_grace_period`.
+    :return: True if the file was deleted
+    """
+    try:
+        location = get_file_location(filename)
+    except NotFound:
+        return False
+    if is_referenced is not None:
+        if grace_period is None:
+            grace_period = get_grace_period()
+        try:
+            if is_recent(location, grace_period) or is_referenced(filename):
+                return False
+        except FileNotFoundError:
+            return False
+    # The '.part' suffix hides the renamed file from `FileIndex`
+    removed_location = f'{location}.{uuid.uuid4().hex}.part'
+    try:
+        os.rename(location, removed_location)
+    except FileNotFoundError:
+        return False
+    if is_referenced is not None and (is_recent(removed_location,
+                                                grace_period)
+                                      or is_referenced(filename)):
+        # The same content was saved meanwhile, so replacing it is harmless
+        os.replace(removed_location, location)
+        return False
+    os.remove(removed_location)
+    file_index.remove(filename)
+    # Remove the shard directories once empty
+    directory = os.path.dirname(location)
+    while os.path.normpath(directory) != os.path.normpath(UPLOAD_FOLDER):
+        try:
+            os.rmdir(directory)
+        except OSError:
+            break
+        directory = os.path.dirname(directory)
+    return True
+
+
+def is_recent(location, grace_period):
+    return os.path.getmtime(location) > time.time() - grace_period
+
+
+def sweep_files(is_referenced, grace_period=None):
+    """
+    Deletes the files of `UPLOAD_FOLDER` which are not referenced anymore,
+    such as the files of the documents which could not be created (see
+    `delete_file`).
+    :param is_referenced: A function taking the name of a file and returning
+    True if it is still used
+    :param grace_period: The age of the files which can be deleted, in
+    seconds. Defaults to `get_grace_period`.
+    :return: The number of deleted files
+    """
+    filenames = []
+    for directory, _, names in os.walk(UPLOAD_FOLDER):
+        for name in names:
+            # Ignore the temporary files of `save_stream`
+            if not name.endswith('.part'):
+                path = os.path.join(directory, name)
+                filenames.append(os.path.relpath(
+                    path, UPLOAD_FOLDER).replace(os.sep, '/'))
+    return sum(delete_file(filename, is_referenced, grace_period)
+               for filename in filenames)
+
+
+class FileIndex:
+    """
+    Index of the files of `UPLOAD_FOLDER` by name without extension, used by
+    `find_image`. The index is built the first time it is used, by walking
+    the folder once, then kept current by `save_stream` and `delete_file`.
+
+    Other processes can also save and delete files, so a file found in the
+    index is checked to still exist, and a name missing from the index is
+    looked up with each of the `ALLOWED_EXTENSIONS` before giving up.
+    """
+    name_pattern = re.compile(r'(.+)\.[a-z]+')
+
+    def __init__(self):
+        self._files = None
+        self._folder = None
+        self._lock = threading.Lock()
+
+    def get(self, stem):
+        """
+        Finds a file from its name without extension.
+        :param stem: The name of the file, without extension
+        :return: The name of the file relative to `UPLOAD_FOLDER`, or None
+        """
+        with self._lock:
+            self._build_if_needed()
+            filename = self._files.get(stem)
+        if filename is not None:
+            if os.path.exists(os.path.join(UPLOAD_FOLDER, filename)):
+                return filename
+            self.remove(filename)
+        for extension in sorted(ALLOWED_EXTENSIONS):
+            candidates = [f'{stem}.{extension}']
+            if get_file_digest(candidates[0]) is not None:
+                candidates.append(get_blob_path(stem, extension))
+            for candidate in candidates:
+                if os.path.exists(os.path.join(UPLOAD_FOLDER, candidate)):
+                    self.add(candidate)
+                    return candidate
+        return None
+
+    def add(self, filename):
+        """
+        Adds a file to the index, if it is built.
+        :param filename: The name of the file relative to `UPLOAD_FOLDER`
+        """
+        match = self.name_pattern.fullmatch(os.path.basename(filename))
+        with self._lock:
+            if self._files is not None and match:
+                self._files[match.group(1)] = filename
+
+    def remove(self, filename):
+        """
+        Removes a file from the index, if it is built.
+        :param filename: The name of the file relative to `UPLOAD_FOLDER`
+        """
+        match = self.name_pattern.fullmatch(os.path.basename(filename))
+        with self._lock:
+            if self._files is not None and match \
+                    and self._files.get(match.group(1)) == filename:
+                del self._files[match.group(1)]
+
+    def _build_if_needed(self):
+        if self._files is not None and self._folder == UPLOAD_FOLDER:
+            return
+        files = {}
+        for directory, _, names in os.walk(UPLOAD_FOLDER):
+            for name in names:
+                match = self.name_pattern.fullmatch(name)
+                # Ignore the temporary files of `save_stream`
+                if match and not name.endswith('.part'):
+                    path = os.path.join(directory, name)
+                    files[match.group(1)] = os.path.relpath(
+                        path, UPLOAD_FOLDER).replace(os.sep, '/')
+        self._files = files
+        self._folder = UPLOAD_FOLDER
+
+
+file_index = FileIndex()
 
 
 def find_image(member_id):
-    pattern = fr'^{member_id}\.[a-z]+$'
-    rex = re.compile(pattern)
-    files = os.listdir(
-        safe_join(os.getcwd(), UPLOAD_FOLDER))
-    for file in files:
-        if rex.search(file):
-            return file
+    """
+    Finds a file of `UPLOAD_FOLDER` from its name without extension (see
+    `FileIndex`).
+    :param member_id: The name of the file, without extension
+    :return: The name of the file relative to `UPLOAD_FOLDER`, or None
+    """
+    return file_index.get(str(member_id))